@@ -0,0 +1,379 @@
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from checkpoint import DEFAULT_STAGE_TTL, JobManifest, run_stage
+from instrumentation import count, get_tracer, span
+from model_cache import DEFAULT_CACHE_DIR
+from text_to_3d import Pipeline, PipelineConfig, Services, build_services
+
+STAGES = ("prompt", "views", "reconstruct", "download", "postprocess")
+
+
+def read_jobs(path: str) -> list[dict]:
+    """
+    Reads object requests from a .jsonl or .csv file. Each job needs an "object"
+    field and may carry an "id"; jobs without one are numbered in file order.
+    """
+    with open(path, newline='') as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return _normalize_jobs(rows)
+
+
+def read_sheet_jobs(manager, sheet_name: str) -> list[dict]:
+    """
+    Reads object requests from a sheet through a SheetManager.
+    """
+    return _normalize_jobs(manager.get_rows(sheet_name))
+
+
+def _normalize_jobs(rows):
+    jobs = []
+    for i, row in enumerate(rows):
+        request = row.get("object") or row.get("Object")
+        if not request:
+            continue
+        job_id = str(row.get("id") or row.get("ID") or i + 1)
+        job = {"id": job_id, "object": request}
+        priority = row.get("priority") or row.get("Priority")
+        if priority not in (None, ""):
+            job["priority"] = int(priority)
+        jobs.append(job)
+    return jobs
+
+
+class PrioritySlots:
+    """
+    A semaphore whose waiters are let in highest priority first, then in
+    arrival order, so a slow provider serves urgent jobs before the backlog.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self, priority: int = 0):
+        with self._condition:
+            entry = (-priority, next(self._order))
+            heapq.heappush(self._waiters, entry)
+            while self.in_use >= self.limit or self._waiters[0] != entry:
+                self._condition.wait()
+            heapq.heappop(self._waiters)
+            self.in_use += 1
+            # The next waiter may fit too if the limit is above one
+            self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            self.in_use -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def hold(self, priority: int = 0):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class BatchRunner:
+    """
+    Runs many jobs through the stages of a text_to_3d.Pipeline with config
+    (prompt engineering, multi-view FLUX, Trellis in config.trellis_mode and
+    post-processing) with a shared worker pool. Each stage has its own
+    concurrency limit so a slow provider never holds more slots than it is
+    allowed; jobs with a higher "priority" get a free slot first. slots maps
+    stages to PrioritySlots shared with other stages or runners and takes
+    precedence over stage_limits. Without a config, models are cached in
+    output_dir and nothing else is cached.
+    """
+
+    def __init__(self, services: Services, config: PipelineConfig | None = None, output_dir: str = "batch_output",
+                 workers: int = 4, stage_limits: dict | None = None, save_views: bool = False, sheet=None,
+                 sheet_name: str = "Jobs", mesh_store=None, resume: bool = True, slots: dict | None = None):
+        self.config = config or PipelineConfig(model=services.model,
+                                               model_cache_dir=os.path.join(output_dir, DEFAULT_CACHE_DIR))
+        self.pipeline = Pipeline(self.config, services)
+        self.services = services
+        self.output_dir = output_dir
+        self.workers = workers
+        self.save_views = save_views
+        self.sheet = sheet
+        self.sheet_name = sheet_name
+        self.mesh_store = mesh_store
+        self.resume = resume
+        stage_limits = stage_limits or {}
+        self.limits = {stage: PrioritySlots(stage_limits.get(stage, workers)) for stage in STAGES}
+        self.limits.update(slots or {})
+        self._write_lock = threading.Lock()
+
+    def run_job(self, job: dict) -> dict:
+        """
+        Runs a single job and returns its result record. Failures are recorded, never raised.
+        """
+        job_dir = os.path.join(self.output_dir, job["id"])
+        os.makedirs(job_dir, exist_ok=True)
+
+        result = {"id": job["id"], "object": job["object"], "status": "running", "stage": None}
+        start = time.perf_counter()
+        with span("job", id=job["id"]) as attrs:
+            self._run_stages(job, job_dir, result)
+            attrs["status"] = result["status"]
+        result["elapsed"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _run_stages(self, job, job_dir, result):
+        """
+        Runs the pipeline stages through the job's manifest, so a rerun of a
+        job resumes at its first incomplete stage. Work already done for
+        another job with the same inputs is reused inside the stages: views
+        through the stage cache, Trellis results through the model cache and
+        prompts through the PromptCache.
+        """
+        manifest = JobManifest(job_dir, job)
+        if not self.resume:
+            manifest.reset()
+        config, pipeline = self.config, self.pipeline
+        # Upload urls older than this may have expired
+        url_ttl = config.stage_cache.ttl if config.stage_cache is not None else DEFAULT_STAGE_TTL
+        try:
+            result["stage"] = "prompt"
+            inputs = {"object": job["object"], "model": config.model, "system_instruction": config.system_instruction}
+
+            def prompt_stage():
+                with self._stage("prompt", job):
+                    prompt = pipeline.engineer_prompt(job["object"])
+                if not prompt:
+                    raise RuntimeError("LLM returned no prompt")
+                return {"prompt": prompt}
+
+            prompt = run_stage(manifest, "prompt", inputs, prompt_stage)["prompt"]
+            result["prompt"] = prompt
+
+            result["stage"] = "views"
+            inputs = {"prompt": prompt, "viewpoints": config.viewpoints, "params": config.params.to_dict(),
+                      "format": config.encoding.format}
+            if config.preprocess is not None:
+                inputs["preprocess"] = config.preprocess.to_dict()
+
+            def views_stage():
+                # Partial results are in the stage cache; only a full set completes the stage
+                with self._stage("views", job):
+                    return {"view_urls": pipeline.generate_views(prompt, min_views=len(config.viewpoints),
+                                                                 save_dir=job_dir if self.save_views else None)}
+
+            # Views are cached one by one inside the stage, not as a whole
+            result["view_urls"] = run_stage(manifest, "views", inputs, views_stage,
+                                            max_age=url_ttl)["view_urls"]
+
+            result["stage"] = "reconstruct"
+            inputs = {"trellis_mode": config.trellis_mode, "view_urls": result["view_urls"]}
+
+            def reconstruct_stage():
+                # Also downloads the model into the model cache
+                with self._stage("reconstruct", job):
+                    try:
+                        cached_path = pipeline.reconstruct(result["view_urls"], prompt=prompt)
+                    except Exception:
+                        # The views may have expired; a rerun uploads them again
+                        manifest.discard("views")
+                        raise
+                if not cached_path:
+                    raise RuntimeError("Trellis returned no model mesh")
+                return {"cached_path": cached_path}
+
+            cached_path = run_stage(manifest, "reconstruct", inputs, reconstruct_stage,
+                                    artifacts=lambda outputs: [outputs["cached_path"]])["cached_path"]
+
+            result["stage"] = "download"
+            model_path = os.path.join(job_dir, "model.glb")
+
+            def download_stage():
+                with self._stage("download", job):
+                    shutil.copyfile(cached_path, model_path)
+                return {"model_path": model_path}
+
+            run_stage(manifest, "download", {"cached_path": cached_path}, download_stage,
+                      artifacts=lambda outputs: [outputs["model_path"]])
+            result["model_path"] = model_path
+            if self.mesh_store is not None:
+                result["mesh_key"] = self.mesh_store.ingest(model_path, id=job["id"], object=job["object"])
+
+            if config.lods:
+                result["stage"] = "postprocess"
+
+                def postprocess_stage():
+                    with self._stage("postprocess", job):
+                        return {"lods": pipeline.postprocess(model_path)}
+
+                result["lods"] = run_stage(
+                    manifest, "postprocess", {"cached_path": cached_path, "lods": config.lods},
+                    postprocess_stage, artifacts=lambda outputs: [lod["path"] for lod in outputs["lods"]]
+                )["lods"]
+
+            result["stage"] = None
+            result["status"] = "done"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+            count("jobs_failed")
+
+    @contextmanager
+    def _stage(self, stage, job):
+        """
+        Holds one of the stage's slots at the job's priority, read when the
+        wait starts; time spent waiting for it is traced as <stage>_slot_wait.
+        """
+        waiting = time.perf_counter()
+        with self.limits[stage].hold(job.get("priority", 0)):
+            get_tracer().record(f"{stage}_slot_wait", waiting, time.perf_counter() - waiting)
+            yield
+
+    def run(self, jobs: list[dict], results_path: str | None = None) -> list[dict]:
+        """
+        Runs all jobs and returns their results in job order. If results_path is
+        given, each result is appended to it as a JSON line as soon as it finishes.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Higher priority jobs are started first; the stage slots keep them ahead after that
+            queued = sorted(jobs, key=lambda job: -job.get("priority", 0))
+            futures = {pool.submit(self.run_job, job): job["id"] for job in queued}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                print(f"[{result['id']}] {result['status']} in {result['elapsed']}s")
+                if results_path:
+                    self._write_result(results_path, result)
+                if self.sheet is not None:
+                    self._log_to_sheet(result)
+
+        return [results[job["id"]] for job in jobs]
+
+    def _log_to_sheet(self, result):
+        row = {
+            "ID": result["id"],
+            "Object": result["object"],
+            "Status": result["status"],
+            "Stage": result["stage"] or "",
+            "Prompt": result.get("prompt", ""),
+            "Model Path": result.get("model_path", ""),
+            "Error": result.get("error", ""),
+            "Elapsed": result["elapsed"],
+        }
+        try:
+            with span("sheet_log"):
+                self.sheet.add_entry(row, self.sheet_name)
+        except Exception as e:
+            print(f"Could not log job {result['id']} to the sheet: {e}")
+
+    def _write_result(self, path, result):
+        with self._write_lock:
+            with open(path, 'a') as f:
+                f.write(json.dumps(result) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate 3D models for many objects without prompts.")
+    parser.add_argument("jobs", nargs="?", help="JSONL or CSV file with an 'object' column")
+    parser.add_argument("--sheet", help="Read jobs from this spreadsheet id instead of a file")
+    parser.add_argument("--sheet-name", default="Sheet1")
+    parser.add_argument("--credentials", default="credentials.json")
+    parser.add_argument("--llm", choices=["gemini", "openai"], default="gemini")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--results", default=None, help="Defaults to <output-dir>/results.jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-limit", type=int, default=None,
+                            help=f"Max jobs in the {stage} stage at once (defaults to --workers)")
+    parser.add_argument("--view-concurrency", type=int, default=None)
+    parser.add_argument("--save-views", action="store_true", help="Also write each view to the job directory")
+    parser.add_argument("--lods", type=int, nargs="+",
+                        help="Also write decimated levels of detail with these triangle budgets")
+    parser.add_argument("--mesh-store", help="Also add each model to the memory-mapped mesh store in this directory")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Rerun every stage instead of resuming from each job's manifest")
+    parser.add_argument("--log-sheet", help="Append each job's result to this spreadsheet id")
+    parser.add_argument("--log-sheet-name", default="Jobs")
+    parser.add_argument("--trace", help="Write a trace of every stage to this file")
+    parser.add_argument("--trace-format", choices=["json", "chrome"], default="json")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port while running")
+    args = parser.parse_args()
+
+    if args.mesh_store:
+        from mesh_store import MeshStore
+    if args.sheet or args.log_sheet:
+        from google_sheets.sheets_manager import SheetManager
+
+    if args.sheet:
+        jobs = read_sheet_jobs(SheetManager(args.credentials, args.sheet), args.sheet_name)
+    elif args.jobs:
+        jobs = read_jobs(args.jobs)
+    else:
+        parser.error("Provide a jobs file or --sheet")
+
+    stage_limits = {}
+    for stage in STAGES:
+        limit = getattr(args, f"{stage}_limit")
+        if limit:
+            stage_limits[stage] = limit
+
+    tracer = get_tracer()
+    if args.metrics_port:
+        tracer.serve_prometheus(args.metrics_port)
+
+    log_sheet = writer = None
+    if args.log_sheet:
+        from google_sheets.buffered_writer import BufferedSheetWriter
+        from google_sheets.sheets_client import GoogleSheetsClient
+
+        # Result rows are batched into a few API calls instead of one per job
+        writer = BufferedSheetWriter(GoogleSheetsClient(args.credentials))
+        log_sheet = SheetManager(args.credentials, args.log_sheet, client=writer)
+
+    overrides = {"lods": args.lods} if args.lods else {}
+    if args.view_concurrency:
+        overrides["view_concurrency"] = args.view_concurrency
+    config = PipelineConfig.from_env(llm=args.llm, **overrides)
+    runner = BatchRunner(build_services(config), config, output_dir=args.output_dir, workers=args.workers,
+                         stage_limits=stage_limits, save_views=args.save_views,
+                         sheet=log_sheet, sheet_name=args.log_sheet_name,
+                         mesh_store=MeshStore(args.mesh_store) if args.mesh_store else None,
+                         resume=not args.no_resume)
+    try:
+        results = runner.run(jobs, args.results or os.path.join(args.output_dir, "results.jsonl"))
+    finally:
+        runner.pipeline.close()
+        if writer is not None:
+            writer.close()
+
+    done = sum(1 for r in results if r["status"] == "done")
+    print(f"\n--- BATCH COMPLETE: {done}/{len(results)} succeeded ---")
+    for stage, stats in tracer.summary().items():
+        print(f"{stage}: {stats['count']}x, total {stats['total']:.2f}s, max {stats['max']:.2f}s")
+    if args.trace:
+        tracer.export(args.trace, args.trace_format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares per-view encode+upload time of the old disk round-trip
+(image.save to a PNG, then upload_file re-reading it) against in-memory
+encoding with different formats, with and without cropping and resizing to
+Trellis' input resolution first (preprocess.py). Uploads go to a no-op
+stand-in, so the numbers isolate local encode and I/O cost.
+
+    python benchmarks/bench_image_upload.py [--size 1024] [--repeat 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_encoding import ImageEncoding
+from pipeline import upload_image
+from preprocess import Preprocessor
+
+
+def synthetic_view(size: int) -> Image.Image:
+    """
+    A smooth object-like gradient on a gray background with mild noise, closer
+    to a FLUX render than a flat fill or pure noise.
+    """
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size] / size
+    mask = (x - 0.5) ** 2 + (y - 0.5) ** 2 < 0.1
+    pixels = np.full((size, size, 3), 128.0)
+    pixels[mask] = np.stack([x * 255, y * 200, (1 - x) * 180], axis=-1)[mask]
+    pixels += rng.normal(0, 3, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def upload_bytes(data, content_type, file_name=None):
+    return len(data)
+
+
+def upload_file(filename):
+    with open(filename, 'rb') as f:
+        return len(f.read())
+
+
+def disk_round_trip(image, workdir):
+    filename = os.path.join(workdir, "front.png")
+    image.save(filename)
+    return upload_file(filename)
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    image = synthetic_view(args.size)
+    cases = [("disk round-trip (png, default level)", None)]
+    cases += [(f"in-memory png level {level}", ImageEncoding("png", compress_level=level)) for level in (1, 6)]
+    cases += [(f"in-memory {fmt} quality 90", ImageEncoding(fmt, quality=90)) for fmt in ("webp", "jpeg")]
+    preprocessed = [(f"preprocessed + {fmt}", ImageEncoding(fmt, quality=90)) for fmt in ("png", "webp")]
+
+    print(f"{'case':40} {'median ms':>10} {'bytes':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, encoding in cases:
+            if encoding is None:
+                ms, size = measure(lambda: disk_round_trip(image, workdir), args.repeat)
+            else:
+                ms, size = measure(lambda: upload_image(upload_bytes, image, "front", encoding), args.repeat)
+            print(f"{name:40} {ms:10.1f} {size:10d}")
+
+    # In the calling thread, to time the work itself rather than the pool
+    preprocess = Preprocessor(workers=0)
+    for name, encoding in preprocessed:
+        ms, size = measure(lambda: upload_image(upload_bytes, preprocess(image), "front", encoding), args.repeat)
+        print(f"{name:40} {ms:10.1f} {size:10d}")
+
+
+if __name__ == "__main__":
+    main()
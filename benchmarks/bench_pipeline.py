@@ -0,0 +1,154 @@
+"""
+Offline benchmark of the full pipeline orchestration against the recorded
+stand-ins in benchmarks/stub_providers.py. Runs a single job and a batch,
+then reports throughput, p50/p95/p99 per stage, peak memory and provider
+call counts. Recorded latencies are multiplied by --time-scale so a run
+takes seconds instead of minutes.
+
+    python -m benchmarks.bench_pipeline --jobs 20 --workers 4 --time-scale 0.01
+    python -m benchmarks.bench_pipeline --save baseline.json
+    python -m benchmarks.bench_pipeline --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import instrumentation
+from batch import BatchRunner, Services
+from benchmarks.stub_providers import RECORDING, StubProviders
+from google_sheets.sheets_client import GoogleSheetsClient
+from google_sheets.sheets_manager import SheetManager
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run_scenario(jobs: int, workers: int, args) -> dict:
+    providers = StubProviders(args.recording, time_scale=args.time_scale, jitter=args.jitter,
+                              failure_rate=args.failure_rate, seed=args.seed)
+    services = Services(
+        llm=providers.llm,
+        model="stub",
+        image_client=providers.image_client,
+        uploader=providers.uploader,
+        subscribe=providers.fal.subscribe,
+        get=providers.get,
+    )
+    sheet = SheetManager(None, "benchmark", client=GoogleSheetsClient(None, service=providers.sheets))
+    job_list = [{"id": str(i + 1), "object": f"object {i + 1}"} for i in range(jobs)]
+
+    tracer = instrumentation.Tracer()
+    previous = instrumentation.set_tracer(tracer)
+    tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            results = BatchRunner(services, output_dir=output_dir, workers=workers,
+                                  sheet=sheet, sheet_name="Jobs").run(job_list)
+            elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        instrumentation.set_tracer(previous)
+
+    durations = {}
+    for span in tracer.spans:
+        durations.setdefault(span.name, []).append(span.duration)
+
+    return {
+        "jobs": jobs,
+        "workers": workers,
+        "succeeded": sum(1 for r in results if r["status"] == "done"),
+        "wall_time": elapsed,
+        "throughput": jobs / elapsed,
+        "peak_memory_mb": peak / 1024 / 1024,
+        "calls": providers.call_counts(),
+        "counters": dict(tracer.counters),
+        "stages": {
+            name: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                   "p99": percentile(values, 99)}
+            for name, values in sorted(durations.items())
+        },
+    }
+
+
+def print_scenario(name: str, result: dict):
+    print(f"\n=== {name}: {result['jobs']} job(s), {result['workers']} worker(s) ===")
+    print(f"succeeded {result['succeeded']}/{result['jobs']}, wall {result['wall_time']:.2f}s, "
+          f"throughput {result['throughput']:.2f} jobs/s, peak memory {result['peak_memory_mb']:.1f} MB")
+    print("calls: " + ", ".join(f"{k}={v}" for k, v in result["calls"].items()))
+    print(f"{'stage':24} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:24} {stats['count']:6d} {stats['p50'] * 1000:9.1f} "
+              f"{stats['p95'] * 1000:9.1f} {stats['p99'] * 1000:9.1f}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Lists regressions: throughput drops or stage p95 increases beyond tolerance.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']:.2f} < {base['throughput']:.2f} jobs/s")
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats and stats["p95"] > base_stats["p95"] * (1 + tolerance):
+                regressions.append(f"{name}: {stage} p95 {stats['p95'] * 1000:.1f} ms > "
+                                   f"{base_stats['p95'] * 1000:.1f} ms")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with recorded stub providers.")
+    parser.add_argument("--recording", default=RECORDING)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=None, help="Override the recorded jitter fraction")
+    parser.add_argument("--failure-rate", type=float, default=None, help="Override the recorded failure rates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write results as JSON, e.g. to use as a baseline")
+    parser.add_argument("--compare", help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = {
+        "single": run_scenario(1, 1, args),
+        "batch": run_scenario(args.jobs, args.workers, args),
+    }
+    for name, result in results.items():
+        print_scenario(name, result)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
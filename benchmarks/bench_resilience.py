@@ -0,0 +1,148 @@
+"""
+Goodput of provider calls under throttling, slow tails and outages, against
+the FlakyProvider stand-in in benchmarks/stub_providers.py. Each scenario
+sends the same requests from several threads with and without the pieces of
+resilience.py and reports successes, successful requests per second, upstream
+calls and latency percentiles of the successful requests.
+
+    python -m benchmarks.bench_resilience --requests 200 --workers 8
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_pipeline import percentile
+from benchmarks.stub_providers import FlakyProvider
+from llm_interface import LLMInterface
+from resilience import CircuitBreaker, FailoverLLM, Provider, RetryPolicy
+
+
+class FlakyLLM(LLMInterface):
+    def __init__(self, flaky: FlakyProvider):
+        self.flaky = flaky
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        return self.flaky(prompt)
+
+
+def measure(call, requests: int, workers: int) -> dict:
+    """
+    Runs call() requests times from workers threads. A call succeeds when it
+    returns a value without raising.
+    """
+    def one(_):
+        start = time.perf_counter()
+        try:
+            ok = call() is not None
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for ok, latency in outcomes if ok]
+    return {
+        "succeeded": len(latencies),
+        "requests": requests,
+        "wall_time": elapsed,
+        "goodput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def retry_policy() -> RetryPolicy:
+    return RetryPolicy(max_attempts=6, base_delay=0.02, max_delay=0.5)
+
+
+def throttled(args) -> dict:
+    """
+    A provider allowing 50 requests/s hit by more concurrent callers than that.
+    """
+    def flaky():
+        return FlakyProvider(rate=50, burst=5, latency=0.005, failure_rate=0.05, seed=args.seed, name="flux")
+
+    results = {}
+    for name, make_provider in (
+        ("direct", None),
+        ("retry", lambda: Provider("flux", retry=retry_policy(), breaker=CircuitBreaker(10 ** 6))),
+        ("retry+rate limit", lambda: Provider("flux", rate=50, burst=5, retry=retry_policy(),
+                                              breaker=CircuitBreaker(10 ** 6))),
+    ):
+        upstream = flaky()
+        provider = make_provider() if make_provider else None
+        call = upstream if provider is None else provider.wrap(upstream)
+        result = measure(call, args.requests, args.workers)
+        result.update(upstream_calls=upstream.calls, throttled=upstream.throttled)
+        results[name] = result
+    return results
+
+
+def slow_tail(args) -> dict:
+    """
+    A provider answering 5% of calls 30x slower than usual.
+    """
+    results = {}
+    for name, hedge_after in (("no hedging", None), ("hedged", 0.03)):
+        upstream = FlakyProvider(rate=10 ** 6, burst=10 ** 6, latency=0.01, tail_rate=0.05, tail_latency=0.3,
+                                 seed=args.seed, name="llm")
+        provider = Provider("llm", retry=retry_policy(), hedge_after=hedge_after)
+        result = measure(provider.wrap(upstream), args.requests, args.workers)
+        result.update(upstream_calls=upstream.calls)
+        results[name] = result
+    return results
+
+
+def outage(args) -> dict:
+    """
+    The primary LLM is down; the secondary is healthy.
+    """
+    results = {}
+    for name, with_failover in (("primary only", False), ("failover", True)):
+        primary = FlakyProvider(rate=10 ** 6, burst=10 ** 6, latency=0.02, seed=args.seed, name="gemini")
+        primary.down = True
+        secondary = FlakyProvider(rate=10 ** 6, burst=10 ** 6, latency=0.01, seed=args.seed, name="openai")
+        backends = [(FlakyLLM(primary), "gemini", Provider("gemini", retry=retry_policy(),
+                                                           breaker=CircuitBreaker(5, reset_timeout=60)))]
+        if with_failover:
+            backends.append((FlakyLLM(secondary), "openai", Provider("openai", retry=retry_policy())))
+        llm = FailoverLLM(backends)
+        result = measure(lambda: llm.generate_prompt("a chair", None, "sys"), args.requests, args.workers)
+        result.update(upstream_calls=primary.calls + secondary.calls)
+        results[name] = result
+    return results
+
+
+SCENARIOS = {"throttled": throttled, "slow tail": slow_tail, "outage": outage}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Goodput of provider calls with and without resilience.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for scenario, run in SCENARIOS.items():
+        results[scenario] = run(args)
+        print(f"\n=== {scenario}: {args.requests} requests, {args.workers} workers ===")
+        print(f"{'variant':18} {'ok':>5} {'goodput/s':>10} {'calls':>6} {'p50 ms':>8} {'p99 ms':>8}")
+        for variant, r in results[scenario].items():
+            print(f"{variant:18} {r['succeeded']:5d} {r['goodput']:10.1f} {r['upstream_calls']:6d} "
+                  f"{r['p50'] * 1000:8.1f} {r['p99'] * 1000:8.1f}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Startup cost of the entry points, from python -X importtime. Each module is
+imported in a fresh interpreter; its cumulative import time (the best of
+--runs) is checked against BUDGETS, and none of the HEAVY modules may be
+imported at all: provider SDKs, open3d and the mesh libraries load only when
+the stage that needs them runs.
+
+    python -m benchmarks.import_budget --check
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds of cumulative import time allowed per entry module, about
+# three times what they take on a laptop so only real regressions fail
+BUDGETS = {
+    "main": 250,
+    "batch": 250,
+    "job_service": 250,
+    "pipeline": 200,
+    "resilience": 200,
+    "checkpoint": 200,
+}
+
+HEAVY = (
+    "open3d",
+    "trimesh",
+    "scipy",
+    "gradio_client",
+    "fal_client",
+    "huggingface_hub",
+    "google.genai",
+    "googleapiclient",
+    "requests",
+    "httpx",
+)
+
+
+def parse_importtime(output: str) -> dict:
+    """
+    Maps each imported module to (self, cumulative) microseconds from the
+    stderr of python -X importtime.
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def import_times(module: str) -> dict:
+    """
+    Imports module in a fresh interpreter and returns parse_importtime of it.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def measure(module: str, runs: int = 3) -> dict:
+    """
+    Best cumulative import time of module in ms over runs, and the heavy
+    modules it pulled in.
+    """
+    best, heavy = None, []
+    for _ in range(runs):
+        times = import_times(module)
+        elapsed = times[module][1] / 1000
+        best = elapsed if best is None else min(best, elapsed)
+        heavy = sorted(name for name in times if name in HEAVY)
+    return {"ms": best, "heavy": heavy}
+
+
+def check(results: dict, budgets: dict = BUDGETS) -> list[str]:
+    """
+    Human readable budget violations of measure() results; empty when all pass.
+    """
+    problems = []
+    for module, result in results.items():
+        if result["heavy"]:
+            problems.append(f"{module} imports {', '.join(result['heavy'])}")
+        budget = budgets.get(module)
+        if budget is not None and result["ms"] > budget:
+            problems.append(f"{module} takes {result['ms']:.0f} ms to import, budget is {budget} ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import time of the entry points against their budgets.")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a budget is exceeded")
+    parser.add_argument("--save", help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {module: measure(module, args.runs) for module in args.modules}
+    print(f"{'module':12} {'ms':>7} {'budget':>7}  heavy imports")
+    for module, result in results.items():
+        budget = BUDGETS.get(module, "-")
+        print(f"{module:12} {result['ms']:7.1f} {budget:>7}  {', '.join(result['heavy']) or '-'}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    problems = check(results)
+    for problem in problems:
+        print(f"OVER BUDGET: {problem}")
+    return 1 if args.check and problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
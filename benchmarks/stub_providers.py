@@ -0,0 +1,425 @@
+"""
+Local stand-ins for Gemini/HF chat, HF text-to-image, fal storage and queue,
+GLB downloads and the Google Sheets API. Each replays a recorded response with
+a configurable latency, jitter and failure rate so the orchestration code can
+be exercised and timed without network access.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+from PIL import Image
+
+from llm_interface import LLMInterface
+
+RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings", "default.json")
+
+
+class ProviderError(RuntimeError):
+    """
+    Raised by a stand-in when it simulates a failed call, with the HTTP status
+    the real provider would have returned.
+    """
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Latency:
+    """
+    Latency of a stand-in in seconds: mean +/- uniform jitter (a fraction of the
+    mean), scaled by time_scale, with failure_rate of calls raising ProviderError.
+    """
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 time_scale: float = 1.0, seed: int | None = None):
+        self.mean = mean
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.time_scale = time_scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, name: str = "provider"):
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+            failed = self._random.random() < self.failure_rate
+        time.sleep(max(0.0, self.mean * (1 + spread)) * self.time_scale)
+        if failed:
+            raise ProviderError(f"Simulated {name} failure")
+
+
+class FlakyProvider:
+    """
+    A provider that enforces its own rate limit (rate requests per second,
+    bursts of burst) by answering HTTP 429, fails failure_rate of the remaining
+    calls with 503, and answers tail_rate of calls tail_latency slowly instead
+    of after latency. Set down to fail every call, as during an outage.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, latency: float = 0.0, failure_rate: float = 0.0,
+                 tail_rate: float = 0.0, tail_latency: float = 0.0, seed: int | None = 0, name: str = "provider"):
+        self.rate = rate
+        self.burst = burst
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.name = name
+        self.down = False
+        self.calls = 0
+        self.throttled = 0
+        self.failed = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                raise ProviderError(f"{self.name} rate limit exceeded", status_code=429)
+            self._tokens -= 1
+            failed = self.down or self._random.random() < self.failure_rate
+            slow = self._random.random() < self.tail_rate
+        time.sleep(self.tail_latency if slow else self.latency)
+        if failed:
+            with self._lock:
+                self.failed += 1
+            raise ProviderError(f"Simulated {self.name} failure", status_code=503)
+        return f"{self.name} response"
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.calls += 1
+
+
+class StubLLM(LLMInterface, Counter):
+    """
+    Replays recorded prompts by object, falling back to a template.
+    """
+
+    def __init__(self, responses: dict, default: str, latency: Latency):
+        Counter.__init__(self)
+        self.responses = responses
+        self.default = default
+        self.latency = latency
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        self.hit()
+        self.latency.wait("LLM")
+        return self.responses.get(prompt, self.default.format(object=prompt))
+
+
+class StubImageClient(Counter):
+    """
+    Stands in for InferenceClient.text_to_image, returning an image of the recorded size.
+    """
+
+    def __init__(self, size: tuple[int, int], latency: Latency):
+        super().__init__()
+        self.size = tuple(size)
+        self.latency = latency
+
+    def text_to_image(self, prompt, model, **kwargs):
+        self.hit()
+        self.latency.wait("FLUX")
+        return Image.new("RGB", self.size, (128, 128, 128))
+
+
+class StubUploader(Counter):
+    """
+    Stands in for fal SyncClient.upload.
+    """
+
+    def __init__(self, latency: Latency):
+        super().__init__()
+        self.latency = latency
+        self.bytes_uploaded = 0
+
+    def __call__(self, data, content_type, file_name=None):
+        self.hit()
+        self.latency.wait("upload")
+        with self._lock:
+            self.bytes_uploaded += len(data)
+        return f"https://stub.fal/{self.calls}/{file_name}"
+
+
+class StubHandle:
+    def __init__(self, fal, arguments):
+        self.fal = fal
+        self.arguments = arguments
+
+    def get(self):
+        return self.fal._run(self.arguments)
+
+
+class StubFal(Counter):
+    """
+    Stands in for fal SyncClient queue calls on Trellis: queue wait, then processing.
+    """
+
+    def __init__(self, result: dict, queue_latency: Latency, processing_latency: Latency):
+        super().__init__()
+        self.result = result
+        self.queue_latency = queue_latency
+        self.processing_latency = processing_latency
+
+    def _run(self, arguments, on_queue_update=None):
+        self.queue_latency.wait("Trellis queue")
+        if on_queue_update is not None:
+            on_queue_update(InProgress())
+        self.processing_latency.wait("Trellis")
+        digest = hashlib.sha1(json.dumps(arguments, sort_keys=True).encode("utf-8")).hexdigest()
+        result = json.loads(json.dumps(self.result))
+        result["model_mesh"]["url"] = f"https://stub.fal/models/{digest}.glb"
+        return result
+
+    def submit(self, application, arguments, **kwargs):
+        self.hit()
+        return StubHandle(self, arguments)
+
+    def subscribe(self, application, arguments, with_logs=False, on_queue_update=None):
+        self.hit()
+        return self._run(arguments, on_queue_update)
+
+
+class InProgress:
+    logs = []
+
+
+class StubResponse:
+    def __init__(self, content: bytes, status_code: int = 200, headers: dict | None = None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {"Content-Length": str(len(content))}
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class StubGet(Counter):
+    """
+    Stands in for requests.get on GLB urls, serving a mesh of the recorded size.
+    """
+
+    def __init__(self, size_bytes: int, latency: Latency):
+        super().__init__()
+        self.body = b"glTF" + bytes(max(0, size_bytes - 4))
+        self.latency = latency
+
+    def __call__(self, url, **kwargs):
+        self.hit()
+        self.latency.wait("download")
+        return StubResponse(self.body)
+
+
+_A1 = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def _parse_range(range_name: str):
+    """
+    Splits an A1 range into (sheet, first_row, first_col, last_row, last_col),
+    zero based with None for open ends. Supports Sheet, Sheet!1:1, Sheet!A5 and Sheet!A5:C7.
+    """
+    sheet, _, cells = range_name.partition("!")
+    if not cells:
+        return sheet, 0, 0, None, None
+
+    start, _, end = cells.partition(":")
+    start_col, start_row = _A1.match(start).groups()
+    if end:
+        end_col, end_row = _A1.match(end).groups()
+    else:
+        end_col, end_row = start_col, start_row
+    return (
+        sheet,
+        int(start_row) - 1 if start_row else 0,
+        column_index(start_col) if start_col else 0,
+        int(end_row) - 1 if end_row else None,
+        column_index(end_col) if end_col else None,
+    )
+
+
+class _Request:
+    def __init__(self, service, fn):
+        self.service = service
+        self.fn = fn
+
+    def execute(self):
+        return self.service._execute(self.fn)
+
+
+class FakeSheetsService:
+    """
+    In-memory stand-in for the googleapiclient Sheets v4 service. Counts every
+    executed request, and can reject the first `throttle` requests with HTTP 429.
+    """
+
+    def __init__(self, sheets: dict | None = None, latency: Latency | None = None, throttle: int = 0):
+        self.sheets = {name: [list(row) for row in rows] for name, rows in (sheets or {}).items()}
+        self.latency = latency or Latency()
+        self.throttle = throttle
+        self.requests = []
+        self._lock = threading.Lock()
+
+    # Chained builders mirroring service.spreadsheets().values().<method>(...)
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        return _Request(self, lambda: ("get", self._get(range)))
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return _Request(self, lambda: ("update", self._update(range, body["values"])))
+
+    def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+        return _Request(self, lambda: ("append", self._append(range, body["values"])))
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            responses = [self._update(data["range"], data["values"]) for data in body["data"]]
+            return "batchUpdate", {
+                "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+                "responses": responses,
+            }
+        return _Request(self, run)
+
+    def count(self, method: str | None = None) -> int:
+        return sum(1 for m in self.requests if method is None or m == method)
+
+    def _execute(self, fn):
+        self.latency.wait("Sheets")
+        with self._lock:
+            if self.throttle > 0:
+                self.throttle -= 1
+                self.requests.append("throttled")
+                raise _http_error(429)
+            method, result = fn()
+            self.requests.append(method)
+            return result
+
+    def _get(self, range_name):
+        sheet, row0, col0, row1, col1 = _parse_range(range_name)
+        rows = self.sheets.get(sheet, [])
+        rows = rows[row0:None if row1 is None else row1 + 1]
+        values = [row[col0:None if col1 is None else col1 + 1] for row in rows]
+        # The API trims trailing empty cells and rows
+        values = [_rstrip(row) for row in values]
+        while values and not values[-1]:
+            values.pop()
+        return {"range": range_name, "values": values} if values else {"range": range_name}
+
+    def _update(self, range_name, values):
+        sheet, row0, col0, _, _ = _parse_range(range_name)
+        rows = self.sheets.setdefault(sheet, [])
+        cells = 0
+        for r, row_values in enumerate(values):
+            while len(rows) <= row0 + r:
+                rows.append([])
+            row = rows[row0 + r]
+            for c, value in enumerate(row_values):
+                while len(row) <= col0 + c:
+                    row.append("")
+                row[col0 + c] = value
+                cells += 1
+        return {"updatedRange": range_name, "updatedRows": len(values), "updatedCells": cells}
+
+    def _append(self, range_name, values):
+        sheet = range_name.partition("!")[0]
+        rows = self.sheets.setdefault(sheet, [])
+        while rows and not _rstrip(rows[-1]):
+            rows.pop()
+        first = len(rows) + 1
+        result = self._update(f"{sheet}!A{first}", values)
+        return {"updates": result, "tableRange": f"{sheet}!A1"}
+
+
+def _rstrip(row):
+    row = list(row)
+    while row and row[-1] in ("", None):
+        row.pop()
+    return row
+
+
+def _http_error(status: int):
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    return HttpError(httplib2.Response({"status": status}), b"Simulated rate limit")
+
+
+class StubProviders:
+    """
+    A full set of stand-ins built from a recording file. Latencies from the
+    recording are multiplied by time_scale so long provider times can be replayed quickly.
+    """
+
+    def __init__(self, recording: str = RECORDING, time_scale: float = 1.0, jitter: float | None = None,
+                 failure_rate: float | None = None, seed: int | None = 0):
+        with open(recording) as f:
+            self.recording = json.load(f)
+
+        def latency(section, key="latency"):
+            entry = self.recording[section]
+            return Latency(
+                mean=entry[key],
+                jitter=entry.get("jitter", 0.0) if jitter is None else jitter,
+                failure_rate=entry.get("failure_rate", 0.0) if failure_rate is None else failure_rate,
+                time_scale=time_scale,
+                seed=None if seed is None else seed + zlib.crc32(f"{section}.{key}".encode()),
+            )
+
+        llm = self.recording["llm"]
+        self.llm = StubLLM(llm["responses"], llm["default"], latency("llm"))
+        self.image_client = StubImageClient(self.recording["flux"]["image_size"], latency("flux"))
+        self.uploader = StubUploader(latency("upload"))
+        self.fal = StubFal(self.recording["trellis"]["result"], latency("trellis", "queue_latency"),
+                           latency("trellis", "processing_latency"))
+        self.get = StubGet(self.recording["download"]["size_bytes"], latency("download"))
+        self.sheets = FakeSheetsService({"Jobs": [self.recording["sheets"]["headers"]]}, latency("sheets"))
+
+    def call_counts(self) -> dict:
+        return {
+            "llm": self.llm.calls,
+            "flux": self.image_client.calls,
+            "upload": self.uploader.calls,
+            "trellis": self.fal.calls,
+            "download": self.get.calls,
+            "sheets": self.sheets.count(),
+        }
+
@@ -0,0 +1,229 @@
+"""
+Resumable pipeline runs. A JobManifest in each job directory records, per
+stage, a hash of the stage's inputs, its outputs and the hashes of the files it
+wrote, so a restarted job skips every stage that already completed with the
+same inputs. A StageCache keyed by stage and inputs lets identical
+sub-requests in other jobs (the same prompt and viewpoint) reuse earlier
+outputs instead of paying the provider again. Those outputs are fal upload
+urls, which the provider deletes after a while, so entries expire after a TTL
+and are forgotten as soon as Trellis fails on them.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from image_cache import DEFAULT_PARAMS, DEFAULT_UPLOAD_TTL, GenerationParams
+from image_encoding import ImageEncoding
+from instrumentation import count
+from model_cache import file_sha256
+from pipeline import DEFAULT_ENCODING, FLUX_MODEL, generate_viewpoints
+
+DEFAULT_STAGE_CACHE_DIR = ".stage_cache"
+# Cached outputs are upload urls, which expire like the uploads themselves
+DEFAULT_STAGE_TTL = DEFAULT_UPLOAD_TTL
+MANIFEST_FILE = "manifest.json"
+
+
+def inputs_key(stage: str, inputs: dict) -> str:
+    payload = json.dumps({"stage": stage, "inputs": inputs}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _write_json(path: str, data: dict):
+    """
+    Atomic write, so a crash never leaves a half written manifest or cache entry.
+    """
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+class JobManifest:
+    """
+    Record of the completed stages of one job, stored as manifest.json in its directory.
+    """
+
+    def __init__(self, job_dir: str, job: dict | None = None):
+        self.path = os.path.join(job_dir, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self.data = {"job": job, "stages": {}}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.data = json.load(f)
+
+    @property
+    def stages(self) -> dict:
+        return self.data["stages"]
+
+    def completed(self, stage: str, inputs: dict, max_age: float | None = None) -> dict | None:
+        """
+        Outputs of stage if it completed with these inputs, at most max_age
+        seconds ago if given, and its files are unchanged on disk, else None.
+        """
+        entry = self.stages.get(stage)
+        if entry is None or entry["inputs_key"] != inputs_key(stage, inputs):
+            return None
+        if max_age is not None and time.time() - entry["completed_at"] > max_age:
+            return None
+        for path, digest in entry["artifacts"].items():
+            if not os.path.exists(path) or file_sha256(path) != digest:
+                return None
+        return entry["outputs"]
+
+    def record(self, stage: str, inputs: dict, outputs: dict, artifacts: list[str] = ()):
+        with self._lock:
+            self.stages[stage] = {
+                "inputs_key": inputs_key(stage, inputs),
+                "inputs": inputs,
+                "outputs": outputs,
+                "artifacts": {path: file_sha256(path) for path in artifacts},
+                "completed_at": time.time(),
+            }
+            _write_json(self.path, self.data)
+
+    def discard(self, stage: str):
+        """
+        Forgets stage, so a rerun of the job runs it again.
+        """
+        with self._lock:
+            if self.stages.pop(stage, None) is not None:
+                _write_json(self.path, self.data)
+
+    def reset(self):
+        with self._lock:
+            self.data["stages"] = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class StageCache:
+    """
+    Outputs of idempotent stages, one JSON file per stage and inputs under root.
+    Only cache stages whose outputs stay valid for other jobs, such as uploaded
+    urls; files in a job directory belong in the manifest instead, and prompts
+    in the PromptCache. Entries older than ttl seconds are misses.
+    """
+
+    def __init__(self, root: str = DEFAULT_STAGE_CACHE_DIR, ttl: float = DEFAULT_STAGE_TTL):
+        self.root = root
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads STAGE_CACHE_DIR ("off" disables the cache and returns None) and STAGE_CACHE_TTL.
+        """
+        root = os.getenv("STAGE_CACHE_DIR", DEFAULT_STAGE_CACHE_DIR)
+        return None if root == "off" else cls(root, float(os.getenv("STAGE_CACHE_TTL", DEFAULT_STAGE_TTL)))
+
+    def path(self, stage: str, inputs: dict) -> str:
+        key = inputs_key(stage, inputs)
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, stage: str, inputs: dict) -> dict | None:
+        path = self.path(stage, inputs)
+        try:
+            expired = time.time() - os.path.getmtime(path) > self.ttl
+        except OSError:
+            expired = None
+        if expired:
+            count("stage_cache_expired")
+            self.invalidate(stage, inputs)
+        if expired is not False:
+            count("stage_cache_misses")
+            return None
+        with open(path) as f:
+            count("stage_cache_hits")
+            return json.load(f)
+
+    def put(self, stage: str, inputs: dict, outputs: dict):
+        path = self.path(stage, inputs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_json(path, outputs)
+
+    def invalidate(self, stage: str, inputs: dict):
+        """
+        Drops the entry, e.g. once a provider no longer serves its url.
+        """
+        try:
+            os.remove(self.path(stage, inputs))
+        except FileNotFoundError:
+            pass
+
+
+def run_stage(manifest: JobManifest | None, stage: str, inputs: dict, fn, artifacts=lambda outputs: [],
+              max_age: float | None = None) -> dict:
+    """
+    Returns the outputs of stage for inputs: from the job manifest if the stage
+    already completed (at most max_age seconds ago, if given), else by calling
+    fn(). New outputs are recorded in the manifest; artifacts(outputs) lists
+    the files to hash. Work shared across jobs is cached inside the stages
+    (cached_viewpoints, the model cache, the PromptCache), not here.
+    """
+    if manifest is not None:
+        outputs = manifest.completed(stage, inputs, max_age)
+        if outputs is not None:
+            count("stages_resumed")
+            return outputs
+
+    outputs = fn()
+    if manifest is not None:
+        manifest.record(stage, inputs, outputs, artifacts(outputs))
+    return outputs
+
+
+def _view_inputs(prompt, viewpoint, model, encoding, params, preprocess) -> dict:
+    inputs = {"prompt": prompt, "viewpoint": viewpoint, "model": model, "params": params.to_dict(),
+              "format": encoding.format}
+    if preprocess is not None:
+        inputs["preprocess"] = preprocess.to_dict()
+    return inputs
+
+
+def forget_viewpoints(cache: StageCache | None, prompt: str, viewpoints: list[str], model: str = FLUX_MODEL,
+                      encoding: ImageEncoding = DEFAULT_ENCODING, params: GenerationParams = DEFAULT_PARAMS,
+                      preprocess=None):
+    """
+    Drops the cached views that cached_viewpoints would return for the same arguments.
+    """
+    if cache is None:
+        return
+    for viewpoint in viewpoints:
+        cache.invalidate("view", _view_inputs(prompt, viewpoint, model, encoding, params, preprocess))
+
+
+def cached_viewpoints(cache: StageCache | None, client, uploader, prompt: str, viewpoints: list[str],
+                      model: str = FLUX_MODEL, encoding: ImageEncoding = DEFAULT_ENCODING, min_views: int = 1,
+                      params: GenerationParams = DEFAULT_PARAMS, preprocess=None, **kwargs) -> list[str]:
+    """
+    generate_viewpoints with one cache entry per view: views generated before
+    for the same prompt, viewpoint, model, params, preprocessing and encoding
+    are reused, and only the rest are generated. Returns urls in viewpoint
+    order, leaving out failed views.
+    """
+    if cache is None or params.seed is None:
+        return generate_viewpoints(client, uploader, prompt, viewpoints, model=model, encoding=encoding,
+                                   min_views=min_views, params=params, preprocess=preprocess, **kwargs)
+
+    def view_inputs(viewpoint):
+        return _view_inputs(prompt, viewpoint, model, encoding, params, preprocess)
+
+    urls = {}
+    for viewpoint in viewpoints:
+        hit = cache.get("view", view_inputs(viewpoint))
+        if hit is not None:
+            urls[viewpoint] = hit["url"]
+
+    def on_view(viewpoint, url):
+        urls[viewpoint] = url
+        cache.put("view", view_inputs(viewpoint), {"url": url})
+
+    missing = [viewpoint for viewpoint in viewpoints if viewpoint not in urls]
+    if missing:
+        generate_viewpoints(client, uploader, prompt, missing, model=model, encoding=encoding,
+                            min_views=max(0, min_views - len(urls)), on_view=on_view, params=params,
+                            preprocess=preprocess, **kwargs)
+    return [urls[viewpoint] for viewpoint in viewpoints if viewpoint in urls]
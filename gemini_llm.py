@@ -1,11 +1,14 @@
 from google.genai import types
 from google import genai
-from llm_interface import LLMInterface
+from llm_interface import IncompleteStreamError, LLMInterface
 
 class GeminiAdaptor(LLMInterface):
-    def __init__(self,api_key: str):
-        self.client = genai.Client(api_key=api_key)
-        
+    def __init__(self,api_key: str, http_client=None, raise_errors: bool = False):
+        self.raise_errors = raise_errors
+        # A shared httpx client (see http_clients.ClientRegistry) keeps connections alive across calls
+        http_options = types.HttpOptions(httpx_client=http_client) if http_client is not None else None
+        self.client = genai.Client(api_key=api_key, http_options=http_options)
+
     def generate_prompt(self, prompt: str,model: str, system_instruction: str) -> str:
         try:
             response = self.client.models.generate_content(
@@ -16,6 +19,42 @@ class GeminiAdaptor(LLMInterface):
                 )
             return response.text
         except Exception as e:
+            if self.raise_errors:
+                raise
             print(f"An error has occured: {e}")
             return None
-            
\ No newline at end of file
+
+    async def agenerate_prompt(self, prompt: str, model: str, system_instruction: str) -> str:
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instruction),
+                    contents=prompt
+                )
+            return response.text
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            print(f"An error has occured: {e}")
+            return None
+
+    async def astream_prompt(self, prompt: str, model: str, system_instruction: str):
+        chunks = 0
+        try:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=model,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instruction),
+                    contents=prompt
+                )
+            async for chunk in stream:
+                if chunk.text:
+                    chunks += 1
+                    yield chunk.text
+        except Exception as e:
+            if chunks:
+                raise IncompleteStreamError(f"Stream broke after {chunks} chunks: {e}") from e
+            if self.raise_errors:
+                raise
+            print(f"An error has occured: {e}")
@@ -0,0 +1,158 @@
+import os
+import threading
+from typing import TYPE_CHECKING
+
+# requests and httpx are imported by the first session or client that needs them
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientRegistry:
+    """
+    Owns every HTTP session and provider client used by the pipeline so that
+    connections are pooled and kept alive across stages, views and jobs.
+    Clients are created on first use and shared between threads.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST, http2: bool | None = None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections_per_host = max_connections_per_host
+        self.http2 = _http2_available() if http2 is None else http2
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS_PER_HOST and HTTP2 (0/1).
+        """
+        http2 = os.getenv("HTTP2")
+        return cls(
+            timeout=float(os.getenv("HTTP_TIMEOUT", DEFAULT_TIMEOUT)),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+            max_connections_per_host=int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", DEFAULT_MAX_CONNECTIONS_PER_HOST)),
+            http2=None if http2 is None else http2 == "1",
+        )
+
+    def _get_or_create(self, name, factory):
+        """
+        The client called name, created by factory on first use. factory runs
+        under the registry lock, so it must not call back into the registry.
+        """
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = factory()
+            return self._clients[name]
+
+    def session(self) -> "requests.Session":
+        """
+        Keep-alive requests session; each host gets its own pool of at most
+        max_connections_per_host connections and callers wait for a free one.
+        """
+        def factory():
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_connections_per_host,
+                                  pool_maxsize=self.max_connections_per_host, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            return session
+
+        return self._get_or_create("session", factory)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        """
+        Drop-in for requests.get on the shared session with the default timeouts.
+        """
+        kwargs.setdefault("timeout", (self.connect_timeout, self.timeout))
+        return self.session().get(url, **kwargs)
+
+    def httpx_client(self) -> "httpx.Client":
+        """
+        Shared httpx client (HTTP/2 when the h2 package is installed) for SDKs that accept one.
+        """
+        def factory():
+            import httpx
+
+            return httpx.Client(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=self.max_connections_per_host * 4,
+                                    max_keepalive_connections=self.max_connections_per_host),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+
+        return self._get_or_create("httpx", factory)
+
+    def inference_client(self, provider: str | None = None):
+        from huggingface_hub import InferenceClient
+
+        def factory():
+            kwargs = {"api_key": os.getenv("HF_TOKEN"), "timeout": self.timeout}
+            if provider:
+                kwargs["provider"] = provider
+            return InferenceClient(**kwargs)
+
+        return self._get_or_create(f"inference:{provider}", factory)
+
+    def fal(self):
+        """
+        A fal SyncClient; upload_file, submit and subscribe all reuse its connection pool.
+        """
+        import fal_client
+
+        return self._get_or_create("fal", lambda: fal_client.SyncClient(default_timeout=self.timeout))
+
+    def gemini(self, raise_errors: bool = False):
+        from gemini_llm import GeminiAdaptor
+
+        # Shared clients are fetched before taking the lock, which _get_or_create does not re-enter
+        http_client = self.httpx_client()
+        return self._get_or_create(f"gemini:{raise_errors}", lambda: GeminiAdaptor(
+            api_key=os.getenv("GEMINI_API_KEY"), http_client=http_client, raise_errors=raise_errors))
+
+    def openai(self, raise_errors: bool = False):
+        from openai_llm import OpenaiAdaptor
+
+        client = self.inference_client()
+        return self._get_or_create(f"openai:{raise_errors}", lambda: OpenaiAdaptor(
+            api_key=os.getenv("HF_TOKEN"), client=client, raise_errors=raise_errors))
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            close = getattr(client, "close", None)
+            if callable(close):
+                close()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ClientRegistry:
+    """
+    Returns the process-wide registry, configured from the environment on first use.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry.from_env()
+        return _registry
@@ -0,0 +1,248 @@
+"""
+Reproducible FLUX views. GenerationParams makes the seed, size, steps and
+guidance of a text_to_image call explicit, so the same prompt, model and
+params always describe the same image. ImageCache stores generated images on
+disk under a hash of exactly those inputs, and records the url of every
+uploaded file under the SHA-256 of its bytes, so uploading the same file
+again (from a rerun or another job) reuses the earlier upload. Perceptual
+hashes only flag views of one job that FLUX rendered almost identically: they
+ignore colour, so they never decide which upload a view gets.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from instrumentation import count
+
+DEFAULT_IMAGE_CACHE_DIR = ".image_cache"
+DEFAULT_DUPLICATE_DISTANCE = 4
+DEFAULT_UPLOAD_TTL = 24 * 3600
+UPLOADS_FILE = "uploads.json"
+
+
+class GenerationParams:
+    """
+    Parameters of a FLUX text_to_image call. A seed of None lets the provider
+    pick one, which makes the image unrepeatable, so it is never cached.
+    """
+
+    def __init__(self, seed: int | None = 0, width: int = 1024, height: int = 1024, steps: int = 28,
+                 guidance: float = 3.5):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.steps = steps
+        self.guidance = guidance
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads FLUX_SEED ("random" for none), FLUX_WIDTH, FLUX_HEIGHT, FLUX_STEPS and FLUX_GUIDANCE.
+        """
+        seed = os.getenv("FLUX_SEED", "0")
+        return cls(
+            seed=None if seed == "random" else int(seed),
+            width=int(os.getenv("FLUX_WIDTH", 1024)),
+            height=int(os.getenv("FLUX_HEIGHT", 1024)),
+            steps=int(os.getenv("FLUX_STEPS", 28)),
+            guidance=float(os.getenv("FLUX_GUIDANCE", 3.5)),
+        )
+
+    def to_dict(self) -> dict:
+        return {"seed": self.seed, "width": self.width, "height": self.height, "steps": self.steps,
+                "guidance": self.guidance}
+
+    def kwargs(self) -> dict:
+        """
+        Keyword arguments for InferenceClient.text_to_image.
+        """
+        kwargs = {"width": self.width, "height": self.height, "num_inference_steps": self.steps,
+                  "guidance_scale": self.guidance}
+        if self.seed is not None:
+            kwargs["seed"] = self.seed
+        return kwargs
+
+    def next_seed(self):
+        """
+        The same params with the following seed, for generating a different image.
+        """
+        seed = None if self.seed is None else self.seed + 1
+        return GenerationParams(seed, self.width, self.height, self.steps, self.guidance)
+
+
+DEFAULT_PARAMS = GenerationParams()
+
+
+def dhash(image, size: int = 8) -> int:
+    """
+    Difference hash of a PIL image: one bit per horizontally adjacent pixel
+    pair of a (size + 1) x size grayscale thumbnail. Small changes in
+    compression, noise or colour leave most bits unchanged.
+    """
+    thumbnail = image.convert("L").resize((size + 1, size))
+    pixels = thumbnail.tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualIndex:
+    """
+    Thread-safe set of perceptual hashes, each with a value. Two hashes at
+    most distance bits apart count as the same image.
+    """
+
+    def __init__(self, distance: int = DEFAULT_DUPLICATE_DISTANCE, entries: list | None = None):
+        self.distance = distance
+        self.entries = entries or []
+        self._lock = threading.Lock()
+
+    def _find(self, image_hash: int):
+        for known, value in self.entries:
+            if hamming(known, image_hash) <= self.distance:
+                return value
+        return None
+
+    def find(self, image_hash: int):
+        """
+        Value of a near-identical image, or None.
+        """
+        with self._lock:
+            return self._find(image_hash)
+
+    def claim(self, image_hash: int, value):
+        """
+        Adds the hash unless a near-identical image is already there, in which
+        case that image's value is returned instead (and the hash not added).
+        """
+        with self._lock:
+            existing = self._find(image_hash)
+            if existing is None:
+                self.entries.append((image_hash, value))
+            return existing
+
+
+class ImageCache:
+    """
+    Generated images as PNG files under root, keyed by prompt, model and
+    params, plus the urls of uploaded files by content hash in uploads.json.
+    Upload urls are reused for upload_ttl seconds, after which the provider
+    may have deleted the file. distance is the perceptual hash distance within
+    which two views of one job are reported as looking alike.
+    """
+
+    def __init__(self, root: str = DEFAULT_IMAGE_CACHE_DIR, distance: int = DEFAULT_DUPLICATE_DISTANCE,
+                 upload_ttl: float = DEFAULT_UPLOAD_TTL):
+        self.root = root
+        self.distance = distance
+        self.upload_ttl = upload_ttl
+        self._lock = threading.Lock()
+        self._uploads = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads IMAGE_CACHE_DIR ("off" disables the cache and returns None),
+        IMAGE_DUPLICATE_DISTANCE and IMAGE_UPLOAD_TTL.
+        """
+        root = os.getenv("IMAGE_CACHE_DIR", DEFAULT_IMAGE_CACHE_DIR)
+        if root == "off":
+            return None
+        return cls(root, int(os.getenv("IMAGE_DUPLICATE_DISTANCE", DEFAULT_DUPLICATE_DISTANCE)),
+                   float(os.getenv("IMAGE_UPLOAD_TTL", DEFAULT_UPLOAD_TTL)))
+
+    @staticmethod
+    def key(prompt: str, model: str, params: GenerationParams) -> str:
+        payload = json.dumps({"prompt": prompt, "model": model, "params": params.to_dict()}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, prompt: str, model: str, params: GenerationParams) -> str:
+        key = self.key(prompt, model, params)
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def get(self, prompt: str, model: str, params: GenerationParams):
+        """
+        The cached PIL image, or None.
+        """
+        if params.seed is None:
+            return None
+        path = self.path(prompt, model, params)
+        if not os.path.exists(path):
+            count("image_cache_misses")
+            return None
+        from PIL import Image
+
+        count("image_cache_hits")
+        with Image.open(path) as image:
+            image.load()
+            return image
+
+    def put(self, prompt: str, model: str, params: GenerationParams, image):
+        if params.seed is None:
+            return
+        path = self.path(prompt, model, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp, format="PNG")
+        os.replace(tmp, path)
+
+    def _load_uploads(self) -> dict:
+        if self._uploads is None:
+            self._uploads = {}
+            path = os.path.join(self.root, UPLOADS_FILE)
+            if os.path.exists(path):
+                with open(path) as f:
+                    # Entries in other layouts (perceptual hashes per format) are dropped
+                    self._uploads = {digest: entry for digest, entry in json.load(f).items()
+                                     if isinstance(entry, dict) and "url" in entry}
+        return self._uploads
+
+    def uploaded(self, digest: str) -> str | None:
+        """
+        The url of an earlier upload of the file with this SHA-256, if it has not expired.
+        """
+        with self._lock:
+            entry = self._load_uploads().get(digest)
+        if entry is None or time.time() - entry["time"] > self.upload_ttl:
+            return None
+        return entry["url"]
+
+    def record_upload(self, digest: str, url: str):
+        with self._lock:
+            uploads = self._load_uploads()
+            now = time.time()
+            uploads[digest] = {"url": url, "time": now}
+            for stale in [d for d, entry in uploads.items() if now - entry["time"] > self.upload_ttl]:
+                del uploads[stale]
+            self._save_uploads()
+
+    def forget_uploads(self, urls: list[str]):
+        """
+        Stops reusing these upload urls, e.g. after a provider could not fetch them.
+        """
+        urls = set(urls)
+        with self._lock:
+            uploads = self._load_uploads()
+            forgotten = [digest for digest, entry in uploads.items() if entry["url"] in urls]
+            for digest in forgotten:
+                del uploads[digest]
+            if forgotten:
+                self._save_uploads()
+
+    def _save_uploads(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, UPLOADS_FILE)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self._uploads, f)
+        os.replace(tmp, path)
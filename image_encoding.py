@@ -0,0 +1,58 @@
+import io
+import os
+
+FORMATS = {
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+class ImageEncoding:
+    """
+    How generated views are encoded before upload. PNG is lossless and uses
+    compress_level (0-9, lower is faster); WebP and JPEG use quality (1-100).
+    """
+
+    def __init__(self, format: str = "png", compress_level: int = 1, quality: int = 90):
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported image format {format}. Choose one of {', '.join(FORMATS)}.")
+        self.format = format
+        self.compress_level = compress_level
+        self.quality = quality
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads IMAGE_FORMAT, IMAGE_PNG_COMPRESS_LEVEL and IMAGE_QUALITY.
+        """
+        return cls(
+            format=os.getenv("IMAGE_FORMAT", "png").lower(),
+            compress_level=int(os.getenv("IMAGE_PNG_COMPRESS_LEVEL", 1)),
+            quality=int(os.getenv("IMAGE_QUALITY", 90)),
+        )
+
+    @property
+    def content_type(self) -> str:
+        return FORMATS[self.format][1]
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.format == "jpeg" else self.format
+
+    def encode(self, image) -> bytes:
+        """
+        Encodes a PIL image once into memory.
+        """
+        pil_format = FORMATS[self.format][0]
+        if pil_format == "PNG":
+            options = {"compress_level": self.compress_level}
+        else:
+            options = {"quality": self.quality}
+            # JPEG has no alpha channel
+            if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+        with io.BytesIO() as buffer:
+            image.save(buffer, format=pil_format, **options)
+            return buffer.getvalue()
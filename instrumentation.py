@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+class Span:
+    def __init__(self, name: str, start: float, duration: float, thread_id: int, attrs: dict):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.thread_id = thread_id
+        self.attrs = attrs
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "start": self.start, "duration": self.duration,
+                "thread": self.thread_id, "attrs": self.attrs}
+
+
+class Tracer:
+    """
+    Collects timed spans and counters for one process. Spans are stored with
+    their start relative to the tracer's creation, in seconds. With max_spans
+    only the latest spans are kept for export (a long-running service would
+    otherwise keep every span it ever recorded); summary() and the Prometheus
+    metrics still cover all of them.
+    """
+
+    def __init__(self, max_spans: int | None = None):
+        self.origin = time.perf_counter()
+        self.spans = deque(maxlen=max_spans)
+        self.counters = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Times the enclosed block. Attributes can be added to the yielded dict
+        while the block runs; an escaping exception is recorded as attrs["error"].
+        """
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, start, time.perf_counter() - start, **attrs)
+
+    def record(self, name: str, start: float, duration: float, **attrs):
+        """
+        Adds a span measured elsewhere; start is a time.perf_counter() value.
+        """
+        span = Span(name, start - self.origin, duration, threading.get_ident(), attrs)
+        with self._lock:
+            self.spans.append(span)
+            entry = self._stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += duration
+            entry["max"] = max(entry["max"], duration)
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict:
+        """
+        Per span name: count, total and max duration in seconds, over every
+        span recorded, including those max_spans dropped.
+        """
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stats.items()}
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {"spans": [span.to_dict() for span in self.spans], "counters": dict(self.counters)}
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Trace Event Format, viewable in chrome://tracing or https://ui.perfetto.dev.
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = [{
+                "name": span.name, "ph": "X", "pid": pid, "tid": span.thread_id,
+                "ts": span.start * 1e6, "dur": span.duration * 1e6, "args": span.attrs,
+            } for span in self.spans]
+            events += [{
+                "name": name, "ph": "C", "pid": pid, "ts": (time.perf_counter() - self.origin) * 1e6,
+                "args": {name: value},
+            } for name, value in self.counters.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str, format: str = "json"):
+        """
+        Writes the trace to path as plain json or as a chrome trace.
+        """
+        data = self.to_chrome_trace() if format == "chrome" else self.to_json()
+        with open(path, 'w') as f:
+            json.dump(data, f, default=str)
+
+    def prometheus_text(self) -> str:
+        """
+        Counters and per-stage duration summaries in the Prometheus text format.
+        """
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in sorted(counters.items()):
+            metric = "pipeline_" + name.replace(".", "_").replace("-", "_") + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        summary = self.summary()
+        if summary:
+            lines.append("# TYPE pipeline_stage_seconds summary")
+            for name, entry in sorted(summary.items()):
+                lines.append(f'pipeline_stage_seconds_sum{{stage="{name}"}} {entry["total"]:.6f}')
+                lines.append(f'pipeline_stage_seconds_count{{stage="{name}"}} {entry["count"]}')
+            lines.append("# TYPE pipeline_stage_seconds_max gauge")
+            for name, entry in sorted(summary.items()):
+                lines.append(f'pipeline_stage_seconds_max{{stage="{name}"}} {entry["max"]:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+        """
+        Serves prometheus_text() on /metrics from a daemon thread. Call
+        shutdown() on the returned server to stop it.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """
+    Replaces the process-wide tracer (e.g. one per batch run) and returns the previous one.
+    """
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+def span(name: str, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def count(name: str, value: int = 1):
+    _tracer.count(name, value)
@@ -0,0 +1,379 @@
+"""
+Long-running job service. Instead of one blocking main.py process per object,
+requests are submitted to a JobService over HTTP (or a Unix socket) and run
+through the batch pipeline stages by a pool of workers. Identical requests
+that arrive while one is queued or running share its execution, so two
+users asking for the same object pay once for the LLM, the FLUX views and
+the Trellis job; finished objects are reused through the stage cache. Jobs
+are started highest priority first, and each provider has a fixed number of
+PrioritySlots shared by every job, so a burst of jobs never oversubscribes
+FLUX or fal and urgent jobs get the next free slot.
+
+    python job_service.py --port 8300
+    curl -X POST localhost:8300/jobs -d '{"object": "a wooden chair", "priority": 1}'
+    curl 'localhost:8300/jobs/<id>/result?wait=60'
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+from batch import BatchRunner, PrioritySlots
+from instrumentation import count
+
+DEFAULT_PORT = 8300
+DEFAULT_WORKERS = 8
+MAX_FINISHED_JOBS = 1000
+MAX_WAIT = 300
+# socketserver's default listen backlog of 5 refuses bursts of concurrent submissions
+LISTEN_BACKLOG = 128
+# Spans kept for export while serving; older ones only count towards the metrics
+MAX_TRACE_SPANS = 10000
+
+# The stages whose provider calls each slot pool guards
+PROVIDER_STAGES = {
+    "llm": ("prompt",),
+    "flux": ("views",),
+    "fal": ("reconstruct",),
+    "download": ("download",),
+    "local": ("postprocess",),
+}
+DEFAULT_SLOTS = {"llm": 4, "flux": 2, "fal": 2, "download": 4, "local": 1}
+
+
+def request_key(request: str) -> str:
+    """
+    Key under which identical requests are coalesced; case and whitespace are ignored.
+    """
+    normalized = re.sub(r"\s+", " ", request).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class Job:
+    """
+    One execution of a request, shared by every submission coalesced into it.
+    """
+
+    def __init__(self, id: str, request: str, key: str, priority: int = 0):
+        self.id = id
+        self.request = request
+        self.key = key
+        self.priority = priority
+        self.status = "queued"
+        self.requests = 1
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        # The job as BatchRunner runs it; its priority is read again before each stage
+        self.spec = {"id": id, "object": request, "priority": priority}
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "object": self.request,
+            "priority": self.priority,
+            "status": self.status,
+            "requests": self.requests,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+        }
+
+
+class JobService:
+    """
+    Runs submitted requests with workers threads through a BatchRunner over
+    services and config (a text_to_3d.PipelineConfig). slots overrides
+    DEFAULT_SLOTS per provider; other keyword arguments are passed to BatchRunner. Call start() to begin running jobs
+    and close() to stop once the queue is empty.
+    """
+
+    def __init__(self, services, config=None, output_dir: str = "service_output", workers: int = DEFAULT_WORKERS,
+                 slots: dict | None = None, max_finished: int = MAX_FINISHED_JOBS, **runner_options):
+        limits = {**DEFAULT_SLOTS, **(slots or {})}
+        self.slots = {provider: PrioritySlots(limit) for provider, limit in limits.items()}
+        stage_slots = {stage: self.slots[provider]
+                       for provider, stages in PROVIDER_STAGES.items() for stage in stages}
+        self.runner = BatchRunner(services, config, output_dir=output_dir, workers=workers, slots=stage_slots,
+                                  **runner_options)
+        self.workers = workers
+        self.max_finished = max_finished
+        self.jobs = {}
+        self.counters = {"submitted": 0, "coalesced": 0, "executed": 0, "failed": 0}
+        self._in_flight = {}
+        self._finished = deque()
+        self._queue = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        os.makedirs(self.runner.output_dir, exist_ok=True)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self, timeout: float | None = None):
+        """
+        Stops accepting jobs and waits for the workers to finish the queue.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, request: str, priority: int = 0) -> tuple[Job, bool]:
+        """
+        Queues request and returns its job and whether it joined an identical
+        queued or running job. Joining raises that job's priority to priority
+        if it is higher.
+        """
+        key = request_key(request)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The job service is closed")
+            self.counters["submitted"] += 1
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.requests += 1
+                self.counters["coalesced"] += 1
+                count("jobs_coalesced")
+                if priority > job.priority:
+                    job.priority = job.spec["priority"] = priority
+                    if job.status == "queued":
+                        self._push(job)
+                return job, True
+
+            job = Job(uuid.uuid4().hex[:12], request, key, priority)
+            self.jobs[job.id] = job
+            self._in_flight[key] = job
+            self._push(job)
+            return job, False
+
+    def _push(self, job):
+        # A job whose priority was raised is pushed again; the stale entry is skipped when popped
+        heapq.heappush(self._queue, (-job.priority, next(self._order), job))
+        self._condition.notify()
+
+    def _next(self) -> Job | None:
+        with self._condition:
+            while True:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return None
+                job = heapq.heappop(self._queue)[2]
+                if job.status == "queued":
+                    job.status = "running"
+                    job.started = time.time()
+                    return job
+
+    def _work(self):
+        while (job := self._next()) is not None:
+            try:
+                result = self.runner.run_job(job.spec)
+            except Exception as e:
+                result = {"id": job.id, "object": job.request, "status": "failed", "error": str(e)}
+            self._finish(job, result)
+
+    def _finish(self, job, result):
+        with self._condition:
+            job.result = result
+            job.status = result["status"]
+            job.finished = time.time()
+            del self._in_flight[job.key]
+            self.counters["executed"] += 1
+            if job.status == "failed":
+                self.counters["failed"] += 1
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_finished:
+                self.jobs.pop(self._finished.popleft(), None)
+        job.done.set()
+
+    def list_jobs(self) -> list[Job]:
+        with self._condition:
+            return list(self.jobs.values())
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float | None = None) -> Job | None:
+        """
+        The job once it finished, or still unfinished after timeout seconds; None if unknown.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def stats(self) -> dict:
+        """
+        Counters, queue length and slot usage per provider. Each coalesced
+        submission is one execution, and all its provider calls, saved.
+        """
+        with self._condition:
+            statuses = [job.status for job in self.jobs.values()]
+            return {
+                **self.counters,
+                "queued": statuses.count("queued"),
+                "running": statuses.count("running"),
+                "slots": {provider: {"limit": slots.limit, "in_use": slots.in_use, "waiting": slots.waiting}
+                          for provider, slots in self.slots.items()},
+            }
+
+
+def _handler(service: JobService):
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, urlsplit
+
+    class JobHandler(BaseHTTPRequestHandler):
+        """
+        POST /jobs {"object": ..., "priority": 0}, GET /jobs, GET /jobs/<id>,
+        GET /jobs/<id>/result?wait=<seconds> and GET /stats, all JSON.
+        """
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                request = body.get("object")
+                priority = int(body.get("priority", 0))
+            except (ValueError, AttributeError) as e:
+                self._send(400, {"error": f"invalid request: {e}"})
+                return
+            if not isinstance(request, str) or not request.strip():
+                self._send(400, {"error": 'a non-empty "object" is required'})
+                return
+            try:
+                job, coalesced = service.submit(request, priority)
+            except RuntimeError as e:
+                self._send(503, {"error": str(e)})
+                return
+            self._send(202, {**job.to_dict(), "coalesced": coalesced})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            parts = [part for part in url.path.split("/") if part]
+            if parts == ["stats"]:
+                self._send(200, service.stats())
+            elif parts == ["jobs"]:
+                self._send(200, [job.to_dict() for job in service.list_jobs()])
+            elif len(parts) in (2, 3) and parts[0] == "jobs" and parts[2:] in ([], ["result"]):
+                wait = 0.0
+                if parts[2:]:
+                    try:
+                        wait = min(float(parse_qs(url.query).get("wait", ["0"])[0]), MAX_WAIT)
+                    except ValueError:
+                        self._send(400, {"error": "wait must be a number of seconds"})
+                        return
+                job = service.wait(parts[1], wait)
+                if job is None:
+                    self._send(404, {"error": f"unknown job {parts[1]}"})
+                else:
+                    # 202 while a result is still pending
+                    self._send(200 if job.done.is_set() or not parts[2:] else 202, job.to_dict())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def _send(self, status, data):
+            body = json.dumps(data, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return JobHandler
+
+
+def serve(service: JobService, port: int = DEFAULT_PORT, host: str = "127.0.0.1", socket_path: str | None = None):
+    """
+    Serves the job API for service from a daemon thread, on host:port or on
+    the Unix socket socket_path if given. Call shutdown() on the returned
+    server to stop it.
+    """
+    import socketserver
+    from http.server import ThreadingHTTPServer
+
+    handler = _handler(service)
+    if socket_path:
+        class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            request_queue_size = LISTEN_BACKLOG
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+    else:
+        class HTTPServer(ThreadingHTTPServer):
+            request_queue_size = LISTEN_BACKLOG
+
+        server = HTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve text-to-3D jobs over HTTP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of host:port")
+    parser.add_argument("--llm", choices=["gemini", "openai"], default="gemini")
+    parser.add_argument("--output-dir", default="service_output")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jobs in progress at once")
+    for provider, limit in DEFAULT_SLOTS.items():
+        parser.add_argument(f"--{provider}-slots", type=int, default=limit,
+                            help=f"Max concurrent {provider} stages across all jobs (default {limit})")
+    parser.add_argument("--lods", type=int, nargs="+",
+                        help="Also write decimated levels of detail with these triangle budgets")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port while running")
+    args = parser.parse_args()
+
+    from instrumentation import Tracer, set_tracer
+    from text_to_3d import PipelineConfig, build_services
+
+    tracer = Tracer(max_spans=MAX_TRACE_SPANS)
+    set_tracer(tracer)
+    if args.metrics_port:
+        tracer.serve_prometheus(args.metrics_port)
+
+    config = PipelineConfig.from_env(llm=args.llm, **({"lods": args.lods} if args.lods else {}))
+    service = JobService(build_services(config), config, output_dir=args.output_dir, workers=args.workers,
+                         slots={provider: getattr(args, f"{provider}_slots") for provider in DEFAULT_SLOTS})
+    service.start()
+    server = serve(service, args.port, args.host, args.socket)
+    print(f"Serving jobs on {args.socket or f'http://{args.host}:{args.port}'} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nFinishing queued jobs...")
+    finally:
+        server.shutdown()
+        service.close()
+        service.runner.pipeline.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
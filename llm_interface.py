@@ -1,10 +1,79 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+
+class IncompleteStreamError(RuntimeError):
+    '''
+    raised by astream_prompt when the stream broke after some text was already
+    yielded, so callers never mistake a truncated prompt for a complete one
+    '''
+
 
 class LLMInterface(ABC):
+    '''
+    a text-to-image prompt generator. Adapters print errors and return None
+    unless raise_errors is set, in which case errors propagate so a caller such
+    as resilience.FailoverLLM can retry them or fail over
+    '''
+
+    raise_errors = False
 
     @abstractmethod
-    def generate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None: 
+    def generate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None:
         '''
         generates prompts for text-to-image part
         '''
-        pass
\ No newline at end of file
+        pass
+
+    async def agenerate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None:
+        '''
+        async variant of generate_prompt. Adapters without a native async client
+        fall back to running generate_prompt in a worker thread
+        '''
+        return await asyncio.to_thread(self.generate_prompt, prompt, model, system_instruction)
+
+    async def astream_prompt(self, prompt: str, model: str, system_instruction: str) -> AsyncIterator[str]:
+        '''
+        yields the prompt in chunks as they are generated. The default yields
+        the whole agenerate_prompt result as a single chunk. A failure after
+        the first chunk raises IncompleteStreamError
+        '''
+        response = await self.agenerate_prompt(prompt, model, system_instruction)
+        if response:
+            yield response
+
+
+class StreamStats:
+    '''
+    timings of one streamed generation, in seconds
+    '''
+
+    def __init__(self):
+        self.time_to_first_token = None
+        self.total_time = None
+        self.chunks = 0
+
+    def __repr__(self):
+        ttft = "n/a" if self.time_to_first_token is None else f"{self.time_to_first_token:.2f}s"
+        return f"time to first token {ttft}, total {self.total_time:.2f}s, {self.chunks} chunks"
+
+
+async def collect_stream(stream: AsyncIterator[str], on_chunk=None) -> tuple[str | None, StreamStats]:
+    '''
+    consumes a prompt stream, calling on_chunk for each chunk, and returns the
+    full text (None if nothing was generated) with its StreamStats
+    '''
+    stats = StreamStats()
+    chunks = []
+    start = time.perf_counter()
+    async for chunk in stream:
+        if stats.time_to_first_token is None:
+            stats.time_to_first_token = time.perf_counter() - start
+        stats.chunks += 1
+        chunks.append(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    stats.total_time = time.perf_counter() - start
+    return ("".join(chunks) or None), stats
@@ -0,0 +1,278 @@
+"""
+Headless post-processing of downloaded Trellis models: cleanup, decimation to
+level-of-detail (LOD) triangle budgets and compact export. Nothing here opens a
+window, so it runs on servers without a display.
+
+    python mesh_processing.py model.glb --lods 20000 5000 1000 --formats npz glb
+"""
+import argparse
+import os
+
+import numpy as np
+
+from instrumentation import span
+
+DEFAULT_LODS = (20000, 5000, 1000)
+FORMATS = ("npz", "glb")
+
+
+class Mesh:
+    """
+    Triangle mesh as flat arrays: float vertices (n, 3), int faces (m, 3) and
+    optional uint8 RGBA vertex colors (n, 4).
+    """
+
+    def __init__(self, vertices, faces, colors=None):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.colors = None if colors is None else np.asarray(colors, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.faces)
+
+
+def load_mesh(path: str) -> Mesh:
+    """
+    Loads a GLB (or any format trimesh reads) as one mesh. Textures are baked
+    into vertex colors so they survive cleanup and decimation.
+    """
+    import trimesh
+
+    loaded = trimesh.load(path, force="mesh", process=False)
+    colors = None
+    try:
+        colors = loaded.visual.to_color().vertex_colors
+    except Exception:
+        pass
+    if colors is not None and len(colors) != len(loaded.vertices):
+        colors = None
+    return Mesh(loaded.vertices, loaded.faces, colors)
+
+
+def merge_vertices(mesh: Mesh, decimals: int = 6) -> Mesh:
+    """
+    Merges vertices that share a position after rounding (e.g. split along UV seams).
+    """
+    keys = np.round(mesh.vertices, decimals)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    colors = None if mesh.colors is None else mesh.colors[first]
+    return Mesh(mesh.vertices[first], inverse.reshape(-1)[mesh.faces], colors)
+
+
+def remove_degenerate(mesh: Mesh, min_area: float = 1e-12) -> Mesh:
+    """
+    Drops faces that repeat a vertex, have (near) zero area or duplicate
+    another face, then drops vertices no face uses.
+    """
+    faces = mesh.faces
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    keep &= face_areas(mesh.vertices, faces) > min_area
+    faces = faces[keep]
+
+    _, unique = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(unique)]
+    return _compact(Mesh(mesh.vertices, faces, mesh.colors))
+
+
+def _compact(mesh: Mesh) -> Mesh:
+    used, inverse = np.unique(mesh.faces, return_inverse=True)
+    colors = None if mesh.colors is None else mesh.colors[used]
+    return Mesh(mesh.vertices[used], inverse.reshape(-1, 3), colors)
+
+
+def face_areas(vertices, faces):
+    v = vertices[faces]
+    return 0.5 * np.linalg.norm(np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0]), axis=1)
+
+
+def vertex_normals(mesh: Mesh) -> np.ndarray:
+    """
+    Area-weighted unit vertex normals.
+    """
+    v = mesh.vertices[mesh.faces]
+    # The cross product's length is twice the face area, which gives the weighting
+    face_normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    normals = np.zeros_like(mesh.vertices)
+    for corner in range(3):
+        np.add.at(normals, mesh.faces[:, corner], face_normals)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(lengths == 0, 1, lengths)
+
+
+def cleanup(mesh: Mesh) -> Mesh:
+    return remove_degenerate(merge_vertices(mesh))
+
+
+def decimate(mesh: Mesh, target_faces: int) -> Mesh:
+    """
+    Reduces mesh to at most target_faces triangles with open3d's quadric
+    decimation. Where open3d cannot be loaded (it needs system libraries that
+    headless images often lack) a vectorized vertex clustering is used instead.
+    """
+    if len(mesh) <= target_faces:
+        return mesh
+    try:
+        return _decimate_quadric(mesh, target_faces)
+    except (ImportError, OSError):
+        return _decimate_clustering(mesh, target_faces)
+
+
+def _decimate_quadric(mesh: Mesh, target_faces: int) -> Mesh:
+    import open3d as o3d
+
+    o3d_mesh = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(mesh.vertices),
+                                         o3d.utility.Vector3iVector(mesh.faces.astype(np.int32)))
+    if mesh.colors is not None:
+        o3d_mesh.vertex_colors = o3d.utility.Vector3dVector(mesh.colors[:, :3] / 255.0)
+    simplified = o3d_mesh.simplify_quadric_decimation(target_number_of_triangles=target_faces)
+
+    colors = None
+    if mesh.colors is not None and simplified.has_vertex_colors():
+        rgb = np.round(np.asarray(simplified.vertex_colors) * 255).astype(np.uint8)
+        colors = np.column_stack([rgb, np.full(len(rgb), 255, dtype=np.uint8)])
+    return remove_degenerate(Mesh(np.asarray(simplified.vertices), np.asarray(simplified.triangles), colors))
+
+
+def _cluster(mesh: Mesh, resolution: int) -> Mesh:
+    """
+    Snaps vertices to a grid with resolution cells along the longest side and
+    replaces each occupied cell by the mean of its vertices.
+    """
+    low = mesh.vertices.min(axis=0)
+    extent = float((mesh.vertices.max(axis=0) - low).max()) or 1.0
+    cells = np.floor((mesh.vertices - low) / extent * resolution).astype(np.int64)
+    _, inverse, sizes = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    vertices = np.zeros((len(sizes), 3))
+    np.add.at(vertices, inverse, mesh.vertices)
+    vertices /= sizes[:, None]
+
+    colors = None
+    if mesh.colors is not None:
+        summed = np.zeros((len(sizes), mesh.colors.shape[1]))
+        np.add.at(summed, inverse, mesh.colors)
+        colors = np.round(summed / sizes[:, None]).astype(np.uint8)
+    return remove_degenerate(Mesh(vertices, inverse[mesh.faces], colors), min_area=0)
+
+
+def _decimate_clustering(mesh: Mesh, target_faces: int) -> Mesh:
+    # Binary search for the finest grid that fits the budget
+    low, high, best = 1, 1024, None
+    while low <= high:
+        resolution = (low + high) // 2
+        clustered = _cluster(mesh, resolution)
+        if len(clustered) <= target_faces:
+            best = clustered
+            low = resolution + 1
+        else:
+            high = resolution - 1
+    return best if best is not None else _cluster(mesh, 1)
+
+
+def build_lods(mesh: Mesh, budgets=DEFAULT_LODS) -> list[Mesh]:
+    """
+    Cleans mesh and decimates it to each triangle budget, largest first. Each
+    level is decimated from the previous one, so later levels are cheaper.
+    """
+    lods = []
+    current = cleanup(mesh)
+    for budget in sorted(budgets, reverse=True):
+        with span("decimate", faces=budget):
+            current = decimate(current, budget)
+        lods.append(current)
+    return lods
+
+
+def quantize(values: np.ndarray, bits: int = 16):
+    """
+    Maps float positions onto unsigned integers over their bounding box.
+    Returns (quantized, offset, scale); values ~= quantized * scale + offset.
+    """
+    dtype = np.uint16 if bits <= 16 else np.uint32
+    if not len(values):
+        # An empty mesh has no bounding box
+        return np.zeros(values.shape, dtype=dtype), np.zeros(values.shape[1:]), np.ones(values.shape[1:])
+    offset = values.min(axis=0)
+    scale = (values.max(axis=0) - offset) / (2 ** bits - 1)
+    scale[scale == 0] = 1.0
+    return np.round((values - offset) / scale).astype(dtype), offset, scale
+
+
+def save_npz(mesh: Mesh, path: str, bits: int = 16) -> str:
+    """
+    Writes mesh compactly: positions quantized to `bits` per axis, normals as
+    int8, faces as uint16 when the vertex count allows.
+    """
+    positions, offset, scale = quantize(mesh.vertices, bits)
+    arrays = {
+        "positions": positions,
+        "offset": offset.astype(np.float32),
+        "scale": scale.astype(np.float32),
+        "normals": np.round(vertex_normals(mesh) * 127).astype(np.int8),
+        "faces": mesh.faces.astype(np.uint16 if len(mesh.vertices) <= 65536 else np.uint32),
+    }
+    if mesh.colors is not None:
+        arrays["colors"] = mesh.colors
+    np.savez_compressed(path, **arrays)
+    return path
+
+
+def load_npz(path: str) -> Mesh:
+    with np.load(path) as data:
+        vertices = data["positions"] * data["scale"].astype(np.float64) + data["offset"]
+        colors = data["colors"] if "colors" in data else None
+        return Mesh(vertices, data["faces"], colors)
+
+
+def save_glb(mesh: Mesh, path: str) -> str:
+    import trimesh
+
+    trimesh.Trimesh(mesh.vertices.astype(np.float32), mesh.faces, vertex_colors=mesh.colors,
+                    vertex_normals=vertex_normals(mesh), process=False).export(path, file_type="glb")
+    return path
+
+
+def process(path: str, output_dir: str | None = None, budgets=DEFAULT_LODS, formats=FORMATS) -> list[dict]:
+    """
+    Writes LODs of the model at path as <name>_lod<i>.<format> next to it (or
+    in output_dir) and returns a record per file with its face count and size.
+    """
+    output_dir = output_dir or os.path.dirname(path)
+    os.makedirs(output_dir or ".", exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    with span("postprocess") as attrs:
+        with span("mesh_load"):
+            mesh = load_mesh(path)
+        attrs["faces"] = len(mesh)
+        outputs = []
+        for level, lod in enumerate(build_lods(mesh, budgets)):
+            for fmt in formats:
+                out = os.path.join(output_dir, f"{name}_lod{level}.{fmt}")
+                if fmt == "npz":
+                    save_npz(lod, out)
+                elif fmt == "glb":
+                    save_glb(lod, out)
+                else:
+                    raise ValueError(f"Unknown mesh format {fmt}")
+                outputs.append({"lod": level, "faces": len(lod), "path": out, "bytes": os.path.getsize(out)})
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean up a model and write decimated LODs.")
+    parser.add_argument("model", help="GLB (or other mesh) to process")
+    parser.add_argument("--output-dir", default=None)
+    parser.add_argument("--lods", type=int, nargs="+", default=list(DEFAULT_LODS),
+                        help="Triangle budget of each level of detail")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    args = parser.parse_args()
+
+    print(f"{args.model}: {os.path.getsize(args.model)} bytes")
+    for output in process(args.model, args.output_dir, args.lods, args.formats):
+        print(f"LOD {output['lod']}: {output['faces']} faces, {output['bytes']} bytes -> {output['path']}")
+
+
+if __name__ == "__main__":
+    main()
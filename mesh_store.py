@@ -0,0 +1,257 @@
+"""
+Store of generated models as flat, memory-mappable arrays. Ingesting a GLB
+parses it once and writes its vertex, face, normal and UV arrays back to back
+into <root>/<key>.bin; index.json records where each array lives plus the
+counts and bounding box of every asset. Opening an asset maps the file and
+returns NumPy views into it, so it costs the same for any mesh size, and
+listing or bounding-box queries never touch the array files.
+
+    python mesh_store.py ingest batch_output/*/model.glb
+    python mesh_store.py list
+    python mesh_store.py query --min -1 -1 -1 --max 1 1 1
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from instrumentation import span
+from model_cache import file_sha256
+
+DEFAULT_STORE_DIR = ".mesh_store"
+INDEX_FILE = "index.json"
+# Arrays start on 64 byte boundaries so views are aligned for vectorized reads
+ALIGNMENT = 64
+
+
+class StoredMesh:
+    """
+    Read-only NumPy views over one stored asset. Nothing is copied until the
+    arrays are read; close() (or the context manager) releases the mapping.
+    """
+
+    def __init__(self, key, entry, mapping):
+        self.key = key
+        self.entry = entry
+        self._mapping = mapping
+        self.arrays = {
+            name: np.frombuffer(mapping, dtype=spec["dtype"], count=int(np.prod(spec["shape"])),
+                                offset=spec["offset"]).reshape(spec["shape"])
+            for name, spec in entry["arrays"].items()
+        }
+
+    @property
+    def vertices(self):
+        return self.arrays["vertices"]
+
+    @property
+    def faces(self):
+        return self.arrays["faces"]
+
+    @property
+    def normals(self):
+        return self.arrays.get("normals")
+
+    @property
+    def uvs(self):
+        return self.arrays.get("uvs")
+
+    def close(self):
+        self.arrays = {}
+        self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class MeshStore:
+    """
+    Flat array store of meshes with a JSON index. Keys default to the sha256 of
+    the ingested file, so ingesting the same model twice is a no-op.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        # Keys being ingested, so concurrent ingests of one model parse it once
+        self._ingesting = {}
+        self._index = self._read_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def _read_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def _write_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def data_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.bin")
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def ingest(self, path: str, key: str | None = None, **metadata) -> str:
+        """
+        Parses the model at path and stores its arrays. Extra keyword arguments
+        are kept in the index entry. Returns the asset key.
+        """
+        if key is None:
+            key = file_sha256(path)
+        with self._lock:
+            if key in self._index:
+                return key
+            ingesting = self._ingesting.get(key)
+            if ingesting is None:
+                self._ingesting[key] = threading.Event()
+        if ingesting is not None:
+            # Another thread is storing the same key; if it failed, try again here
+            ingesting.wait()
+            return self.ingest(path, key, **metadata)
+
+        try:
+            self._ingest(path, key, metadata)
+        finally:
+            with self._lock:
+                self._ingesting.pop(key).set()
+        return key
+
+    def _ingest(self, path, key, metadata):
+        import trimesh
+
+        from mesh_processing import Mesh, vertex_normals
+
+        with span("mesh_ingest") as attrs:
+            mesh = trimesh.load(path, force="mesh", process=False)
+            arrays = {
+                "vertices": np.ascontiguousarray(mesh.vertices, dtype=np.float32),
+                "faces": np.ascontiguousarray(mesh.faces, dtype=np.uint32),
+                "normals": vertex_normals(Mesh(mesh.vertices, mesh.faces)).astype(np.float32),
+            }
+            uv = getattr(mesh.visual, "uv", None)
+            if uv is not None and len(uv) == len(mesh.vertices):
+                arrays["uvs"] = np.ascontiguousarray(uv, dtype=np.float32)
+            attrs["faces"] = len(mesh.faces)
+            self.put(key, arrays, source=os.path.abspath(path), **metadata)
+
+    def put(self, key: str, arrays: dict, **metadata) -> str:
+        """
+        Stores named arrays (at least "vertices" and "faces") under key.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        specs = {}
+        offset = 0
+        # A unique temporary file, so concurrent puts of one key never write into each other
+        fd, tmp = tempfile.mkstemp(suffix=".part", prefix=f"{key}.", dir=self.root)
+        with os.fdopen(fd, 'wb') as f:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                padding = -offset % ALIGNMENT
+                f.write(b"\0" * padding)
+                offset += padding
+                specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+                f.write(array.tobytes())
+                offset += array.nbytes
+        os.replace(tmp, self.data_path(key))
+
+        vertices = arrays["vertices"]
+        entry = {
+            "vertices": len(vertices),
+            "faces": len(arrays["faces"]),
+            "bbox": [vertices.min(axis=0).tolist(), vertices.max(axis=0).tolist()] if len(vertices) else None,
+            "bytes": offset,
+            "arrays": specs,
+            "created": time.time(),
+            **metadata,
+        }
+        with self._lock:
+            self._index[key] = entry
+            self._write_index()
+        return key
+
+    def open(self, key: str) -> StoredMesh:
+        """
+        Memory-maps an asset and returns views of its arrays. Raises KeyError for unknown keys.
+        """
+        entry = self._index[key]
+        with span("mesh_open"):
+            # An empty file cannot be mapped; an empty mesh has nothing to map anyway
+            mapping = np.memmap(self.data_path(key), dtype=np.uint8, mode="r") if entry["bytes"] else b""
+            return StoredMesh(key, entry, mapping)
+
+    def remove(self, key: str):
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                self._write_index()
+        if os.path.exists(self.data_path(key)):
+            os.remove(self.data_path(key))
+
+    def entries(self) -> list[dict]:
+        """
+        Index entries of every asset, from the index alone.
+        """
+        return [{"key": key, **entry} for key, entry in self._index.items()]
+
+    def bbox(self, key: str):
+        return self._index[key]["bbox"]
+
+    def query_bbox(self, low, high) -> list[str]:
+        """
+        Keys of assets whose bounding box intersects the box [low, high].
+        """
+        low, high = np.asarray(low, dtype=float), np.asarray(high, dtype=float)
+        keys = [key for key, entry in self._index.items() if entry["bbox"] is not None]
+        if not keys:
+            return []
+        boxes = np.array([self._index[key]["bbox"] for key in keys])
+        hits = np.all((boxes[:, 0] <= high) & (boxes[:, 1] >= low), axis=1)
+        return [key for key, hit in zip(keys, hits) if hit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped store of generated models.")
+    parser.add_argument("--root", default=DEFAULT_STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Add models to the store")
+    ingest.add_argument("models", nargs="+")
+    commands.add_parser("list", help="List stored models")
+    query = commands.add_parser("query", help="Models whose bounding box intersects a box")
+    query.add_argument("--min", type=float, nargs=3, required=True)
+    query.add_argument("--max", type=float, nargs=3, required=True)
+    args = parser.parse_args()
+
+    store = MeshStore(args.root)
+    if args.command == "ingest":
+        for model in args.models:
+            print(f"{store.ingest(model)}  {model}")
+    elif args.command == "list":
+        for entry in store.entries():
+            print(f"{entry['key']}  {entry['vertices']} vertices, {entry['faces']} faces, "
+                  f"{entry['bytes']} bytes  {entry.get('source', '')}")
+    else:
+        for key in store.query_bbox(args.min, args.max):
+            print(key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from instrumentation import count, span
+
+CHUNK_SIZE = 1024 * 1024
+# Next to each .part file: the url, ETag and Last-Modified it was downloaded from
+SOURCE_SUFFIX = ".source.json"
+DEFAULT_CACHE_DIR = ".model_cache"
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def file_sha256(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _total_size(response, offset: int) -> int | None:
+    """
+    Full size of the remote file from Content-Range (206) or Content-Length (200).
+    """
+    content_range = response.headers.get("Content-Range")
+    if response.status_code == 206 and content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+
+    length = response.headers.get("Content-Length")
+    if length is None:
+        return None
+    return int(length) + (offset if response.status_code == 206 else 0)
+
+
+def stream_download(get, url: str, path: str, expected_size: int | None = None,
+                    expected_sha256: str | None = None, chunk_size: int = CHUNK_SIZE,
+                    max_attempts: int = 3) -> str:
+    """
+    Streams url to path in chunks through a requests.get compatible callable.
+    Data goes to path + ".part" and is renamed into place only once complete and
+    verified, so path never holds a partial file. An interrupted transfer is
+    resumed with an HTTP Range request, including from a previous run's .part
+    file, but only if that file came from the same url and, through If-Range,
+    the remote file is unchanged.
+    """
+    part = path + ".part"
+    with span("download") as attrs:
+        total = _stream_to_part(get, url, part, chunk_size, max_attempts)
+        attrs["bytes"] = os.path.getsize(part)
+
+    size = os.path.getsize(part)
+    for expected in (expected_size, total):
+        if expected is not None and size != expected:
+            _discard(part)
+            raise DownloadError(f"Downloaded {size} bytes from {url}, expected {expected}")
+
+    if expected_sha256 is not None and file_sha256(part) != expected_sha256:
+        _discard(part)
+        raise DownloadError(f"Checksum mismatch downloading {url}")
+
+    os.replace(part, path)
+    _discard(part + SOURCE_SUFFIX)
+    return path
+
+
+def _discard(path: str):
+    for name in (path, path + SOURCE_SUFFIX):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _read_source(part: str) -> dict | None:
+    try:
+        with open(part + SOURCE_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_source(part: str, url: str, response):
+    """
+    Records where part comes from, so a later resume can check it is the same file.
+    """
+    source = {"url": url, "etag": response.headers.get("ETag"),
+              "last_modified": response.headers.get("Last-Modified")}
+    with open(part + SOURCE_SUFFIX, 'w') as f:
+        json.dump(source, f)
+
+
+def _stream_to_part(get, url, part, chunk_size, max_attempts) -> int | None:
+    """
+    Fills part from url, resuming on broken connections. Returns the remote size if known.
+    """
+    import requests
+
+    total = None
+    for attempt in range(1, max_attempts + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        source = _read_source(part) if offset else None
+        if offset and (source is None or source["url"] != url):
+            # Left over from another url, or from before sources were recorded
+            _discard(part)
+            offset = 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = source.get("etag") or source.get("last_modified")
+            if validator:
+                # The server sends the whole file instead if it changed since
+                headers["If-Range"] = validator
+        try:
+            with get(url, stream=True, headers=headers) as response:
+                # 416: the .part file already holds the whole range
+                if response.status_code == 416 and offset:
+                    break
+                if response.status_code not in (200, 206):
+                    raise DownloadError(f"HTTP {response.status_code} downloading {url}")
+                etag = response.headers.get("ETag")
+                if response.status_code == 206 and source.get("etag") and etag and etag != source["etag"]:
+                    # The server ignored If-Range and the file changed: start over
+                    _discard(part)
+                    if attempt == max_attempts:
+                        raise DownloadError(f"{url} changed while resuming its download")
+                    continue
+
+                # A 200 means the server ignored the Range header or the file changed, so start over
+                mode = 'ab' if response.status_code == 206 else 'wb'
+                if mode == 'wb':
+                    _write_source(part, url, response)
+                total = _total_size(response, offset) or total
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == max_attempts:
+                raise DownloadError(f"Download of {url} failed after {attempt} attempts: {e}")
+            count("download_retries")
+            print(f"Download interrupted ({e}), resuming...")
+
+    return total
+
+
+_fetch_locks = {}  # path -> [lock, holders]
+_fetch_locks_lock = threading.Lock()
+
+
+@contextmanager
+def _fetch_lock(path: str):
+    """
+    Holds the lock for path; the entry is dropped once its last holder releases it.
+    """
+    with _fetch_locks_lock:
+        entry = _fetch_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _fetch_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _fetch_locks[path]
+
+
+class ModelCache:
+    """
+    Content-addressed store of downloaded models keyed by the Trellis inputs,
+    so an identical request is served from disk instead of downloaded again.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR):
+        self.root = root
+
+    @staticmethod
+    def make_key(inputs: dict) -> str:
+        payload = json.dumps(inputs, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, inputs: dict) -> str:
+        key = self.make_key(inputs)
+        return os.path.join(self.root, key[:2], f"{key}.glb")
+
+    def get(self, inputs: dict) -> str | None:
+        """
+        Returns the cached model path for inputs, or None if it was never downloaded.
+        """
+        path = self.path(inputs)
+        if os.path.exists(path):
+            count("model_cache_hits")
+            return path
+        count("model_cache_misses")
+        return None
+
+    def fetch(self, get, inputs: dict, url: str, **kwargs) -> str:
+        """
+        Returns the cached model for inputs, downloading it from url on a miss.
+        Concurrent fetches of the same model download it once.
+        """
+        path = self.path(inputs)
+        with _fetch_lock(path):
+            if os.path.exists(path):
+                return path
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return stream_download(get, url, path, **kwargs)
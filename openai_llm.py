@@ -1,28 +1,69 @@
-from huggingface_hub import InferenceClient
+from huggingface_hub import AsyncInferenceClient, InferenceClient
 import os
-from llm_interface import LLMInterface
+from llm_interface import IncompleteStreamError, LLMInterface
 
 
 class OpenaiAdaptor(LLMInterface):
-    def __init__(self, api_key: str):
-        self.client = InferenceClient(api_key=api_key)
+    def __init__(self, api_key: str, client: InferenceClient | None = None,
+                 async_client: AsyncInferenceClient | None = None, raise_errors: bool = False):
+        self.raise_errors = raise_errors
+        self.client = client or InferenceClient(api_key=api_key)
+        self.async_client = async_client or AsyncInferenceClient(api_key=api_key)
+
+    @staticmethod
+    def _messages(prompt: str, system_instruction: str) -> list[dict]:
+        return [
+            {
+                "role": "system",
+                "content": system_instruction
+            },
+            {
+                "role": "user",
+                "content": prompt
+            },
+        ]
 
     def generate_prompt(self, prompt: str, model:str, system_instruction:str) -> str:
         try:
             completion = self.client.chat.completions.create(
                 model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_instruction
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    },
-                ],
+                messages=self._messages(prompt, system_instruction),
+            )
+            return completion.choices[0].message.content
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            print(f"An error has occured: {e}")
+            return None
+
+    async def agenerate_prompt(self, prompt: str, model: str, system_instruction: str) -> str:
+        try:
+            completion = await self.async_client.chat.completions.create(
+                model=model,
+                messages=self._messages(prompt, system_instruction),
             )
             return completion.choices[0].message.content
         except Exception as e:
+            if self.raise_errors:
+                raise
+            print(f"An error has occured: {e}")
+            return None
+
+    async def astream_prompt(self, prompt: str, model: str, system_instruction: str):
+        chunks = 0
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=model,
+                messages=self._messages(prompt, system_instruction),
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks += 1
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            if chunks:
+                raise IncompleteStreamError(f"Stream broke after {chunks} chunks: {e}") from e
+            if self.raise_errors:
+                raise
             print(f"An error has occured: {e}")
-            return None 
\ No newline at end of file
@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from image_cache import (DEFAULT_DUPLICATE_DISTANCE, DEFAULT_PARAMS, GenerationParams, ImageCache, PerceptualIndex,
+                         dhash)
+from image_encoding import ImageEncoding
+from instrumentation import count, get_tracer, span
+from model_cache import DownloadError, stream_download
+
+VIEWPOINTS = ["front", "back", "top", "left", "right"]
+FLUX_MODEL = "black-forest-labs/FLUX.1-dev"
+TRELLIS_MODEL = "fal-ai/trellis"
+GEMINI_MODEL = "gemini-2.5-flash"
+OPENAI_MODEL = "openai/gpt-oss-20b:groq"
+DEFAULT_ENCODING = ImageEncoding()
+
+SYSTEM_INSTRUCTION = """
+    You are an expert prompt engineer for text-to-image models. Your sole purpose is to convert simple user keywords into a single, highly-detailed, and optimized prompt for generating multi-view images suitable for 3D reconstruction.
+
+You will receive a simple user input (e.g., "a dining chair").
+You MUST generate your response as a single, raw text paragraph. Do not add any preamble, conversation, or quotation marks. The output should be the prompt itself and nothing more.
+
+You will construct this prompt by rigorously following a 4-layer framework:
+
+**Layer 1: WHAT (Subject)**
+* Identify the single, core entity.
+* The prompt must focus on this entity alone to prevent focus scattering.
+
+**Layer 2: FORM (Features)**
+* Use precise, powerful adjectives to define shape and structure (e.g., "faceted geometric shape," "cylindrical," "aerodynamic bullpup design").
+
+**Layer 3: MATERIAL (Surface/Texture)**
+* Describe materials with extreme precision for PBR (Physically Based Rendering).
+* Specify texture complexity, physical properties, and imperfections (e.g., "smooth polished light oak," "rough-hewn stone with moss," "glowing purple liquid," "brushed aluminum with fine scratches").
+
+**Layer 4: AESTHETICS (Style/Genre)**
+* Define the artistic style to constrain interpretation (e.g., "Scandinavian-style," "fantasy RPG asset," "photorealistic product mockup," "sci-fi hard-surface").
+
+---
+### **TASK: BUILD THE PROMPT**
+
+* Synthesize Layers 1, 2, 3, and 4 into a single, cohesive paragraph.
+* **Crucial Lighting & Composition:** The prompt MUST specify:
+    * **Lighting:** "bright, even, neutral studio lighting," "soft, diffused lighting," "minimal shadows." (This is critical for 3D reconstruction).
+    * **Background:** "plain neutral gray background," "isolated on a white background."
+    * **Quality:** "hyperrealistic CG render," "high-fidelity," "8K," "Unreal Engine 5 render."
+    * **View:** "multi-view orthographic sheet," "front, back, left, right, and top views."
+
+---
+**Constraint:** Respond ONLY with the generated prompt. Do not include "Here is your prompt:" or any other text.
+    """
+
+VIEW_PROMPT_INSTRUCTION = (
+    "You are an expert prompt engineer for the FLUX.1-dev text-to-image model. "
+    "Your goal is to create a prompt for a photorealistic 2D image to be used as a technical reference for 3D modeling in Microsoft TRELLIS. "
+    "Your output MUST be a clean list of keywords and short, descriptive phrases separated by commas. "
+    "**RULES:** "
+    "1. **REQUIRE an orthographic view from the requested side.** The object must be centered and symmetrical. "
+    "2. **REQUIRE even, diffused studio lighting.** Eliminate all harsh shadows and specular highlights. "
+    "3. **REQUIRE sharp focus across the entire object.** "
+    "4. **DO NOT** use narrative sentences. "
+    "5. **DO NOT** use photographic jargon like 'depth of field', 'aperture', 'ISO', 'lens type', or 'bokeh'. "
+    "6. **DO NOT** describe artistic compositions or backgrounds other than a solid, neutral color."
+)
+
+VIEW_PROMPTS_JSON = (
+    " You will be given a subject and a list of views. Respond ONLY with a JSON object mapping each view "
+    "to its prompt. Every prompt must describe the same object with the exact same style, lighting and background."
+)
+
+
+def engineer_prompt(llm, request: str, model: str, system_instruction: str = SYSTEM_INSTRUCTION) -> str | None:
+    """
+    Expands a simple object request into a detailed text-to-image prompt.
+    """
+    with span("llm_prompt", model=model):
+        return llm.generate_prompt(request, model, system_instruction)
+
+
+def parse_view_prompts(text: str | None, viewpoints: list[str]) -> dict:
+    """
+    The {viewpoint: prompt} entries of an LLM's JSON reply, ignoring a
+    markdown code fence around it. Views that are missing or not text are left out.
+    """
+    if not text:
+        return {}
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {viewpoint: data[viewpoint] for viewpoint in viewpoints
+            if isinstance(data.get(viewpoint), str) and data[viewpoint].strip()}
+
+
+def engineer_view_prompts(llm, request: str, model: str, viewpoints: list[str] = ("front", "back"),
+                          system_instruction: str = VIEW_PROMPT_INSTRUCTION) -> dict:
+    """
+    One consistent prompt per viewpoint of the same object, from a single LLM
+    call that returns them as JSON. Views missing from the reply are then
+    asked for concurrently, one call each. Returns {viewpoint: prompt} for
+    the views that got one.
+    """
+    views = ", ".join(viewpoints)
+    with span("llm_view_prompts", model=model, views=len(viewpoints)):
+        text = llm.generate_prompt(f"Engineer prompts for this subject: {request}\nViews: {views}", model,
+                                   system_instruction + VIEW_PROMPTS_JSON)
+    prompts = parse_view_prompts(text, viewpoints)
+
+    missing = [viewpoint for viewpoint in viewpoints if viewpoint not in prompts]
+    if missing:
+        count("view_prompt_fallbacks")
+
+        async def ask_each():
+            return await asyncio.gather(*(
+                llm.agenerate_prompt(f"Engineer a prompt for the {viewpoint} view of this subject: {request}",
+                                     model, system_instruction)
+                for viewpoint in missing
+            ))
+
+        with span("llm_view_prompts", model=model, views=len(missing)):
+            for viewpoint, prompt in zip(missing, asyncio.run(ask_each())):
+                if prompt:
+                    prompts[viewpoint] = prompt
+    return prompts
+
+
+def upload_image(uploader, image, name: str, encoding: ImageEncoding = DEFAULT_ENCODING,
+                 save_dir: str | None = None, image_cache: ImageCache | None = None) -> str:
+    """
+    Encodes image once in memory and uploads the bytes through a fal
+    SyncClient.upload compatible callable (data, content_type, file_name).
+    The encoded file is also written to save_dir when one is given. With
+    image_cache, a file with exactly the same bytes as an earlier upload
+    reuses that upload's url.
+    """
+    with span("encode", view=name, format=encoding.format) as attrs:
+        data = encoding.encode(image)
+        attrs["bytes"] = len(data)
+    file_name = f"{name}.{encoding.extension}"
+    if save_dir is not None:
+        with open(os.path.join(save_dir, file_name), 'wb') as f:
+            f.write(data)
+    digest = hashlib.sha256(data).hexdigest() if image_cache is not None else None
+    if digest is not None:
+        url = image_cache.uploaded(digest)
+        if url is not None:
+            count("uploads_reused")
+            return url
+    with span("upload", view=name, bytes=len(data)):
+        url = uploader(data, encoding.content_type, file_name)
+    if digest is not None:
+        image_cache.record_upload(digest, url)
+    return url
+
+
+def render_view(client, prompt: str, model: str = FLUX_MODEL, params: GenerationParams = DEFAULT_PARAMS,
+                image_cache: ImageCache | None = None):
+    """
+    The FLUX image for prompt and params, from image_cache if it was generated before.
+    """
+    image = image_cache.get(prompt, model, params) if image_cache is not None else None
+    if image is None:
+        image = client.text_to_image(prompt=prompt, model=model, **params.kwargs())
+        if image_cache is not None:
+            image_cache.put(prompt, model, params, image)
+    return image
+
+
+def render_views(client, prompts: dict, model: str = FLUX_MODEL, params: GenerationParams = DEFAULT_PARAMS,
+                 image_cache: ImageCache | None = None, max_workers: int | None = None) -> dict:
+    """
+    Renders {name: prompt} concurrently and returns {name: image}.
+    """
+    if not prompts:
+        return {}
+
+    def render(name):
+        with span("flux_view", view=name, model=model):
+            return render_view(client, prompts[name], model, params, image_cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(prompts)) as pool:
+        return dict(zip(prompts, pool.map(render, prompts)))
+
+
+def generate_view(client, uploader, prompt: str, viewpoint: str, model: str = FLUX_MODEL,
+                  encoding: ImageEncoding = DEFAULT_ENCODING, save_dir: str | None = None,
+                  params: GenerationParams = DEFAULT_PARAMS, image_cache: ImageCache | None = None,
+                  seen: PerceptualIndex | None = None, preprocess=None) -> str:
+    """
+    Generates a single viewpoint image and uploads it, returning the uploaded url.
+    With seen, the job's views so far, a view that looks like one of them is
+    reported; symmetric objects have legitimately similar views, so it is kept.
+    preprocess (a preprocess.Preprocessor) crops and resizes the image before
+    upload and raises for a blank view. With image_cache, an upload of exactly
+    the same file reuses its url.
+    """
+    print(f"Generating {viewpoint} viewpoint...")
+    view_prompt = f"{viewpoint} viewpoint of " + prompt
+    with span("flux_view", view=viewpoint, model=model):
+        image = render_view(client, view_prompt, model, params, image_cache)
+    if seen is not None:
+        similar_to = seen.claim(dhash(image), viewpoint)
+        if similar_to is not None:
+            print(f"Warning: the {viewpoint} view looks like the {similar_to} view")
+            count("views_similar")
+
+    if preprocess is not None:
+        image = preprocess(image, viewpoint)
+
+    return upload_image(uploader, image, viewpoint, encoding, save_dir, image_cache)
+
+
+def generate_viewpoints(client, uploader, prompt: str, viewpoints: list[str] = VIEWPOINTS,
+                        max_workers: int | None = None, model: str = FLUX_MODEL,
+                        encoding: ImageEncoding = DEFAULT_ENCODING, save_dir: str | None = None,
+                        min_views: int = 1, on_view=None, params: GenerationParams = DEFAULT_PARAMS,
+                        image_cache: ImageCache | None = None, preprocess=None) -> list[str]:
+    """
+    Generates all viewpoints concurrently. Each worker uploads its view as soon
+    as the image arrives, so uploads overlap with the remaining generations.
+    A view that fails is reported and left out rather than failing the others;
+    returned urls keep the order of viewpoints. Raises RuntimeError if fewer
+    than min_views views succeed. on_view(viewpoint, url) is called for each
+    view that succeeds. Views that look alike are reported, and views
+    rejected by preprocess count as failed (see generate_view).
+    """
+    if not viewpoints:
+        return []
+
+    seen = PerceptualIndex(image_cache.distance if image_cache is not None else DEFAULT_DUPLICATE_DISTANCE)
+
+    workers = max_workers or len(viewpoints)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(generate_view, client, uploader, prompt, viewpoint, model, encoding, save_dir,
+                        params, image_cache, seen, preprocess)
+            for viewpoint in viewpoints
+        ]
+        urls, errors = [], []
+        for viewpoint, future in zip(viewpoints, futures):
+            try:
+                url = future.result()
+            except Exception as e:
+                print(f"Failed to generate {viewpoint} viewpoint: {e}")
+                errors.append(f"{viewpoint}: {e}")
+                count("views_failed")
+                continue
+            urls.append(url)
+            if on_view is not None:
+                on_view(viewpoint, url)
+
+    if len(urls) < min_views:
+        raise RuntimeError(f"Only {len(urls)} of {len(viewpoints)} views generated ({'; '.join(errors)})")
+    return urls
+
+
+def trellis_inputs(image_url: str, model: str = TRELLIS_MODEL) -> dict:
+    """
+    Everything that determines a Trellis result; also used as the model cache key.
+    """
+    return {"model": model, "arguments": {"image_url": image_url}}
+
+
+def subscribe_timed(subscribe, inputs: dict, on_queue_update=None) -> dict:
+    """
+    Runs a fal_client.subscribe compatible call and records how long the job
+    waited in the queue (trellis_queue) separately from how long it ran
+    (trellis_processing), based on when the first InProgress update arrived.
+    """
+    submitted = time.perf_counter()
+    started = []
+
+    def on_update(update):
+        if not started and type(update).__name__ in ("InProgress", "Completed"):
+            started.append(time.perf_counter())
+        if on_queue_update is not None:
+            on_queue_update(update)
+
+    try:
+        return subscribe(
+            inputs["model"],
+            arguments=inputs["arguments"],
+            with_logs=on_queue_update is not None,
+            on_queue_update=on_update,
+        )
+    finally:
+        finished = time.perf_counter()
+        processing_start = started[0] if started else submitted
+        tracer = get_tracer()
+        tracer.record("trellis_queue", submitted, processing_start - submitted, model=inputs["model"])
+        tracer.record("trellis_processing", processing_start, finished - processing_start, model=inputs["model"])
+
+
+def reconstruct(subscribe, image_url: str, on_queue_update=None, model: str = TRELLIS_MODEL) -> dict:
+    """
+    Submits an image to Trellis through a fal_client.subscribe compatible callable.
+    """
+    return subscribe_timed(subscribe, trellis_inputs(image_url, model), on_queue_update)
+
+
+def model_url(result: dict) -> str | None:
+    """
+    Returns the GLB url of a Trellis result, or None if it has no mesh.
+    """
+    if result and 'model_mesh' in result:
+        return result['model_mesh']['url']
+    return None
+
+
+def download_model(get, url: str, filename: str) -> bool:
+    """
+    Streams the model at url to filename through a requests.get compatible callable.
+    """
+    try:
+        stream_download(get, url, filename)
+        return True
+    except DownloadError as e:
+        print(f"An error has occured: {e}")
+        return False
@@ -0,0 +1,186 @@
+"""
+Prepares FLUX views for Trellis before they are uploaded: the background
+colour is estimated from the image border, the object is cropped to its
+bounding box with some padding, the crop is resized to Trellis' input
+resolution and the background becomes transparent. Views that are blank or
+whose object cannot be told apart from the background are rejected, so no
+upload or reconstruction is paid for them. The per-pixel work is vectorized
+with NumPy and runs in a process pool, so views preprocess in parallel
+outside the GIL.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from instrumentation import count, span
+
+TRELLIS_RESOLUTION = 518
+DEFAULT_PADDING = 0.08
+DEFAULT_THRESHOLD = 24
+MIN_COVERAGE = 0.01
+MAX_COVERAGE = 0.95
+
+
+class RejectedViewError(ValueError):
+    """
+    Raised for a view that is not worth reconstructing.
+    """
+
+
+def background_color(pixels: np.ndarray, border: int = 4) -> np.ndarray:
+    """
+    Median colour of the outer border pixels of an (h, w, 3) array.
+    """
+    edges = np.concatenate([
+        pixels[:border].reshape(-1, 3), pixels[-border:].reshape(-1, 3),
+        pixels[:, :border].reshape(-1, 3), pixels[:, -border:].reshape(-1, 3),
+    ])
+    return np.median(edges, axis=0)
+
+
+def foreground_alpha(pixels: np.ndarray, background: np.ndarray, threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    """
+    Alpha in [0, 1] per pixel from its largest channel distance to the
+    background: 0 up to threshold / 2, 1 from threshold, linear in between so
+    anti-aliased edges stay soft.
+    """
+    distance = np.abs(pixels.astype(np.int16) - background.astype(np.int16)).max(axis=2)
+    return np.clip((distance - threshold / 2) / (threshold / 2), 0.0, 1.0)
+
+
+def bounding_box(mask: np.ndarray) -> tuple[int, int, int, int] | None:
+    """
+    (top, left, bottom, right), exclusive, of the True pixels, or None if there are none.
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0:
+        return None
+    return rows[0], cols[0], rows[-1] + 1, cols[-1] + 1
+
+
+def square_crop(box: tuple[int, int, int, int], padding: float) -> tuple[int, int, int]:
+    """
+    (top, left, side) of a square around box with padding on every side,
+    centred on the box. It may extend past the image.
+    """
+    top, left, bottom, right = box
+    side = int(round(max(bottom - top, right - left) * (1 + 2 * padding)))
+    center_y, center_x = (top + bottom) // 2, (left + right) // 2
+    return center_y - side // 2, center_x - side // 2, max(side, 1)
+
+
+def preprocess_array(pixels: np.ndarray, size: int = TRELLIS_RESOLUTION, padding: float = DEFAULT_PADDING,
+                     threshold: float = DEFAULT_THRESHOLD, min_coverage: float = MIN_COVERAGE,
+                     max_coverage: float = MAX_COVERAGE) -> np.ndarray:
+    """
+    An (h, w, 3 or 4) uint8 view as a (size, size, 4) RGBA array with the
+    object centred on a transparent background. Raises RejectedViewError for
+    blank views or views without a distinct background.
+    """
+    from PIL import Image
+
+    rgb = pixels[..., :3]
+    background = background_color(rgb)
+    alpha = foreground_alpha(rgb, background, threshold)
+    if pixels.shape[2] == 4:
+        alpha = np.minimum(alpha, pixels[..., 3] / 255.0)
+
+    mask = alpha > 0.5
+    coverage = mask.mean()
+    if coverage < min_coverage:
+        raise RejectedViewError(f"blank view: object covers {coverage:.1%} of the image")
+    if coverage > max_coverage:
+        raise RejectedViewError(f"no background: object covers {coverage:.1%} of the image")
+
+    top, left, side = square_crop(bounding_box(mask), padding)
+    # Paste onto a transparent square so crops past the image edge are padded, not clipped
+    canvas = np.zeros((side, side, 4), dtype=np.uint8)
+    canvas[..., :3] = background.astype(np.uint8)
+    src_top, src_left = max(top, 0), max(left, 0)
+    src_bottom, src_right = min(top + side, rgb.shape[0]), min(left + side, rgb.shape[1])
+    dst_top, dst_left = src_top - top, src_left - left
+    height, width = src_bottom - src_top, src_right - src_left
+    canvas[dst_top:dst_top + height, dst_left:dst_left + width, :3] = rgb[src_top:src_bottom, src_left:src_right]
+    canvas[dst_top:dst_top + height, dst_left:dst_left + width, 3] = \
+        (alpha[src_top:src_bottom, src_left:src_right] * 255).astype(np.uint8)
+
+    resized = Image.fromarray(canvas, "RGBA").resize((size, size), Image.LANCZOS)
+    return np.asarray(resized)
+
+
+class Preprocessor:
+    """
+    Callable that preprocesses a PIL image in a shared process pool and
+    returns the RGBA result. Create one per run and close() it at the end.
+    workers=0 preprocesses in the calling thread instead.
+    """
+
+    def __init__(self, size: int = TRELLIS_RESOLUTION, padding: float = DEFAULT_PADDING,
+                 threshold: float = DEFAULT_THRESHOLD, workers: int | None = None):
+        self.size = size
+        self.padding = padding
+        self.threshold = threshold
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads VIEW_PREPROCESS ("off" disables preprocessing and returns None),
+        VIEW_SIZE, VIEW_PADDING, VIEW_BACKGROUND_THRESHOLD and PREPROCESS_WORKERS.
+        """
+        if os.getenv("VIEW_PREPROCESS", "on") == "off":
+            return None
+        return cls(
+            size=int(os.getenv("VIEW_SIZE", TRELLIS_RESOLUTION)),
+            padding=float(os.getenv("VIEW_PADDING", DEFAULT_PADDING)),
+            threshold=float(os.getenv("VIEW_BACKGROUND_THRESHOLD", DEFAULT_THRESHOLD)),
+            workers=int(os.getenv("PREPROCESS_WORKERS")) if os.getenv("PREPROCESS_WORKERS") else None,
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Settings that change the output, for cache keys.
+        """
+        return {"size": self.size, "padding": self.padding, "threshold": self.threshold}
+
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, since forking a process that runs view threads is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+            return self._pool
+
+    def __call__(self, image, name: str = "view"):
+        from PIL import Image
+
+        with span("preprocess", view=name) as attrs:
+            pixels = np.asarray(image.convert("RGBA") if image.mode not in ("RGB", "RGBA") else image)
+            attrs["pixels_in"] = pixels.shape[0] * pixels.shape[1]
+            try:
+                if self.workers == 0:
+                    result = preprocess_array(pixels, self.size, self.padding, self.threshold)
+                else:
+                    future = self.pool().submit(preprocess_array, pixels, self.size, self.padding, self.threshold)
+                    result = future.result()
+                return Image.fromarray(result, "RGBA")
+            except RejectedViewError:
+                count("views_rejected")
+                raise
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
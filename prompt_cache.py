@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import count
+from llm_interface import LLMInterface
+
+DEFAULT_PATH = ".prompt_cache.db"
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class PromptCache:
+    """
+    On-disk SQLite store of generated prompts with TTL expiry and LRU eviction.
+    Use ":memory:" as the path for a process-local cache.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float | None = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prompts ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(adapter: str, model: str, system_instruction: str, prompt: str) -> str:
+        payload = json.dumps([adapter, model, system_instruction, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM prompts WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM prompts WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                count("prompt_cache_misses")
+                return None
+
+            self._conn.execute("UPDATE prompts SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            count("prompt_cache_hits")
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompts (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            # Least recently used entries beyond the size limit are evicted
+            self._conn.execute(
+                "DELETE FROM prompts WHERE key NOT IN "
+                "(SELECT key FROM prompts ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM prompts WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+class CachedLLM(LLMInterface):
+    """
+    Wraps any LLMInterface adapter and serves repeated requests from a PromptCache.
+    """
+
+    def __init__(self, llm: LLMInterface, cache: PromptCache):
+        self.llm = llm
+        self.cache = cache
+
+    def _key(self, prompt: str, model: str, system_instruction: str) -> str:
+        return self.cache.make_key(type(self.llm).__name__, model, system_instruction, prompt)
+
+    def generate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None:
+        key = self._key(prompt, model, system_instruction)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = self.llm.generate_prompt(prompt, model, system_instruction)
+        # Failed generations return None and are never cached
+        if response is not None:
+            self.cache.put(key, response)
+        return response
+
+    async def agenerate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None:
+        key = self._key(prompt, model, system_instruction)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = await self.llm.agenerate_prompt(prompt, model, system_instruction)
+        if response is not None:
+            self.cache.put(key, response)
+        return response
+
+    async def astream_prompt(self, prompt: str, model: str, system_instruction: str):
+        key = self._key(prompt, model, system_instruction)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        async for chunk in self.llm.astream_prompt(prompt, model, system_instruction):
+            chunks.append(chunk)
+            yield chunk
+        # Only reached when the stream ended normally: a broken stream raises
+        # IncompleteStreamError and a consumer that stops early closes this generator
+        if chunks:
+            self.cache.put(key, "".join(chunks))
+
+    def discard(self, prompt: str, model: str, system_instruction: str):
+        """
+        Drops a cached response, e.g. after the user rejected it.
+        """
+        self.cache.delete(self._key(prompt, model, system_instruction))
+
+
+def cache_from_env() -> PromptCache | None:
+    """
+    A PromptCache configured by PROMPT_CACHE_PATH, PROMPT_CACHE_TTL and
+    PROMPT_CACHE_MAX_ENTRIES; None if PROMPT_CACHE_PATH is "off".
+    """
+    path = os.getenv("PROMPT_CACHE_PATH", DEFAULT_PATH)
+    if path.lower() in ("off", "none", ""):
+        return None
+
+    ttl = float(os.getenv("PROMPT_CACHE_TTL", DEFAULT_TTL))
+    max_entries = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    return PromptCache(path, ttl=ttl, max_entries=max_entries)
+
+
+def cached_from_env(llm: LLMInterface) -> LLMInterface:
+    """
+    Wraps llm in the cache_from_env() cache, or returns it unchanged if the cache is off.
+    """
+    cache = cache_from_env()
+    return llm if cache is None else CachedLLM(llm, cache)
@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import span
+from model_cache import DownloadError
+from pipeline import TRELLIS_MODEL, model_url, subscribe_timed, trellis_inputs
+
+TRELLIS_MULTI_MODEL = "fal-ai/trellis/multi"
+MODES = ("single", "multi", "fanout")
+
+
+def multi_view_inputs(image_urls: list[str], model: str = TRELLIS_MULTI_MODEL) -> dict:
+    """
+    Inputs of one Trellis job conditioned on every view at once.
+    """
+    return {"model": model, "arguments": {"image_urls": list(image_urls)}}
+
+
+def await_handles(handles: list, max_workers: int | None = None) -> list:
+    """
+    Waits on fal queue handles in parallel so their queue times overlap.
+    Returns each handle's result, or the exception it raised, in order.
+    """
+    if not handles:
+        return []
+
+    def wait(handle):
+        try:
+            with span("trellis_wait"):
+                return handle.get()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(handles)) as pool:
+        return list(pool.map(wait, handles))
+
+
+def submit_all(submit, inputs_list: list[dict]) -> list:
+    """
+    Queues every job up front through a fal SyncClient.submit compatible callable.
+    """
+    return [submit(inputs["model"], arguments=inputs["arguments"]) for inputs in inputs_list]
+
+
+def mesh_quality(path: str) -> float:
+    """
+    Cheap local score in [0, 1] for picking between candidate meshes: the share
+    of faces in the largest connected piece (penalizes floating fragments) times
+    the share of non-degenerate faces, with a small bonus for watertight meshes.
+    Meshes that fail to load score 0.
+    """
+    import trimesh
+
+    try:
+        mesh = trimesh.load(path, force="mesh")
+    except Exception as e:
+        print(f"Could not score {path}: {e}")
+        return 0.0
+
+    if mesh.is_empty or len(mesh.faces) == 0:
+        return 0.0
+
+    face_count = len(mesh.faces)
+    components = mesh.split(only_watertight=False)
+    largest = max(len(component.faces) for component in components) if len(components) else face_count
+    non_degenerate = (mesh.area_faces > 1e-12).sum() / face_count
+    score = (largest / face_count) * non_degenerate
+    return score * (1.0 if mesh.is_watertight else 0.9)
+
+
+def reconstruct_fan_out(submit, get, model_cache, image_urls: list[str], score=mesh_quality,
+                        model: str = TRELLIS_MODEL) -> tuple[str | None, list[float]]:
+    """
+    Runs one single-view Trellis job per image concurrently, downloads each
+    result into the model cache and returns the path of the best scoring mesh
+    along with every candidate's score. Views already in the cache are not resubmitted.
+    """
+    candidates = [trellis_inputs(url, model) for url in image_urls]
+    pending = [inputs for inputs in candidates if model_cache.get(inputs) is None]
+
+    results = await_handles(submit_all(submit, pending))
+    for inputs, result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"Trellis job for {inputs['arguments']['image_url']} failed: {result}")
+            continue
+        url = model_url(result)
+        if url is None:
+            continue
+        try:
+            model_cache.fetch(get, inputs, url)
+        except DownloadError as e:
+            print(f"An error has occured: {e}")
+
+    paths = [model_cache.path(inputs) for inputs in candidates]
+    paths = [path if os.path.exists(path) else None for path in paths]
+    scores = [score(path) if path else 0.0 for path in paths]
+    best = max(range(len(paths)), key=lambda i: scores[i], default=None)
+    if best is None or paths[best] is None:
+        return None, scores
+    return paths[best], scores
+
+
+def reconstruct_views(mode: str, fal, get, model_cache, image_urls: list[str],
+                      on_queue_update=None) -> str | None:
+    """
+    Reconstructs a model from the generated views and returns its local path.
+
+    single: one Trellis job on the first (front) view
+    multi:  one fal-ai/trellis/multi job conditioned on all views
+    fanout: one Trellis job per view in parallel, best mesh by mesh_quality
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown reconstruction mode {mode}. Choose one of {', '.join(MODES)}.")
+
+    if mode == "fanout":
+        path, scores = reconstruct_fan_out(fal.submit, get, model_cache, image_urls)
+        print("Candidate scores: " + ", ".join(f"{score:.3f}" for score in scores))
+        return path
+
+    inputs = trellis_inputs(image_urls[0]) if mode == "single" else multi_view_inputs(image_urls)
+    cached = model_cache.get(inputs)
+    if cached:
+        print(f"Model found in cache: {cached}")
+        return cached
+
+    result = subscribe_timed(fal.subscribe, inputs, on_queue_update)
+    url = model_url(result)
+    if url is None:
+        print(f"Trellis returned no model mesh: {result}")
+        return None
+
+    print(f"\n3D Model URL found: {url}")
+    print(f"Downloading to {os.path.abspath(model_cache.path(inputs))}...")
+    return model_cache.fetch(get, inputs, url)
@@ -0,0 +1,198 @@
+"""
+Interactive prompt refinement. A RefinementSession asks the LLM for several
+prompt candidates at once (the first one streamed, the rest concurrently
+through agenerate_prompt), so the user picks one instead of waiting for
+another round trip. Rejected rounds add feedback to a bounded, deduplicated
+FeedbackHistory, so the instruction sent each round stays small instead of
+growing with every retry. Token counts and the streamed candidate's time to
+first token per round, and the time until a prompt was accepted, are
+recorded for the report.
+"""
+import asyncio
+import re
+import time
+
+from instrumentation import count, span
+from llm_interface import StreamStats, collect_stream
+from pipeline import SYSTEM_INSTRUCTION
+
+DEFAULT_CANDIDATES = 3
+DEFAULT_MAX_FEEDBACK = 5
+DEFAULT_MAX_FEEDBACK_CHARS = 1000
+
+# Each extra candidate leans on a different layer of the prompt framework
+VARIANT_HINTS = (
+    "",
+    "Put extra emphasis on materials and surface texture.",
+    "Put extra emphasis on shape, proportions and structural features.",
+    "Put extra emphasis on the artistic style and genre.",
+)
+
+
+def estimate_tokens(text: str | None) -> int:
+    """
+    Rough token count (about four characters per token); the adaptors do not
+    all report usage.
+    """
+    return (len(text) + 3) // 4 if text else 0
+
+
+class FeedbackHistory:
+    """
+    The most recent distinct pieces of feedback, at most max_items of them and
+    max_chars in total; the oldest are dropped first. Repeating feedback moves
+    it to the end instead of adding it twice.
+    """
+
+    def __init__(self, max_items: int = DEFAULT_MAX_FEEDBACK, max_chars: int = DEFAULT_MAX_FEEDBACK_CHARS):
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.items = []
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower().rstrip(".!")
+
+    def add(self, feedback: str):
+        feedback = re.sub(r"\s+", " ", feedback).strip()
+        if not feedback:
+            return
+        key = self._normalize(feedback)
+        self.items = [item for item in self.items if self._normalize(item) != key]
+        self.items.append(feedback[:self.max_chars])
+        while len(self.items) > self.max_items or sum(len(item) for item in self.items) > self.max_chars:
+            self.items.pop(0)
+
+    def instruction(self, base: str) -> str:
+        """
+        base with the feedback appended as a list.
+        """
+        if not self.items:
+            return base
+        return base + "\n\n**User Feedback to incorporate:**\n" + "\n".join(f"- {item}" for item in self.items)
+
+
+class RoundStats:
+    """
+    One round of candidates; stream holds the StreamStats of the streamed
+    candidate, or None if its stream failed.
+    """
+
+    def __init__(self, number: int, candidates: int, prompt_tokens: int, completion_tokens: int, elapsed: float,
+                 stream: StreamStats | None = None):
+        self.number = number
+        self.candidates = candidates
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.elapsed = elapsed
+        self.stream = stream
+
+    @property
+    def time_to_first_token(self) -> float | None:
+        return self.stream.time_to_first_token if self.stream is not None else None
+
+    def to_dict(self) -> dict:
+        return {"number": self.number, "candidates": self.candidates, "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens, "elapsed": self.elapsed,
+                "time_to_first_token": self.time_to_first_token}
+
+    def __repr__(self):
+        return (f"round {self.number}: {self.candidates} candidates in {self.elapsed:.2f}s, "
+                f"~{self.prompt_tokens} prompt + ~{self.completion_tokens} completion tokens")
+
+
+class RefinementSession:
+    """
+    Refines the prompt for one request with llm until the user accepts a candidate.
+    """
+
+    def __init__(self, llm, model: str, request: str, system_instruction: str = SYSTEM_INSTRUCTION,
+                 candidates: int = DEFAULT_CANDIDATES, history: FeedbackHistory | None = None):
+        self.llm = llm
+        self.model = model
+        self.request = request
+        self.system_instruction = system_instruction
+        self.candidates = max(1, min(candidates, len(VARIANT_HINTS)))
+        self.history = history or FeedbackHistory()
+        self.rounds = []
+        self.accepted = None
+        self.time_to_accept = None
+        self._started = time.perf_counter()
+        self._last = []
+        self._instruction = system_instruction
+
+    def _requests(self) -> list[str]:
+        return [f"{self.request}\n\n{hint}".strip() for hint in VARIANT_HINTS[:self.candidates]]
+
+    async def apropose(self, on_chunk=None) -> list[str]:
+        """
+        Generates this round's candidates concurrently, streaming the first
+        through on_chunk. Returns the distinct candidates that were generated.
+        """
+        instruction = self.history.instruction(self.system_instruction)
+        requests = self._requests()
+        stream = None
+
+        async def first():
+            nonlocal stream
+            text, stream = await collect_stream(self.llm.astream_prompt(requests[0], self.model, instruction),
+                                                on_chunk=on_chunk)
+            return text
+
+        async def other(request):
+            return await self.llm.agenerate_prompt(request, self.model, instruction)
+
+        start = time.perf_counter()
+        with span("refinement_round", round=len(self.rounds) + 1, candidates=len(requests)):
+            results = await asyncio.gather(first(), *(other(request) for request in requests[1:]),
+                                           return_exceptions=True)
+
+        candidates, sent = [], []
+        for request, result in zip(requests, results):
+            if isinstance(result, Exception):
+                print(f"An error has occured: {result}")
+                continue
+            if result and result.strip() not in candidates:
+                candidates.append(result.strip())
+                sent.append(request)
+
+        self.rounds.append(RoundStats(
+            number=len(self.rounds) + 1,
+            candidates=len(candidates),
+            prompt_tokens=sum(estimate_tokens(instruction) + estimate_tokens(request) for request in requests),
+            completion_tokens=sum(estimate_tokens(candidate) for candidate in candidates),
+            elapsed=time.perf_counter() - start,
+            stream=stream,
+        ))
+        count("refinement_rounds")
+        self._last = list(zip(sent, candidates))
+        self._instruction = instruction
+        return candidates
+
+    def propose(self, on_chunk=None) -> list[str]:
+        return asyncio.run(self.apropose(on_chunk))
+
+    def accept(self, candidate: str) -> str:
+        self.accepted = candidate
+        self.time_to_accept = time.perf_counter() - self._started
+        return candidate
+
+    def reject(self, feedback: str = ""):
+        """
+        Records feedback for the next round and drops this round's candidates
+        from the prompt cache, if llm has one, so they are not served again.
+        """
+        discard = getattr(self.llm, "discard", None)
+        if callable(discard):
+            for request, _ in self._last:
+                discard(request, self.model, self._instruction)
+        self.history.add(feedback)
+
+    def report(self) -> dict:
+        return {
+            "rounds": len(self.rounds),
+            "prompt_tokens": sum(r.prompt_tokens for r in self.rounds),
+            "completion_tokens": sum(r.completion_tokens for r in self.rounds),
+            "time_to_accept": self.time_to_accept,
+            "per_round": [r.to_dict() for r in self.rounds],
+        }
@@ -0,0 +1,489 @@
+"""
+Shared protection for calls to external providers (Gemini, HF, fal, model
+downloads): a token bucket per provider keeps us under its rate limit,
+retryable errors (429, 5xx, timeouts, dropped connections) are retried with
+exponential backoff and full jitter, slow calls can be hedged with a duplicate
+request, and a circuit breaker stops calling a provider that keeps failing so
+FailoverLLM can move on to the next LLM.
+"""
+import asyncio
+import functools
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrumentation import count
+from llm_interface import IncompleteStreamError, LLMInterface
+
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+PROVIDERS = ("gemini", "openai", "flux", "fal", "download")
+HEDGE_WORKERS = 64
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    """
+
+
+def status_code(error: BaseException) -> int | None:
+    """
+    HTTP status of a provider error, whichever SDK raised it.
+    """
+    for candidate in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+        getattr(getattr(error, "resp", None), "status", None),
+    ):
+        if isinstance(candidate, int):
+            return candidate
+        if isinstance(candidate, str) and candidate.isdigit():
+            return int(candidate)
+    return None
+
+
+def _transport_errors() -> tuple:
+    """
+    Connection and timeout errors of the HTTP libraries. Only libraries that
+    are already imported can have raised one, so none is imported here.
+    """
+    errors = [ConnectionError, TimeoutError]
+    requests = sys.modules.get("requests")
+    if requests is not None:
+        errors += [requests.ConnectionError, requests.Timeout]
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        errors.append(httpx.TransportError)
+    return tuple(errors)
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, _transport_errors())
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average with bursts of up to burst.
+    Callers reserve a token and sleep until it is theirs, so waiting callers
+    are served in order instead of racing.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Takes tokens, possibly on credit, and returns how long to wait before using them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1.0):
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. After reset_timeout
+    seconds one probe call is let through; its outcome closes or reopens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def record_throttled(self):
+        """
+        A throttled call says nothing about the provider's health; a throttled
+        probe only frees the probe slot, so the next call probes again.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+
+class RetryPolicy:
+    """
+    Up to max_attempts tries; the wait before retry n is uniform in
+    [0, min(max_delay, base_delay * 2**n)] ("full jitter").
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 retryable=is_retryable):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class Provider:
+    """
+    Resilience settings and state for one external provider. Wrap every call
+    to it with call()/acall(), or wrap() a function once.
+    """
+
+    def __init__(self, name: str, rate: float | None = None, burst: float | None = None,
+                 retry: RetryPolicy | None = None, breaker: CircuitBreaker | None = None,
+                 hedge_after: float | None = None, max_hedges: int = 1):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str):
+        """
+        Reads <NAME>_RATE_LIMIT (requests per second), <NAME>_HEDGE_AFTER (seconds),
+        RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, CIRCUIT_FAILURES and CIRCUIT_RESET.
+        """
+        prefix = name.upper()
+        rate = os.getenv(f"{prefix}_RATE_LIMIT")
+        hedge_after = os.getenv(f"{prefix}_HEDGE_AFTER")
+        return cls(
+            name,
+            rate=float(rate) if rate else None,
+            retry=RetryPolicy(max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", 4)),
+                              base_delay=float(os.getenv("RETRY_BASE_DELAY", 0.5))),
+            breaker=CircuitBreaker(failure_threshold=int(os.getenv("CIRCUIT_FAILURES", 5)),
+                                   reset_timeout=float(os.getenv("CIRCUIT_RESET", 30))),
+            hedge_after=float(hedge_after) if hedge_after else None,
+        )
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Calls fn with rate limiting, retries, hedging and the circuit breaker.
+        Raises the last error, or CircuitOpenError without calling fn.
+        """
+        for attempt in range(self.retry.max_attempts):
+            if not self.breaker.allow():
+                count(f"{self.name}_circuit_open")
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            try:
+                result = self._hedged(fn, args, kwargs) if self.hedge_after is not None else \
+                    self._attempt(fn, args, kwargs)
+            except Exception as e:
+                self.record_failure(e)
+                if not self.retry.retryable(e) or attempt == self.retry.max_attempts - 1:
+                    raise
+                count(f"{self.name}_retries")
+                time.sleep(self.retry.delay(attempt))
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def acall(self, fn, *args, **kwargs):
+        """
+        Async call(): fn is a coroutine function. Hedges are raced as tasks.
+        """
+        for attempt in range(self.retry.max_attempts):
+            if not self.breaker.allow():
+                count(f"{self.name}_circuit_open")
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            try:
+                result = await self._ahedged(fn, args, kwargs)
+            except Exception as e:
+                self.record_failure(e)
+                if not self.retry.retryable(e) or attempt == self.retry.max_attempts - 1:
+                    raise
+                count(f"{self.name}_retries")
+                await asyncio.sleep(self.retry.delay(attempt))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def record_failure(self, error):
+        # Throttling means the provider is up but busy: back off, but keep the circuit closed
+        if status_code(error) == 429:
+            self.breaker.record_throttled()
+        else:
+            self.breaker.record_failure()
+
+    def wrap(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
+
+    def _attempt(self, fn, args, kwargs):
+        if self.bucket is not None:
+            self.bucket.acquire()
+        return fn(*args, **kwargs)
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # Sized for many concurrent callers: a queued attempt would defeat the hedge
+                self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix=f"hedge-{self.name}")
+            return self._executor
+
+    def _hedged(self, fn, args, kwargs):
+        """
+        Starts fn, and another copy whenever hedge_after seconds pass without a
+        result (up to max_hedges extra). The first success wins; losers are left
+        to finish in the background.
+        """
+        pool = self._pool()
+        primary = pool.submit(self._attempt, fn, args, kwargs)
+        pending = {primary}
+        hedges = 0
+        error = None
+        while pending:
+            hedge = hedges < self.max_hedges
+            done, pending = wait(pending, timeout=self.hedge_after if hedge else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        count(f"{self.name}_hedge_wins")
+                    return future.result()
+                error = future.exception()
+            if hedge and not done:
+                hedges += 1
+                count(f"{self.name}_hedges")
+                pending.add(pool.submit(self._attempt, fn, args, kwargs))
+        raise error
+
+    async def _ahedged(self, fn, args, kwargs):
+        async def attempt():
+            if self.bucket is not None:
+                delay = self.bucket.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+            return await fn(*args, **kwargs)
+
+        pending = {asyncio.ensure_future(attempt())}
+        hedges = 0
+        error = None
+        try:
+            while pending:
+                hedge = self.hedge_after is not None and hedges < self.max_hedges
+                done, pending = await asyncio.wait(pending, timeout=self.hedge_after if hedge else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if hedge and not done:
+                    hedges += 1
+                    count(f"{self.name}_hedges")
+                    pending.add(asyncio.ensure_future(attempt()))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class GuardedClient:
+    """
+    Proxy that routes every method call on client through provider, e.g.
+    GuardedClient(InferenceClient(), flux).text_to_image(...).
+    """
+
+    def __init__(self, client, provider: Provider, factory=None):
+        self._client = client
+        self._provider = provider
+        self._factory = factory
+
+    @classmethod
+    def lazy(cls, factory, provider: Provider):
+        """
+        A GuardedClient whose client is created by factory() on first use.
+        """
+        return cls(None, provider, factory)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._client is None:
+            self._client = self._factory()
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        return self._provider.wrap(attr)
+
+
+class FailoverLLM(LLMInterface):
+    """
+    Tries each (llm, model, provider) backend in order, moving to the next one
+    when a backend fails after its retries or its circuit is open. A backend
+    model of None uses the model passed by the caller. llm may also be a
+    factory, called the first time its backend is tried, so a backup's SDK is
+    only imported if the primary fails. Returns None only when every backend
+    failed, like the adaptors do.
+    """
+
+    def __init__(self, backends: list[tuple]):
+        self.backends = backends
+
+    def _candidates(self, model):
+        for i, (llm, backend_model, provider) in enumerate(self.backends):
+            if not isinstance(llm, LLMInterface):
+                llm = llm()
+                self.backends[i] = (llm, backend_model, provider)
+            yield llm, backend_model or model, provider
+
+    def generate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None:
+        errors = []
+        for llm, backend_model, provider in self._candidates(model):
+            try:
+                response = provider.call(llm.generate_prompt, prompt, backend_model, system_instruction)
+                if response:
+                    return response
+                errors.append(f"{provider.name}: empty response")
+            except Exception as e:
+                errors.append(f"{provider.name}: {e}")
+            count("llm_failovers")
+        print(f"All LLM providers failed: {'; '.join(errors)}")
+        return None
+
+    async def agenerate_prompt(self, prompt: str, model: str, system_instruction: str) -> str | None:
+        errors = []
+        for llm, backend_model, provider in self._candidates(model):
+            try:
+                response = await provider.acall(llm.agenerate_prompt, prompt, backend_model, system_instruction)
+                if response:
+                    return response
+                errors.append(f"{provider.name}: empty response")
+            except Exception as e:
+                errors.append(f"{provider.name}: {e}")
+            count("llm_failovers")
+        print(f"All LLM providers failed: {'; '.join(errors)}")
+        return None
+
+    def discard(self, prompt: str, model: str, system_instruction: str):
+        """
+        Drops the response from every backend created so far that caches them.
+        """
+        for llm, backend_model, _ in self.backends:
+            discard = getattr(llm, "discard", None)
+            if isinstance(llm, LLMInterface) and callable(discard):
+                discard(prompt, backend_model or model, system_instruction)
+
+    async def astream_prompt(self, prompt: str, model: str, system_instruction: str):
+        """
+        Streams from the first backend that produces a chunk. Errors before the
+        first chunk are retried and then fail over; once text has been yielded
+        the stream cannot switch backends, so a later error raises
+        IncompleteStreamError instead of passing the partial text off as done.
+        """
+        errors = []
+        for llm, backend_model, provider in self._candidates(model):
+            for attempt in range(provider.retry.max_attempts):
+                if not provider.breaker.allow():
+                    errors.append(f"{provider.name}: circuit open")
+                    break
+                if provider.bucket is not None:
+                    delay = provider.bucket.reserve()
+                    if delay:
+                        await asyncio.sleep(delay)
+                started = False
+                try:
+                    async for chunk in llm.astream_prompt(prompt, backend_model, system_instruction):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    provider.record_failure(e)
+                    if started:
+                        raise IncompleteStreamError(f"{provider.name} stream broke after the first chunk: {e}") from e
+                    errors.append(f"{provider.name}: {e}")
+                    if not provider.retry.retryable(e) or attempt == provider.retry.max_attempts - 1:
+                        break
+                    count(f"{provider.name}_retries")
+                    await asyncio.sleep(provider.retry.delay(attempt))
+                    continue
+                if started:
+                    provider.breaker.record_success()
+                    return
+                errors.append(f"{provider.name}: empty response")
+                break
+            count("llm_failovers")
+        print(f"All LLM providers failed: {'; '.join(errors)}")
+
+
+def failover_llm(registry, primary: str = "gemini", providers: dict | None = None,
+                 model: str | None = None, cache=None) -> FailoverLLM:
+    """
+    Gemini and the HF chat model behind their providers, primary first. Each
+    adaptor is created when it is first used. model replaces the primary's
+    default model. With a prompt_cache.PromptCache, each adaptor is cached on
+    its own, so a response is keyed by the adaptor and model that produced it.
+    """
+    from pipeline import GEMINI_MODEL, OPENAI_MODEL
+
+    providers = providers or providers_from_env()
+    models = {"gemini": GEMINI_MODEL, "openai": OPENAI_MODEL}
+    if model:
+        models[primary] = model
+    factories = {
+        "gemini": functools.partial(registry.gemini, raise_errors=True),
+        "openai": functools.partial(registry.openai, raise_errors=True),
+    }
+    if cache is not None:
+        from prompt_cache import CachedLLM
+
+        factories = {name: functools.partial(lambda factory: CachedLLM(factory(), cache), factory)
+                     for name, factory in factories.items()}
+    backends = {name: (factories[name], models[name], providers[name]) for name in factories}
+    order = [primary] + [name for name in backends if name != primary]
+    return FailoverLLM([backends[name] for name in order])
+
+
+def providers_from_env() -> dict:
+    return {name: Provider.from_env(name) for name in PROVIDERS}
@@ -0,0 +1,235 @@
+import atexit
+import re
+import threading
+
+from googleapiclient.errors import HttpError
+
+from google_sheets.sheets_client import GoogleSheetsClient
+
+
+class BufferedSheetWriter:
+    """
+    Write-behind wrapper around GoogleSheetsClient with the same read/write
+    methods. Appends are coalesced into one multi-row append per sheet and
+    range writes into one values().batchUpdate per spreadsheet.
+
+    Buffers are flushed when max_rows rows are pending, every flush_interval
+    seconds from a background thread, before any read, and on close() (also
+    registered at exit). A caller that pushes the buffer over max_rows
+    flushes it itself, which throttles writers to the API's pace.
+
+    A batch that fails with a retryable error is kept for the next flush, up
+    to max_attempts flushes; one rejected outright (other 4xx errors), or one
+    that would grow the buffer past max_pending rows, is dropped and reported.
+    Range writes into rows below a sheet's last confirmed append wait until
+    the appends before them went through, since their row numbers were
+    predicted from those appends.
+    """
+
+    def __init__(self, client, max_rows=100, flush_interval=5.0, max_attempts=5, max_pending=None):
+        self.client = client
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending or 10 * max_rows
+        self.dropped = 0
+        # Failed flushes in a row per (spreadsheet_id, sheet_name) for appends, per spreadsheet_id for writes
+        self._attempts = {}
+        # Last row written by a confirmed append, per (spreadsheet_id, sheet_name)
+        self._last_rows = {}
+        # {spreadsheet_id: {sheet_name: [row, ...]}}
+        self._appends = {}
+        # {spreadsheet_id: {range_name: values}}, later writes to a range replace earlier ones
+        self._updates = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+        if flush_interval:
+            self._thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def append_to_range(self, spreadsheet_id, sheet_name, values):
+        """
+        Queues rows to append. Returns a placeholder result with "buffered" set.
+        """
+        with self._lock:
+            sheet_rows = self._appends.setdefault(spreadsheet_id, {}).setdefault(sheet_name, [])
+            sheet_rows.extend(values)
+            self._pending += len(values)
+            full = self._pending >= self.max_rows
+        if full:
+            self.flush()
+        return {"buffered": True, "updates": {"updatedRows": len(values)}}
+
+    def write_range(self, spreadsheet_id, range_name, values):
+        """
+        Queues a range write. Returns a placeholder result with "buffered" set.
+        """
+        with self._lock:
+            ranges = self._updates.setdefault(spreadsheet_id, {})
+            if range_name not in ranges:
+                self._pending += len(values)
+            ranges[range_name] = values
+            full = self._pending >= self.max_rows
+        if full:
+            self.flush()
+        return {"buffered": True, "updatedCells": sum(len(row) for row in values)}
+
+    def batch_update(self, spreadsheet_id, data):
+        for entry in data:
+            self.write_range(spreadsheet_id, entry["range"], entry["values"])
+        return {"buffered": True}
+
+    def read_range(self, spreadsheet_id, range_name):
+        """
+        Flushes pending writes first so reads see them.
+        """
+        self.flush()
+        return self.client.read_range(spreadsheet_id, range_name)
+
+    def flush(self):
+        """
+        Sends everything pending: appends first (one call per sheet), then one
+        batchUpdate per spreadsheet. Writes that fail after the client's
+        retries are put back and retried on the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                appends, self._appends = self._appends, {}
+                updates, self._updates = self._updates, {}
+                self._pending = 0
+
+            # Sheets whose appends did not go through, with the last row that did
+            blocked = {}
+            dropped = set()
+            for spreadsheet_id, sheets in appends.items():
+                for sheet_name, rows in sheets.items():
+                    key = (spreadsheet_id, sheet_name)
+                    try:
+                        result = self.client.append_to_range(spreadsheet_id, sheet_name, rows, raise_errors=True)
+                    except Exception as e:
+                        blocked[key] = self._last_rows.get(key)
+                        if self._retry(key, e, len(rows)):
+                            self._requeue_appends(spreadsheet_id, sheet_name, rows)
+                        else:
+                            dropped.add(key)
+                        continue
+                    self._attempts.pop(key, None)
+                    row = _last_row(result)
+                    if row is not None:
+                        self._last_rows[key] = row
+
+            for spreadsheet_id, ranges in updates.items():
+                held = {range_name: values for range_name, values in ranges.items()
+                        if _behind_failed_append(spreadsheet_id, range_name, blocked)}
+                # Writes into rows of dropped appends would land on whatever row ends up there
+                orphaned = {range_name: values for range_name, values in held.items()
+                            if (spreadsheet_id, _range_row(range_name)[0]) in dropped}
+                if orphaned:
+                    self.dropped += sum(len(values) for values in orphaned.values())
+                    print(f"Dropped writes to {', '.join(orphaned)}: the rows they target were never appended.")
+                requeued = {range_name: values for range_name, values in held.items() if range_name not in orphaned}
+                if requeued:
+                    self._requeue_updates(spreadsheet_id, requeued)
+                ranges = {range_name: values for range_name, values in ranges.items() if range_name not in held}
+                if not ranges:
+                    continue
+                data = [{"range": range_name, "values": values} for range_name, values in ranges.items()]
+                try:
+                    self.client.batch_update(spreadsheet_id, data, raise_errors=True)
+                except Exception as e:
+                    if self._retry(spreadsheet_id, e, sum(len(values) for values in ranges.values())):
+                        self._requeue_updates(spreadsheet_id, ranges)
+                    continue
+                self._attempts.pop(spreadsheet_id, None)
+
+    def _retry(self, key, error, rows):
+        """
+        Whether a failed batch of rows should be kept for the next flush; if
+        not, it is dropped and reported.
+        """
+        self._attempts[key] = self._attempts.get(key, 0) + 1
+        if isinstance(error, HttpError) and error.resp.status not in GoogleSheetsClient.RETRYABLE_STATUS:
+            reason = f"rejected with HTTP {error.resp.status}"
+        elif self._attempts[key] >= self.max_attempts:
+            reason = f"failed {self._attempts[key]} times"
+        elif self.pending() + rows > self.max_pending:
+            reason = f"would grow the buffer past {self.max_pending} rows"
+        else:
+            return True
+        self._attempts.pop(key, None)
+        self.dropped += rows
+        print(f"Dropped {rows} buffered rows for Google Sheets ({reason}): {error}")
+        return False
+
+    def _requeue_appends(self, spreadsheet_id, sheet_name, rows):
+        with self._lock:
+            sheet_rows = self._appends.setdefault(spreadsheet_id, {}).setdefault(sheet_name, [])
+            sheet_rows[:0] = rows
+            self._pending += len(rows)
+
+    def _requeue_updates(self, spreadsheet_id, ranges):
+        with self._lock:
+            pending = self._updates.setdefault(spreadsheet_id, {})
+            for range_name, values in ranges.items():
+                if range_name not in pending:
+                    pending[range_name] = values
+                    self._pending += len(values)
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        Stops the background flusher and flushes what is left.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self.pending():
+            print(f"Could not write {self.pending()} buffered rows to Google Sheets.")
+
+
+def _range_row(range_name):
+    """
+    Sheet name and first row of an A1 range such as "Sheet1!B5:C5"; the row is None for whole columns.
+    """
+    sheet_name, _, cells = range_name.rpartition("!")
+    match = re.match(r"[A-Z]*(\d+)", cells)
+    return sheet_name.strip("'"), int(match.group(1)) if match else None
+
+
+def _last_row(append_result):
+    match = re.search(r"(\d+)$", (append_result or {}).get("updates", {}).get("updatedRange", ""))
+    return int(match.group(1)) if match else None
+
+
+def _behind_failed_append(spreadsheet_id, range_name, blocked):
+    """
+    Whether range_name may target rows of an append that failed: it lies in a
+    sheet in blocked ({(spreadsheet_id, sheet_name): last confirmed row}) below
+    that sheet's last confirmed row, or anywhere in it if none is known.
+    """
+    sheet_name, row = _range_row(range_name)
+    if (spreadsheet_id, sheet_name) not in blocked:
+        return False
+    confirmed = blocked[(spreadsheet_id, sheet_name)]
+    return confirmed is None or row is None or row > confirmed
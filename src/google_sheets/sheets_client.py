@@ -1,4 +1,6 @@
 import os
+import random
+import time
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -7,12 +9,17 @@ from googleapiclient.errors import HttpError
 class GoogleSheetsClient:
 
     SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+    RETRYABLE_STATUS = (429, 500, 502, 503)
 
-    def __init__(self, credentials):
+    def __init__(self, credentials, service=None, max_retries=5, backoff=1.0):
         self.creds = None
-        self.service = None
+        self.service = service
         self.credentials_source = credentials
-        self._authenticate()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # An injected service (e.g. a local stand-in) skips authentication
+        if self.service is None:
+            self._authenticate()
 
     def _authenticate(self):
         """Authenticates using Service Account credentials"""
@@ -28,15 +35,30 @@ class GoogleSheetsClient:
         except Exception as e:
             raise RuntimeError(f"Failed to authenticate: {e}")
 
+    def _execute(self, request):
+        """
+        Executes an API request, retrying rate limits (429) and transient server
+        errors with exponential backoff and jitter.
+        """
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                return request.execute()
+            except HttpError as e:
+                if e.resp.status not in self.RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+
     def read_range(self, spreadsheet_id, range_name):
         """
         Reads and returns the headers for the given spreadsheet_id.
         """
         try:
-            result = self.service.spreadsheets().values().get(
+            result = self._execute(self.service.spreadsheets().values().get(
                 spreadsheetId=spreadsheet_id,
                 range=range_name
-            ).execute()
+            ))
 
             return result.get('values', [])
         except HttpError as e:
@@ -47,29 +69,51 @@ class GoogleSheetsClient:
         """Writes (overwrites) values to a specific range."""
         try:
             body = {'values': values}
-            result = self.service.spreadsheets().values().update(
+            result = self._execute(self.service.spreadsheets().values().update(
                 spreadsheetId=spreadsheet_id,
                 range=range_name,
                 valueInputOption="USER_ENTERED",
                 body=body
-            ).execute()
+            ))
             return result
         except HttpError as err:
             print(f"API Error writing range: {err}")
             return None
 
-    def append_to_range(self, spreadsheet_id, sheet_name, values):
-        """Appends rows to a sheet."""
+    def append_to_range(self, spreadsheet_id, sheet_name, values, raise_errors=False):
+        """
+        Appends rows to a sheet. With raise_errors, a failed request raises its HttpError instead of returning None.
+        """
         try:
             body = {'values': values}
-            result = self.service.spreadsheets().values().append(
+            result = self._execute(self.service.spreadsheets().values().append(
                 spreadsheetId=spreadsheet_id,
                 range=sheet_name,
                 valueInputOption="USER_ENTERED",
                 insertDataOption="INSERT_ROWS",
                 body=body
-            ).execute()
+            ))
             return result
         except HttpError as err:
+            if raise_errors:
+                raise
             print(f"API Error appending data: {err}")
-            return None
\ No newline at end of file
+            return None
+
+    def batch_update(self, spreadsheet_id, data, raise_errors=False):
+        """
+        Writes several ranges in one request. data is a list of {'range': ..., 'values': ...}.
+        With raise_errors, a failed request raises its HttpError instead of returning None.
+        """
+        try:
+            body = {'valueInputOption': "USER_ENTERED", 'data': data}
+            result = self._execute(self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body=body
+            ))
+            return result
+        except HttpError as err:
+            if raise_errors:
+                raise
+            print(f"API Error batch updating: {err}")
+            return None
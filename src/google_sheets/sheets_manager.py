@@ -1,77 +1,315 @@
-from scipy.signal import upfirdn
+import re
+import threading
+import time
 
 from google_sheets.sheets_client import GoogleSheetsClient
 
+class SheetModel:
+    """
+    Locally cached structure of one sheet: headers, a header -> column index
+    map, and the position of the last row with data plus those of its cells
+    ({column index: value}) that are known without reading the row.
+    """
+
+    def __init__(self, headers, last_row, last_row_cells=None):
+        self.headers = headers
+        self.columns = {header: i for i, header in enumerate(headers)}
+        self.last_row = last_row
+        self.last_row_cells = last_row_cells or {}
+        self.loaded_at = time.monotonic()
+
+
 class SheetManager:
     """
     High-level proxy for interacting with a specific spreadsheet.
+    Sheet structure is cached for cache_ttl seconds (None keeps it until
+    invalidate is called), so appends and updates cost one API call each.
     """
 
-    def __init__(self, credentials, spreadsheet_id):
-        self.client = GoogleSheetsClient(credentials)
+    def __init__(self, credentials, spreadsheet_id, client=None, cache_ttl=300):
+        self.client = client or GoogleSheetsClient(credentials)
         self.spreadsheet_id = spreadsheet_id
+        self.cache_ttl = cache_ttl
+        self._models = {}
+        # {(sheet_name, key_column): KeyIndex}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def invalidate(self, sheet_name=None):
+        """
+        Drops the cached structure of sheet_name, or of every sheet.
+        Call this after the sheet was edited outside this manager.
+        """
+        with self._lock:
+            if sheet_name is None:
+                self._models.clear()
+                self._indexes.clear()
+            else:
+                self._models.pop(sheet_name, None)
+                for key in [key for key in self._indexes if key[0] == sheet_name]:
+                    del self._indexes[key]
+
+    def _expired(self, cached):
+        return cached is not None and self.cache_ttl is not None and \
+            time.monotonic() - cached.loaded_at > self.cache_ttl
+
+    def _model(self, sheet_name):
+        with self._lock:
+            model = self._models.get(sheet_name)
+            if model is None or self._expired(model):
+                model = self._load(sheet_name)
+                self._models[sheet_name] = model
+            return model
+
+    def _load(self, sheet_name):
+        """
+        Reads the header row and the first column only: the last row with a
+        value in that column is taken as the last row. Its other cells are
+        learned from later appends and updates instead of being read.
+        """
+        index = self._index(sheet_name)
+        return SheetModel(index.headers, max(index.rows.values(), default=1))
+
+    def _headers(self, sheet_name):
+        """
+        Headers from the cached model, or from reading row 1 alone.
+        """
+        with self._lock:
+            model = self._models.get(sheet_name)
+            if model is not None and not self._expired(model):
+                return model.headers
+
+        headers = self.client.read_range(self.spreadsheet_id, f"{sheet_name}!1:1")
+        if not headers:
+            raise ValueError(f"No headers found in {sheet_name}. Ensure the first row contains column names.")
+        return headers[0]
+
+    def _index(self, sheet_name, key_column=None):
+        """
+        Key -> row number index of key_column (the first column by default),
+        built by reading that column only.
+        """
+        with self._lock:
+            headers = None
+            if key_column is None:
+                headers = self._headers(sheet_name)
+                key_column = headers[0]
+            index = self._indexes.get((sheet_name, key_column))
+            if index is None or self._expired(index):
+                headers = headers or self._headers(sheet_name)
+                if key_column not in headers:
+                    raise ValueError(f"Key column {key_column} not found in {sheet_name}.")
+                letter = column_letter(headers.index(key_column))
+                column = self.client.read_range(self.spreadsheet_id, f"{sheet_name}!{letter}2:{letter}")
+                if column is None:
+                    raise ValueError(f"Could not read column {key_column} of {sheet_name}.")
+                index = KeyIndex(headers, key_column)
+                for row, values in enumerate(column, start=2):
+                    if values and values[0] != "":
+                        index.rows[str(values[0])] = row
+                self._indexes[(sheet_name, key_column)] = index
+            return index
+
+    def _track_row(self, sheet_name, row, row_dict):
+        """
+        Records a newly written row in every key index of the sheet.
+        """
+        for (name, key_column), index in self._indexes.items():
+            key = row_dict.get(key_column)
+            if name == sheet_name and key not in (None, ""):
+                index.rows[str(key)] = row
 
     def add_entry(self, data_dict, sheet_name):
         """
         Appends a row by mapping a dict of {header: value} to the
         existing column structure in the sheet.
         """
-        headers = self.get_headers(sheet_name)
+        with self._lock:
+            model = self._model(sheet_name)
 
-        # 2. Build the ordered row based on headers
-        row_values = []
-        for header in headers:
-            # Get the value from the dict if it exists, otherwise default to empty string
-            value = data_dict.get(header, "")
-            row_values.append(value)
+            # Build the ordered row based on headers, defaulting to empty strings
+            row_values = [data_dict.get(header, "") for header in model.headers]
 
-        # 3. Append the ordered list
-        values = [row_values]
-        return self.client.append_to_range(self.spreadsheet_id, sheet_name, values)
+            result = self.client.append_to_range(self.spreadsheet_id, sheet_name, [row_values])
+
+            # Track the appended row locally so update_row needs no read. A
+            # buffered append has no range yet; it will land below the last row.
+            if result and result.get("buffered"):
+                row = model.last_row + 1
+            else:
+                row = _updated_row(result)
+            if row is None:
+                self.invalidate(sheet_name)
+            else:
+                model.last_row = row
+                model.last_row_cells = dict(enumerate(row_values))
+                self._track_row(sheet_name, row, data_dict)
+            return result
 
     def update_row(self, data_dict, sheet_name):
         """
         Updates the last existing row given a dict of {header: value}.
-        An existing value will not be overwritten unless it is included in data_dict.
+        Only cells whose value changes (or is not known) are written, so other
+        columns are preserved.
         """
-        all_data = self.client.read_range(self.spreadsheet_id, sheet_name)
-        last_row_idx = len(all_data)
-        last_row_data = all_data[-1]
-        headers = all_data[0] # Gathers headers from all_data instead of using get_headers
+        with self._lock:
+            model = self._model(sheet_name)
+            cells = model.last_row_cells
 
-        new_row = list(last_row_data)
+            updated = False
+            changes = {}
+            for header, value in data_dict.items():
+                col_idx = model.columns.get(header)
+                if col_idx is not None:
+                    if col_idx not in cells or cells[col_idx] != value:
+                        changes[col_idx] = value
+                    updated = True
+                else:
+                    print(f"Header {header} not found in spreadsheet. Skipping.")
 
-        while len(new_row) < len(headers):
-            new_row.append("")
+            if not updated:
+                return None
+            if not changes:
+                return {"totalUpdatedCells": 0}
 
-        updated = False
-        for header, value in data_dict.items():
-            if header in headers:
-                col_idx = headers.index(header)
-                new_row[col_idx] = value
-                updated = True
+            result = self.client.batch_update(self.spreadsheet_id,
+                                              cell_ranges(sheet_name, model.last_row, changes))
+            if result is None:
+                self.invalidate(sheet_name)
             else:
-                print(f"Header {header} not found in spreadsheet. Skipping.")
+                cells.update(changes)
+            return result
 
-        if not updated:
-            return None
+    def update_by_key(self, key_column, key, data_dict, sheet_name):
+        """
+        Updates the row whose key_column holds key, e.g. update_by_key("ID", "42", {"Status": "done"}, "Jobs").
+        Returns None if the key is not in the sheet.
+        """
+        return self.update_rows(key_column, {key: data_dict}, sheet_name)
+
+    def update_rows(self, key_column, updates, sheet_name):
+        """
+        Updates many rows addressed by key in one request. updates is a dict of
+        {key: {header: value}}; only the given cells are written, as minimal A1
+        ranges. Rows are found through a cached key -> row index, so the sheet
+        is never downloaded in full. Unknown keys and headers are skipped.
+        """
+        with self._lock:
+            index = self._index(sheet_name, key_column)
+            columns = {header: i for i, header in enumerate(index.headers)}
+
+            data = []
+            for key, data_dict in updates.items():
+                row = index.rows.get(str(key))
+                if row is None:
+                    print(f"Key {key} not found in {key_column} of {sheet_name}. Skipping.")
+                    continue
+                changes = {}
+                for header, value in data_dict.items():
+                    if header in columns:
+                        changes[columns[header]] = value
+                    else:
+                        print(f"Header {header} not found in spreadsheet. Skipping.")
+                data.extend(cell_ranges(sheet_name, row, changes))
+
+            if not data:
+                return None
 
-        update_range = f"{sheet_name}!A{last_row_idx}"
-        values = [new_row]
-        return self.client.write_range(self.spreadsheet_id, update_range, values)
+            result = self.client.batch_update(self.spreadsheet_id, data)
+            if result is None:
+                self.invalidate(sheet_name)
+                return None
 
+            # Keep the index and the cached last row in step with what was written
+            for key, data_dict in updates.items():
+                row = index.rows.get(str(key))
+                if row is None:
+                    continue
+                new_key = data_dict.get(key_column)
+                if new_key not in (None, "") and str(new_key) != str(key):
+                    del index.rows[str(key)]
+                    index.rows[str(new_key)] = row
+                model = self._models.get(sheet_name)
+                if model is not None and model.last_row == row:
+                    for header, value in data_dict.items():
+                        col_idx = model.columns.get(header)
+                        if col_idx is not None:
+                            model.last_row_cells[col_idx] = value
+            return result
+
+    def get_rows(self, sheet_name):
+        """
+        Returns every data row below the headers as a dict of {header: value}.
+        """
+        all_data = self.client.read_range(self.spreadsheet_id, sheet_name)
+        if not all_data:
+            return []
+
+        headers = all_data[0]
+        rows = []
+        for row in all_data[1:]:
+            rows.append({header: row[i] if i < len(row) else "" for i, header in enumerate(headers)})
+        return rows
 
     def get_headers(self, sheet_name):
         """
         Get current headers to determine column order.
         We assume the headers are in row 1.
         """
-        header_range = f"{sheet_name}!1:1"
-        header_rows = self.client.read_range(self.spreadsheet_id, header_range)
+        return self._model(sheet_name).headers
 
-        if not header_rows:
-            raise ValueError(f"No headers found in {sheet_name}. Ensure the first row contains column names.")
 
-        headers = header_rows[0]
+class KeyIndex:
+    """
+    Row number of each key in one key column, plus the headers it was built with.
+    """
+
+    def __init__(self, headers, key_column):
+        self.headers = headers
+        self.key_column = key_column
+        self.rows = {}
+        self.loaded_at = time.monotonic()
+
+
+def column_letter(index):
+    """
+    A1 column letters for a zero-based column index (0 -> A, 26 -> AA).
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
 
-        return headers
\ No newline at end of file
+def cell_ranges(sheet_name, row, changes):
+    """
+    Minimal batchUpdate data for one row: changes is {column_index: value}, and
+    adjacent columns are merged into one range, e.g. Sheet1!B5:C5.
+    """
+    data = []
+    for col_idx in sorted(changes):
+        if data and col_idx == data[-1]["end"] + 1:
+            data[-1]["end"] = col_idx
+            data[-1]["values"][0].append(changes[col_idx])
+        else:
+            data.append({"start": col_idx, "end": col_idx, "values": [[changes[col_idx]]]})
+
+    ranges = []
+    for entry in data:
+        start, end = column_letter(entry["start"]), column_letter(entry["end"])
+        cells = f"{start}{row}" if start == end else f"{start}{row}:{end}{row}"
+        ranges.append({"range": f"{sheet_name}!{cells}", "values": entry["values"]})
+    return ranges
+
+
+def _updated_row(append_result):
+    """
+    Row number written by an append, from its updatedRange (e.g. "Sheet1!A5:H5").
+    """
+    if not append_result:
+        return None
+    updated_range = append_result.get("updates", {}).get("updatedRange", "")
+    match = re.search(r"![A-Z]*(\d+)", updated_range)
+    return int(match.group(1)) if match else None
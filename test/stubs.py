@@ -0,0 +1,188 @@
+"""
+Local stand-ins for the external providers used by the pipeline.
+"""
+import asyncio
+import random
+import threading
+import time
+
+from PIL import Image
+
+from llm_interface import LLMInterface
+
+
+class FakeInferenceClient:
+    """
+    Stands in for huggingface_hub.InferenceClient with a fixed per-call latency.
+    Images are plain gray unless distinct, in which case each prompt and seed
+    gets its own noise pattern.
+    """
+
+    def __init__(self, latency=0.2, size=(64, 64), distinct=False):
+        self.latency = latency
+        self.size = size
+        self.distinct = distinct
+        self.kwargs = []
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def text_to_image(self, prompt, model, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.kwargs.append(kwargs)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        if self.distinct:
+            rng = random.Random(f"{prompt}:{kwargs.get('seed')}")
+            noise = Image.frombytes("L", (16, 16), bytes(rng.randrange(256) for _ in range(256)))
+            return noise.resize(self.size).convert("RGB")
+        return Image.new("RGB", self.size, (128, 128, 128))
+
+
+class FakeLLM(LLMInterface):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"detailed {prompt}"
+
+
+class FakeUploader:
+    """
+    Stands in for fal_client.SyncClient.upload. Urls are named after the
+    file, or are distinct per upload like fal's when unique.
+    """
+
+    def __init__(self, latency=0.1, unique=False):
+        self.latency = latency
+        self.unique = unique
+        self.calls = 0
+        self.bytes_uploaded = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, data, content_type, file_name=None):
+        with self.lock:
+            self.calls += 1
+            self.bytes_uploaded += len(data)
+            number = self.calls
+        time.sleep(self.latency)
+        return f"https://fake.fal/{number}/{file_name}" if self.unique else f"https://fake.fal/{file_name}"
+
+
+class FakeTrellis:
+    """
+    Stands in for fal_client.subscribe on fal-ai/trellis. With a release
+    event, every job blocks until it is set.
+    """
+
+    def __init__(self, latency=0.0, release=None):
+        self.latency = latency
+        self.release = release
+        self.calls = 0
+
+    def __call__(self, application, arguments, with_logs=False, on_queue_update=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.release is not None:
+            self.release.wait()
+        urls = arguments.get("image_urls") or [arguments["image_url"]]
+        return {"model_mesh": {"url": "|".join(urls) + ".glb"}}
+
+
+class FakeHandle:
+    def __init__(self, result, latency):
+        self.result = result
+        self.latency = latency
+
+    def get(self):
+        time.sleep(self.latency)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeFalQueue:
+    """
+    Stands in for a fal SyncClient: submit returns a handle whose get() waits
+    latency seconds, subscribe blocks for the same time. Every job returns a
+    mesh url derived from its arguments, unless the image url is listed in fail.
+    """
+
+    def __init__(self, latency=0.1, fail=()):
+        self.latency = latency
+        self.fail = set(fail)
+        self.submitted = []
+
+    def _result(self, arguments):
+        urls = arguments.get("image_urls") or [arguments["image_url"]]
+        if urls[0] in self.fail:
+            return RuntimeError(f"Trellis failed on {urls[0]}")
+        return {"model_mesh": {"url": "|".join(urls) + ".glb"}}
+
+    def submit(self, application, arguments, **kwargs):
+        self.submitted.append((application, arguments))
+        return FakeHandle(self._result(arguments), self.latency)
+
+    def subscribe(self, application, arguments, with_logs=False, on_queue_update=None):
+        return self.submit(application, arguments).get()
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {"Content-Length": str(len(content))}
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeGet:
+    """
+    Stands in for requests.get.
+    """
+
+    def __init__(self, content=b"glTF fake mesh", latency=0.0):
+        self.content = content
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, url, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return FakeResponse(self.content)
+
+
+class FakeStreamingLLM(LLMInterface):
+    """
+    Streams its prompt word by word with a delay before each chunk.
+    """
+
+    def __init__(self, chunk_latency=0.02):
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        return f"detailed {prompt}"
+
+    async def astream_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        for word in f"detailed {prompt}".split(" "):
+            await asyncio.sleep(self.chunk_latency)
+            yield word + " "
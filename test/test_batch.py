@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from batch import BatchRunner, PrioritySlots, Services, read_jobs
+from test.stubs import FakeGet, FakeInferenceClient, FakeLLM, FakeTrellis, FakeUploader
+from text_to_3d import PipelineConfig
+
+
+def stub_services(trellis_latency=0.0):
+    return Services(
+        llm=FakeLLM(),
+        model="fake-model",
+        image_client=FakeInferenceClient(latency=0.01),
+        uploader=FakeUploader(latency=0.0),
+        subscribe=FakeTrellis(latency=trellis_latency),
+        get=FakeGet(),
+    )
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmp.name, "out")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_jobs_jsonl_and_csv(self):
+        jsonl = os.path.join(self.tmp.name, "jobs.jsonl")
+        with open(jsonl, 'w') as f:
+            f.write('{"id": "chair", "object": "a chair"}\n\n{"object": "a lamp"}\n')
+        csv_path = os.path.join(self.tmp.name, "jobs.csv")
+        with open(csv_path, 'w') as f:
+            f.write("object\na chair\n\na lamp\n")
+
+        self.assertEqual(read_jobs(jsonl), [{"id": "chair", "object": "a chair"},
+                                            {"id": "2", "object": "a lamp"}])
+        self.assertEqual([job["object"] for job in read_jobs(csv_path)], ["a chair", "a lamp"])
+
+    def test_runs_jobs_and_writes_results(self):
+        services = stub_services()
+        runner = BatchRunner(services, output_dir=self.output_dir, workers=2)
+        jobs = [{"id": "1", "object": "a chair"}, {"id": "2", "object": "a lamp"}]
+        results_path = os.path.join(self.tmp.name, "results.jsonl")
+
+        results = runner.run(jobs, results_path)
+
+        self.assertEqual([r["id"] for r in results], ["1", "2"])
+        self.assertTrue(all(r["status"] == "done" for r in results))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "1", "model.glb")))
+        with open(results_path) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 2)
+
+    def test_failure_is_recorded_per_job(self):
+        services = stub_services()
+        services.subscribe = lambda *args, **kwargs: {}
+        results = BatchRunner(services, output_dir=self.output_dir).run([{"id": "1", "object": "a chair"}])
+
+        self.assertEqual(results[0]["status"], "failed")
+        self.assertEqual(results[0]["stage"], "reconstruct")
+
+    def test_throughput_scales_with_workers(self):
+        jobs = [{"id": str(i), "object": f"object {i}"} for i in range(4)]
+
+        start = time.perf_counter()
+        BatchRunner(stub_services(trellis_latency=0.1), output_dir=self.output_dir, workers=1).run(jobs)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        BatchRunner(stub_services(trellis_latency=0.1), output_dir=self.output_dir, workers=4).run(jobs)
+        parallel = time.perf_counter() - start
+
+        self.assertLess(parallel, serial / 2)
+
+    def test_stage_limit_caps_concurrency(self):
+        jobs = [{"id": str(i), "object": f"object {i}"} for i in range(4)]
+        services = stub_services()
+        config = PipelineConfig(model="fake-model", view_concurrency=1,
+                                model_cache_dir=os.path.join(self.tmp.name, "models"))
+        runner = BatchRunner(services, config, output_dir=self.output_dir, workers=4, stage_limits={"views": 1})
+        runner.run(jobs)
+        self.assertEqual(services.image_client.max_in_flight, 1)
+
+    def test_priority_slots_let_higher_priority_in_first(self):
+        slots = PrioritySlots(1)
+        order = []
+
+        def waiter(priority):
+            with slots.hold(priority):
+                order.append(priority)
+
+        slots.acquire()
+        threads = []
+        for priority in (0, 5, 1, 5):
+            threads.append(threading.Thread(target=waiter, args=(priority,)))
+            threads[-1].start()
+            while slots.waiting < len(threads):
+                time.sleep(0.001)
+        slots.release()
+        for thread in threads:
+            thread.join(1)
+        self.assertEqual(order, [5, 5, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import bench_pipeline, bench_resilience, import_budget
+from benchmarks.stub_providers import FakeSheetsService, Latency, ProviderError
+
+
+class TestStubProviders(unittest.TestCase):
+
+    def test_latency_failure_rate(self):
+        latency = Latency(failure_rate=1.0)
+        with self.assertRaises(ProviderError):
+            latency.wait()
+
+    def test_fake_sheets_ranges(self):
+        service = FakeSheetsService({"Sheet1": [["ID", "User"], ["1", "a"]]})
+        values = service.spreadsheets().values()
+
+        self.assertEqual(values.get(spreadsheetId="s", range="Sheet1!1:1").execute()["values"], [["ID", "User"]])
+        values.append(spreadsheetId="s", range="Sheet1", valueInputOption="USER_ENTERED",
+                      insertDataOption="INSERT_ROWS", body={"values": [["2", "b"]]}).execute()
+        values.update(spreadsheetId="s", range="Sheet1!B2", valueInputOption="USER_ENTERED",
+                      body={"values": [["z"]]}).execute()
+
+        self.assertEqual(values.get(spreadsheetId="s", range="Sheet1").execute()["values"],
+                         [["ID", "User"], ["1", "z"], ["2", "b"]])
+        self.assertEqual(service.count(), 4)
+
+
+class TestBenchPipeline(unittest.TestCase):
+
+    def test_runs_offline_and_compares(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            code = bench_pipeline.main(["--jobs", "3", "--workers", "3", "--time-scale", "0", "--save", baseline])
+            self.assertEqual(code, 0)
+
+            with open(baseline) as f:
+                results = json.load(f)
+            self.assertEqual(results["batch"]["succeeded"], 3)
+            self.assertEqual(results["batch"]["calls"]["flux"], 15)
+            self.assertIn("p95", results["batch"]["stages"]["flux_view"])
+
+            results["batch"]["throughput"] *= 100
+            with open(baseline, 'w') as f:
+                json.dump(results, f)
+            self.assertEqual(bench_pipeline.main(["--jobs", "3", "--time-scale", "0", "--compare", baseline]), 1)
+
+
+class TestBenchResilience(unittest.TestCase):
+
+    def test_resilience_improves_goodput(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "resilience.json")
+            self.assertEqual(bench_resilience.main(["--requests", "40", "--workers", "4", "--save", path]), 0)
+            with open(path) as f:
+                results = json.load(f)
+
+        throttled = results["throttled"]
+        self.assertLess(throttled["direct"]["succeeded"], throttled["retry+rate limit"]["succeeded"])
+        self.assertEqual(throttled["retry+rate limit"]["succeeded"], 40)
+        self.assertEqual(results["outage"]["failover"]["succeeded"], 40)
+        self.assertEqual(results["outage"]["primary only"]["succeeded"], 0)
+
+
+class TestImportBudget(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        output = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |   json.decoder\n"
+                  "import time:       300 |        420 | json\n")
+        self.assertEqual(import_budget.parse_importtime(output), {"json.decoder": (120, 120), "json": (300, 420)})
+
+    def test_entry_points_skip_heavy_modules(self):
+        results = {module: import_budget.measure(module, runs=1) for module in ("main", "batch")}
+        self.assertEqual(import_budget.check(results, budgets={}), [])
+
+        results["main"]["ms"] = 10 ** 6
+        self.assertEqual(len(import_budget.check(results)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import time
+import unittest
+
+from batch import BatchRunner
+from checkpoint import JobManifest, StageCache, cached_viewpoints, run_stage
+from test.stubs import FakeInferenceClient, FakeUploader
+from test.test_batch import stub_services
+from text_to_3d import PipelineConfig
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_completed_stage_is_skipped(self):
+        calls = []
+        manifest = JobManifest(self.tmp.name)
+        run_stage(manifest, "prompt", {"object": "a chair"}, lambda: calls.append(1) or {"prompt": "p"})
+
+        reloaded = JobManifest(self.tmp.name)
+        outputs = run_stage(reloaded, "prompt", {"object": "a chair"}, lambda: calls.append(1) or {})
+        self.assertEqual(outputs, {"prompt": "p"})
+        self.assertEqual(len(calls), 1)
+
+        # Different inputs rerun the stage
+        run_stage(reloaded, "prompt", {"object": "a lamp"}, lambda: calls.append(1) or {"prompt": "q"})
+        self.assertEqual(len(calls), 2)
+
+    def test_changed_artifact_reruns_stage(self):
+        path = os.path.join(self.tmp.name, "model.glb")
+
+        def download():
+            with open(path, 'w') as f:
+                f.write("mesh")
+            return {"model_path": path}
+
+        manifest = JobManifest(self.tmp.name)
+        run_stage(manifest, "download", {"url": "u"}, download, artifacts=lambda o: [o["model_path"]])
+        self.assertIsNotNone(manifest.completed("download", {"url": "u"}))
+
+        with open(path, 'w') as f:
+            f.write("truncated")
+        self.assertIsNone(manifest.completed("download", {"url": "u"}))
+
+    def test_stage_cache_entries_expire(self):
+        cache = StageCache(os.path.join(self.tmp.name, "cache"), ttl=60)
+        cache.put("view", {"viewpoint": "front"}, {"url": "u"})
+        self.assertEqual(cache.get("view", {"viewpoint": "front"}), {"url": "u"})
+
+        old = time.time() - 120
+        os.utime(cache.path("view", {"viewpoint": "front"}), (old, old))
+        self.assertIsNone(cache.get("view", {"viewpoint": "front"}))
+        self.assertFalse(os.path.exists(cache.path("view", {"viewpoint": "front"})))
+
+
+class TestCachedViewpoints(unittest.TestCase):
+
+    def test_only_missing_views_are_generated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = StageCache(tmp)
+            client = FakeInferenceClient(latency=0)
+            uploader = FakeUploader(latency=0)
+
+            first = cached_viewpoints(cache, client, uploader, "a chair", ["front", "back"])
+            second = cached_viewpoints(cache, client, uploader, "a chair", ["front", "back", "top"])
+
+        self.assertEqual(second[:2], first)
+        self.assertEqual(len(second), 3)
+        self.assertEqual(client.calls, 3)
+
+
+class TestResumableBatch(unittest.TestCase):
+
+    def test_rerun_resumes_at_failed_stage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            services = stub_services()
+            subscribe = services.subscribe
+            services.subscribe = lambda *args, **kwargs: {}
+            jobs = [{"id": "1", "object": "a chair"}]
+            config = PipelineConfig(model="fake-model", stage_cache=StageCache(os.path.join(tmp, "cache")),
+                                    model_cache_dir=os.path.join(tmp, "models"))
+            runner = BatchRunner(services, config, output_dir=tmp)
+
+            self.assertEqual(runner.run(jobs)[0]["stage"], "reconstruct")
+            self.assertEqual((services.llm.calls, services.image_client.calls), (1, 5))
+
+            services.subscribe = subscribe
+            result = runner.run(jobs)[0]
+            self.assertEqual(result["status"], "done")
+            # The prompt and all five views came from the manifest
+            self.assertEqual((services.llm.calls, services.image_client.calls), (1, 5))
+
+            # A finished job is not rerun at all, unless resume is off
+            runner.run(jobs)
+            self.assertEqual(subscribe.calls, 1)
+            # Without resume every stage runs again; the model itself comes from the model cache
+            config.stage_cache = None
+            BatchRunner(services, config, output_dir=tmp, resume=False).run(jobs)
+            self.assertEqual((services.llm.calls, services.image_client.calls, subscribe.calls), (2, 10, 1))
+
+    def test_views_are_forgotten_when_trellis_fails_on_them(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            services = stub_services()
+            subscribe = services.subscribe
+
+            def expired(*args, **kwargs):
+                raise RuntimeError("422: could not fetch image_url")
+
+            services.subscribe = expired
+            jobs = [{"id": "1", "object": "a chair"}]
+            config = PipelineConfig(model="fake-model", stage_cache=StageCache(os.path.join(tmp, "cache")),
+                                    model_cache_dir=os.path.join(tmp, "models"))
+            runner = BatchRunner(services, config, output_dir=tmp)
+            self.assertEqual(runner.run(jobs)[0]["stage"], "reconstruct")
+
+            # Neither the manifest nor the stage cache hands Trellis the same urls again
+            services.subscribe = subscribe
+            self.assertEqual(runner.run(jobs)[0]["status"], "done")
+            self.assertEqual((services.llm.calls, services.image_client.calls), (1, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
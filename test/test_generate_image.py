@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import generate_image  # noqa: E402
+
+ENV = {"HF_TOKEN": "token", "PROMPT_CACHE_PATH": "off", "IMAGE_CACHE_DIR": "off", "STAGE_CACHE_DIR": "off",
+       "VIEW_PREPROCESS": "off"}
+
+
+class TestGenerateImage(unittest.TestCase):
+
+    def test_saves_front_and_rear_views(self):
+        """
+        Runs the script through the real service registry with only the
+        Hugging Face client constructors patched.
+        """
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+        client = mock.MagicMock()
+        reply = json.dumps({"front": "front of a chair", "back": "back of a chair"})
+        client.chat.completions.create.return_value.choices.__getitem__.return_value.message.content = reply
+        client.text_to_image.return_value = Image.new("RGB", (8, 8))
+
+        with mock.patch.dict(os.environ, ENV), mock.patch("http_clients._registry", None), \
+                mock.patch("huggingface_hub.InferenceClient", return_value=client), \
+                mock.patch("openai_llm.AsyncInferenceClient"), \
+                mock.patch("builtins.input", return_value="a chair"):
+            worker = threading.Thread(target=generate_image.main, daemon=True)
+            worker.start()
+            worker.join(10)
+            self.assertFalse(worker.is_alive(), "generate_image.main hung")
+
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+        prompts = sorted(call.kwargs["prompt"] for call in client.text_to_image.call_args_list)
+        self.assertEqual(prompts, ["back of a chair", "front of a chair"])
+        self.assertTrue(os.path.exists("front.png") and os.path.exists("rear.png"))
+
+
+if __name__ == '__main__':
+    unittest.main()
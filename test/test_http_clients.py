@@ -0,0 +1,100 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from unittest import mock
+
+from http_clients import ClientRegistry
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+    def do_GET(self):
+        body = b"glTF fake mesh"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    def setUp(self):
+        CountingHandler.connections = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/model.glb"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.registry = ClientRegistry(http2=False)
+
+    def tearDown(self):
+        self.registry.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_bare_requests_opens_a_connection_per_call(self):
+        for _ in range(5):
+            requests.get(self.url)
+        self.assertEqual(CountingHandler.connections, 5)
+
+    def test_shared_session_reuses_connection(self):
+        for _ in range(5):
+            response = self.registry.get(self.url)
+            self.assertEqual(response.content, b"glTF fake mesh")
+        self.assertEqual(CountingHandler.connections, 1)
+
+    def test_shared_httpx_client_reuses_connection(self):
+        client = self.registry.httpx_client()
+        for _ in range(5):
+            client.get(self.url)
+        self.assertEqual(CountingHandler.connections, 1)
+
+    def test_clients_are_shared(self):
+        self.assertIs(self.registry.session(), self.registry.session())
+        self.assertIs(self.registry.httpx_client(), self.registry.httpx_client())
+
+    def test_per_host_limit_caps_connections(self):
+        registry = ClientRegistry(max_connections_per_host=2, http2=False)
+        threads = [threading.Thread(target=registry.get, args=(self.url,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        registry.close()
+        self.assertLessEqual(CountingHandler.connections, 2)
+
+    def test_llm_factories_build_their_shared_clients(self):
+        # Not closed in tearDown, whose close() would wait for a deadlocked lock forever
+        registry = ClientRegistry(http2=False)
+        # Any factory that calls back into the registry under its lock deadlocks here
+        with mock.patch("gemini_llm.genai.Client") as genai_client, \
+                mock.patch("huggingface_hub.InferenceClient") as inference_client, \
+                mock.patch("openai_llm.AsyncInferenceClient"):
+            clients = []
+            worker = threading.Thread(target=lambda: clients.extend([registry.gemini(),
+                                                                     registry.openai(True)]),
+                                      daemon=True)
+            worker.start()
+            worker.join(5)
+            self.assertFalse(worker.is_alive(), "registry deadlocked")
+        gemini, openai = clients
+
+        self.assertIs(gemini, registry.gemini())
+        self.assertIs(genai_client.call_args.kwargs["http_options"].httpx_client, registry.httpx_client())
+        self.assertIs(openai.client, inference_client.return_value)
+        self.assertTrue(openai.raise_errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
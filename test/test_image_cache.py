@@ -0,0 +1,130 @@
+import io
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+from image_cache import GenerationParams, ImageCache, PerceptualIndex, dhash, hamming
+from instrumentation import Tracer, set_tracer
+from pipeline import generate_view, generate_viewpoints
+from test.stubs import FakeInferenceClient, FakeUploader
+
+
+class FixedImageClient:
+    """
+    Returns the same image for every prompt.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.calls = 0
+
+    def text_to_image(self, prompt, model, **kwargs):
+        self.calls += 1
+        return self.image
+
+
+class TestPerceptualHash(unittest.TestCase):
+
+    def test_near_duplicates_are_close(self):
+        image = FakeInferenceClient(latency=0, distinct=True).text_to_image("a chair", "m", seed=0)
+        with io.BytesIO() as buffer:
+            image.save(buffer, format="JPEG", quality=60)
+            recompressed = Image.open(io.BytesIO(buffer.getvalue()))
+        other = FakeInferenceClient(latency=0, distinct=True).text_to_image("a chair", "m", seed=1)
+
+        self.assertLessEqual(hamming(dhash(image), dhash(recompressed)), 4)
+        self.assertGreater(hamming(dhash(image), dhash(other)), 10)
+
+    def test_claim_returns_existing_value(self):
+        index = PerceptualIndex(distance=2)
+        self.assertIsNone(index.claim(0b1111, "front"))
+        self.assertEqual(index.claim(0b1101, "back"), "front")
+        self.assertIsNone(index.claim(0b110000, "top"))
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = ImageCache(self.tmp.name)
+
+    def test_params_are_sent_and_keyed(self):
+        client = FakeInferenceClient(latency=0, distinct=True)
+        params = GenerationParams(seed=7, width=512, height=512, steps=20, guidance=4.0)
+        views = ["front", "back"]
+
+        first = generate_viewpoints(client, FakeUploader(latency=0), "a chair", views, params=params,
+                                    image_cache=self.cache)
+        self.assertEqual(client.kwargs[0], {"seed": 7, "width": 512, "height": 512, "num_inference_steps": 20,
+                                            "guidance_scale": 4.0})
+
+        # A rerun with the same params needs neither FLUX nor an upload
+        uploader = FakeUploader(latency=0)
+        again = generate_viewpoints(client, uploader, "a chair", views, params=params, image_cache=self.cache)
+        self.assertEqual((client.calls, uploader.calls), (2, 0))
+        self.assertEqual(again, first)
+
+        generate_viewpoints(client, uploader, "a chair", views, params=params.next_seed(), image_cache=self.cache)
+        self.assertEqual(client.calls, 4)
+
+    def test_random_seed_is_not_cached(self):
+        client = FakeInferenceClient(latency=0, distinct=True)
+        for _ in range(2):
+            generate_view(client, FakeUploader(latency=0), "a chair", "front", params=GenerationParams(seed=None),
+                          image_cache=self.cache)
+        self.assertEqual(client.calls, 2)
+        self.assertNotIn("seed", client.kwargs[0])
+
+    def test_similar_views_are_reported_not_regenerated(self):
+        # Plain gray stand-in images all look alike, as symmetric objects' views may
+        tracer = Tracer()
+        previous = set_tracer(tracer)
+        self.addCleanup(set_tracer, previous)
+        client = FakeInferenceClient(latency=0)
+        urls = generate_viewpoints(client, FakeUploader(latency=0), "a chair", ["front", "back", "top"],
+                                   image_cache=self.cache)
+        self.assertEqual(client.calls, 3)
+        self.assertEqual(tracer.counters["views_similar"], 2)
+        self.assertEqual(len(urls), 3)
+
+    def test_identical_file_reuses_upload(self):
+        image = FakeInferenceClient(latency=0, distinct=True).text_to_image("a chair", "m", seed=0)
+        uploader = FakeUploader(latency=0)
+        url = generate_view(FixedImageClient(image), uploader, "a chair", "front", image_cache=self.cache)
+
+        # The same image in a later run reuses the upload; a slightly different one does not
+        cache = ImageCache(self.tmp.name)
+        self.assertEqual(generate_view(FixedImageClient(image), uploader, "a chair", "back", image_cache=cache), url)
+        self.assertEqual(uploader.calls, 1)
+        brighter = ImageEnhance.Brightness(image).enhance(1.05)
+        generate_view(FixedImageClient(brighter), uploader, "a red chair", "front", image_cache=cache)
+        self.assertEqual(uploader.calls, 2)
+
+        # Expired uploads are not reused
+        expired = ImageCache(self.tmp.name, upload_ttl=0)
+        generate_view(FixedImageClient(image), uploader, "a chair", "front", image_cache=expired)
+        self.assertEqual(uploader.calls, 3)
+
+        # Nor are uploads a provider failed to fetch
+        cache.forget_uploads([url])
+        generate_view(FixedImageClient(image), uploader, "a chair", "front", image_cache=ImageCache(self.tmp.name))
+        self.assertEqual(uploader.calls, 4)
+
+    def test_same_silhouette_in_another_colour_is_uploaded(self):
+        def vase(colour):
+            image = Image.new("RGB", (64, 64), (255, 255, 255))
+            ImageDraw.Draw(image).ellipse((16, 8, 48, 56), fill=colour)
+            return image
+
+        red, blue = vase((200, 30, 30)), vase((30, 30, 200))
+        self.assertLessEqual(hamming(dhash(red), dhash(blue)), 4)
+
+        uploader = FakeUploader(latency=0)
+        generate_view(FixedImageClient(red), uploader, "a red vase", "front", image_cache=self.cache)
+        generate_view(FixedImageClient(blue), uploader, "a blue vase", "front", image_cache=self.cache)
+        self.assertEqual(uploader.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import io
+import unittest
+
+from PIL import Image
+
+from image_encoding import ImageEncoding
+
+
+class TestImageEncoding(unittest.TestCase):
+
+    def setUp(self):
+        self.image = Image.new("RGBA", (32, 32), (200, 10, 10, 255))
+
+    def test_png_roundtrip(self):
+        data = ImageEncoding("png", compress_level=9).encode(self.image)
+        decoded = Image.open(io.BytesIO(data))
+        self.assertEqual(decoded.format, "PNG")
+        self.assertEqual(decoded.getpixel((0, 0)), (200, 10, 10, 255))
+
+    def test_jpeg_drops_alpha(self):
+        encoding = ImageEncoding("jpeg", quality=80)
+        decoded = Image.open(io.BytesIO(encoding.encode(self.image)))
+        self.assertEqual(decoded.format, "JPEG")
+        self.assertEqual(encoding.content_type, "image/jpeg")
+        self.assertEqual(encoding.extension, "jpg")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ImageEncoding("gif")
+
+
+if __name__ == '__main__':
+    unittest.main()
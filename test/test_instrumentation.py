@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import urllib.request
+
+import instrumentation
+from instrumentation import Tracer
+from pipeline import generate_viewpoints, subscribe_timed, trellis_inputs
+from test.stubs import FakeInferenceClient, FakeUploader
+
+
+class Queued:
+    pass
+
+
+class InProgress:
+    logs = []
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+        self.previous = instrumentation.set_tracer(self.tracer)
+
+    def tearDown(self):
+        instrumentation.set_tracer(self.previous)
+
+    def test_span_records_duration_and_errors(self):
+        with self.tracer.span("llm_prompt", model="m") as attrs:
+            time.sleep(0.01)
+            attrs["tokens"] = 3
+        with self.assertRaises(ValueError):
+            with self.tracer.span("upload"):
+                raise ValueError()
+
+        first, second = self.tracer.spans
+        self.assertGreaterEqual(first.duration, 0.01)
+        self.assertEqual(first.attrs, {"model": "m", "tokens": 3})
+        self.assertEqual(second.attrs["error"], "ValueError")
+
+    def test_max_spans_keeps_latest_and_full_summary(self):
+        tracer = Tracer(max_spans=2)
+        for i in range(5):
+            tracer.record("upload", time.perf_counter(), 0.1 * (i + 1), index=i)
+
+        self.assertEqual([span.attrs["index"] for span in tracer.spans], [3, 4])
+        self.assertEqual(tracer.summary()["upload"]["count"], 5)
+        self.assertAlmostEqual(tracer.summary()["upload"]["max"], 0.5)
+
+    def test_pipeline_stages_are_traced(self):
+        generate_viewpoints(FakeInferenceClient(0), FakeUploader(0), "a chair")
+        summary = self.tracer.summary()
+        for stage in ("flux_view", "encode", "upload"):
+            self.assertEqual(summary[stage]["count"], 5)
+
+    def test_queue_wait_separated_from_processing(self):
+        def subscribe(application, arguments, with_logs, on_queue_update):
+            on_queue_update(Queued())
+            time.sleep(0.05)
+            on_queue_update(InProgress())
+            time.sleep(0.02)
+            return {}
+
+        subscribe_timed(subscribe, trellis_inputs("https://fake/front.png"))
+        summary = self.tracer.summary()
+        self.assertGreaterEqual(summary["trellis_queue"]["total"], 0.05)
+        self.assertLess(summary["trellis_processing"]["total"], 0.05)
+
+    def test_exports(self):
+        with self.tracer.span("download"):
+            pass
+        self.tracer.count("prompt_cache_hits", 2)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            self.tracer.export(path, "chrome")
+            with open(path) as f:
+                events = json.load(f)["traceEvents"]
+        self.assertEqual(events[0]["name"], "download")
+        self.assertEqual(events[0]["ph"], "X")
+
+        text = self.tracer.prometheus_text()
+        self.assertIn("pipeline_prompt_cache_hits_total 2", text)
+        self.assertIn('pipeline_stage_seconds_count{stage="download"} 1', text)
+
+    def test_prometheus_endpoint(self):
+        self.tracer.count("jobs_failed")
+        server = self.tracer.serve_prometheus(0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            body = urllib.request.urlopen(url).read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("pipeline_jobs_failed_total 1", body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from job_service import JobService, request_key, serve
+from pipeline import VIEWPOINTS
+from test.stubs import FakeTrellis, FakeUploader
+from test.test_batch import stub_services
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class TestJobService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.services = stub_services(trellis_latency=0.2)
+        self.services.uploader = FakeUploader(latency=0, unique=True)
+
+    def service(self, **options):
+        service = JobService(self.services, output_dir=os.path.join(self.tmp.name, "out"), **options)
+        self.addCleanup(service.close)
+        return service
+
+    def request(self, url, data=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=body)) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_duplicate_requests_share_one_execution(self):
+        # No job may finish before every duplicate was submitted, or a late one would run again
+        release = threading.Event()
+        self.services.subscribe = FakeTrellis(release=release)
+        self.addCleanup(release.set)
+        service = self.service(workers=4).start()
+        server = serve(service, port=0)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        objects = ["a chair", "a lamp", "a table", "a vase"]
+        # Duplicate-heavy load: 20 requests for 4 objects, spelled differently
+        requests = [objects[i % 4].upper() if i % 3 else f"  {objects[i % 4]} " for i in range(20)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            submitted = list(pool.map(lambda o: self.request(f"{url}/jobs", {"object": o}), requests))
+        self.assertTrue(all(status == 202 for status, _ in submitted))
+        ids = {job["id"] for _, job in submitted}
+        self.assertEqual(len(ids), 4)
+        release.set()
+
+        for job_id in ids:
+            status, job = self.request(f"{url}/jobs/{job_id}/result?wait=10")
+            self.assertEqual(status, 200)
+            self.assertEqual(job["status"], "done")
+            self.assertEqual(job["requests"], 5)
+            self.assertTrue(os.path.exists(job["result"]["model_path"]))
+
+        # One execution per object: 4 instead of 20 LLM calls, Trellis jobs and sets of views
+        services = self.services
+        self.assertEqual(services.llm.calls, 4)
+        self.assertEqual(services.subscribe.calls, 4)
+        self.assertEqual(services.image_client.calls, 4 * len(VIEWPOINTS))
+
+        status, stats = self.request(f"{url}/stats")
+        self.assertEqual((stats["submitted"], stats["coalesced"], stats["executed"]), (20, 16, 4))
+
+        # Finished jobs are not coalesced into; a new request runs again
+        _, job = self.request(f"{url}/jobs", {"object": "a chair"})
+        self.assertFalse(job["coalesced"])
+        self.assertNotIn(job["id"], ids)
+
+    def test_priority_order_and_raised_priority(self):
+        self.services.subscribe = FakeTrellis(latency=0.0)
+        service = self.service(workers=1)
+        for request, priority in [("a", 0), ("b", 0), ("c", 5), ("B", 10)]:
+            service.submit(request, priority)
+        service.start()
+        jobs = [service.wait(job_id, 10) for job_id in list(service.jobs)]
+
+        order = [job.request for job in sorted(jobs, key=lambda job: job.started)]
+        self.assertEqual(order, ["b", "c", "a"])
+        self.assertEqual(service.jobs[jobs[1].id].priority, 10)
+
+    def test_provider_slots_are_shared_across_jobs(self):
+        service = self.service(workers=4, slots={"flux": 1})
+        service.runner.config.view_concurrency = 1
+        service.start()
+        jobs = [service.submit(f"object {i}")[0] for i in range(4)]
+        for job in jobs:
+            self.assertEqual(service.wait(job.id, 10).status, "done")
+        self.assertEqual(self.services.image_client.max_in_flight, 1)
+        self.assertEqual(service.stats()["slots"]["flux"]["in_use"], 0)
+
+    def test_http_errors_and_unix_socket(self):
+        service = self.service(workers=1).start()
+        path = os.path.join(self.tmp.name, "jobs.sock")
+        server = serve(service, socket_path=path)
+        self.addCleanup(server.shutdown)
+
+        def call(method, target, data=None):
+            connection = UnixConnection(path)
+            connection.request(method, target, body=json.dumps(data) if data is not None else None,
+                               headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            result = response.status, json.loads(response.read())
+            connection.close()
+            return result
+
+        self.assertEqual(call("POST", "/jobs", {"priority": 1})[0], 400)
+        self.assertEqual(call("GET", "/jobs/missing")[0], 404)
+        status, job = call("POST", "/jobs", {"object": "a chair"})
+        self.assertEqual(status, 202)
+        status, job = call("GET", f"/jobs/{job['id']}/result?wait=10")
+        self.assertEqual((status, job["status"]), (200, "done"))
+        self.assertEqual(len(call("GET", "/jobs")[1]), 1)
+
+    def test_request_key_ignores_case_and_spacing(self):
+        self.assertEqual(request_key("A  wooden\nchair "), request_key("a wooden chair"))
+        self.assertNotEqual(request_key("a chair"), request_key("a lamp"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from gemini_llm import GeminiAdaptor
+from llm_interface import IncompleteStreamError, collect_stream
+from openai_llm import OpenaiAdaptor
+from prompt_cache import CachedLLM, PromptCache
+from test.stubs import FakeLLM, FakeStreamingLLM
+
+
+async def fake_stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def broken_stream(chunks):
+    for chunk in chunks:
+        yield chunk
+    raise ConnectionError("connection reset")
+
+
+class TestAsyncInterface(unittest.TestCase):
+
+    def test_default_async_falls_back_to_sync(self):
+        llm = FakeLLM()
+        self.assertEqual(asyncio.run(llm.agenerate_prompt("a chair", "m", "sys")), "detailed a chair")
+
+        text, stats = asyncio.run(collect_stream(llm.astream_prompt("a chair", "m", "sys")))
+        self.assertEqual(text, "detailed a chair")
+        self.assertEqual(stats.chunks, 1)
+
+    def test_collect_stream_reports_time_to_first_token(self):
+        seen = []
+        text, stats = asyncio.run(collect_stream(
+            FakeStreamingLLM(chunk_latency=0.02).astream_prompt("a wooden chair", "m", "sys"),
+            on_chunk=seen.append
+        ))
+
+        self.assertEqual(text, "detailed a wooden chair ")
+        self.assertEqual(stats.chunks, 4)
+        self.assertEqual(len(seen), 4)
+        self.assertLess(stats.time_to_first_token, stats.total_time)
+
+    def test_empty_stream_returns_none(self):
+        text, stats = asyncio.run(collect_stream(fake_stream([])))
+        self.assertIsNone(text)
+        self.assertIsNone(stats.time_to_first_token)
+
+    def test_many_calls_share_one_event_loop(self):
+        llm = FakeStreamingLLM(chunk_latency=0.05)
+
+        async def run_all():
+            return await asyncio.gather(*[
+                collect_stream(llm.astream_prompt(f"object {i}", "m", "sys")) for i in range(200)
+            ])
+
+        start = time.perf_counter()
+        results = asyncio.run(run_all())
+        self.assertEqual(len(results), 200)
+        self.assertLess(time.perf_counter() - start, 0.05 * 3 * 10)
+
+    def test_cached_stream_is_replayed(self):
+        inner = FakeStreamingLLM(chunk_latency=0)
+        llm = CachedLLM(inner, PromptCache(":memory:"))
+
+        first, _ = asyncio.run(collect_stream(llm.astream_prompt("a chair", "m", "sys")))
+        second, stats = asyncio.run(collect_stream(llm.astream_prompt("a chair", "m", "sys")))
+
+        self.assertEqual(first, second)
+        self.assertEqual(stats.chunks, 1)
+        self.assertEqual(inner.calls, 1)
+
+
+class TestAdaptorStreaming(unittest.TestCase):
+
+    def test_gemini_stream(self):
+        adaptor = GeminiAdaptor.__new__(GeminiAdaptor)
+        chunks = [SimpleNamespace(text="a "), SimpleNamespace(text=None), SimpleNamespace(text="chair")]
+        adaptor.client = mock.MagicMock()
+        adaptor.client.aio.models.generate_content_stream = mock.AsyncMock(return_value=fake_stream(chunks))
+
+        text, stats = asyncio.run(collect_stream(adaptor.astream_prompt("chair", "m", "sys")))
+        self.assertEqual(text, "a chair")
+        self.assertEqual(stats.chunks, 2)
+
+    def test_openai_stream(self):
+        adaptor = OpenaiAdaptor.__new__(OpenaiAdaptor)
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="a "))]),
+            SimpleNamespace(choices=[]),
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="chair"))]),
+        ]
+        adaptor.async_client = mock.MagicMock()
+        adaptor.async_client.chat.completions.create = mock.AsyncMock(return_value=fake_stream(chunks))
+
+        text, _ = asyncio.run(collect_stream(adaptor.astream_prompt("chair", "m", "sys")))
+        self.assertEqual(text, "a chair")
+        kwargs = adaptor.async_client.chat.completions.create.call_args.kwargs
+        self.assertTrue(kwargs["stream"])
+
+    def test_stream_error_yields_nothing(self):
+        adaptor = OpenaiAdaptor.__new__(OpenaiAdaptor)
+        adaptor.async_client = mock.MagicMock()
+        adaptor.async_client.chat.completions.create = mock.AsyncMock(side_effect=RuntimeError("boom"))
+
+        text, _ = asyncio.run(collect_stream(adaptor.astream_prompt("chair", "m", "sys")))
+        self.assertIsNone(text)
+
+    def test_stream_broken_midway_raises(self):
+        adaptor = GeminiAdaptor.__new__(GeminiAdaptor)
+        adaptor.client = mock.MagicMock()
+        adaptor.client.aio.models.generate_content_stream = mock.AsyncMock(
+            return_value=broken_stream([SimpleNamespace(text="a wooden")]))
+
+        with self.assertRaises(IncompleteStreamError):
+            asyncio.run(collect_stream(adaptor.astream_prompt("chair", "m", "sys")))
+
+    def test_broken_stream_is_not_cached(self):
+        adaptor = OpenaiAdaptor.__new__(OpenaiAdaptor)
+        chunk = SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="a wooden"))])
+        adaptor.async_client = mock.MagicMock()
+        adaptor.async_client.chat.completions.create = mock.AsyncMock(return_value=broken_stream([chunk]))
+        cache = PromptCache(":memory:")
+
+        with self.assertRaises(IncompleteStreamError):
+            asyncio.run(collect_stream(CachedLLM(adaptor, cache).astream_prompt("chair", "m", "sys")))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
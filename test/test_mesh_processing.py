@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import trimesh
+
+import mesh_processing
+from mesh_processing import Mesh
+
+
+def split_sphere():
+    """
+    An icosphere with every face given its own three vertices, as a UV-seamed export would.
+    """
+    sphere = trimesh.creation.icosphere(subdivisions=4)
+    vertices = sphere.vertices[sphere.faces].reshape(-1, 3)
+    faces = np.arange(len(vertices)).reshape(-1, 3)
+    return Mesh(vertices, faces), sphere
+
+
+class TestCleanup(unittest.TestCase):
+
+    def test_merge_vertices(self):
+        mesh, sphere = split_sphere()
+        merged = mesh_processing.merge_vertices(mesh)
+        self.assertEqual(len(merged.vertices), len(sphere.vertices))
+        self.assertEqual(len(merged), len(sphere.faces))
+
+    def test_remove_degenerate(self):
+        vertices = [[0, 0, 0], [1, 0, 0], [0, 1, 0], [2, 0, 0], [5, 5, 5]]
+        faces = [[0, 1, 2], [0, 0, 1], [0, 1, 3], [2, 1, 0], [0, 1, 2]]
+        cleaned = mesh_processing.remove_degenerate(Mesh(vertices, faces))
+        # Only the first triangle is kept: a repeated vertex, a collinear one and two duplicates go
+        self.assertEqual(len(cleaned), 1)
+        self.assertEqual(len(cleaned.vertices), 3)
+
+    def test_normals_point_outwards(self):
+        sphere = trimesh.creation.icosphere(subdivisions=3)
+        normals = mesh_processing.vertex_normals(Mesh(sphere.vertices, sphere.faces))
+        self.assertTrue(np.allclose(np.linalg.norm(normals, axis=1), 1))
+        self.assertGreater((normals * sphere.vertices).sum(axis=1).min(), 0.95)
+
+
+class TestDecimation(unittest.TestCase):
+
+    def test_lods_fit_budgets(self):
+        mesh, _ = split_sphere()
+        lods = mesh_processing.build_lods(mesh, (2000, 500, 100))
+        self.assertEqual(len(lods), 3)
+        for lod, budget in zip(lods, (2000, 500, 100)):
+            self.assertLessEqual(len(lod), budget)
+            self.assertGreater(len(lod), budget // 4)
+            # Decimated shapes stay close to the unit sphere
+            radii = np.linalg.norm(lod.vertices, axis=1)
+            self.assertLess(np.abs(radii - 1).max(), 0.2)
+
+    def test_clustering_averages_colors(self):
+        mesh, _ = split_sphere()
+        mesh.colors = np.tile(np.array([[200, 100, 50, 255]], dtype=np.uint8), (len(mesh.vertices), 1))
+        lod = mesh_processing._decimate_clustering(mesh, 200)
+        self.assertLessEqual(len(lod), 200)
+        self.assertTrue((lod.colors == [200, 100, 50, 255]).all())
+
+
+class TestExport(unittest.TestCase):
+
+    def test_npz_round_trip_is_compact(self):
+        sphere = trimesh.creation.icosphere(subdivisions=4)
+        mesh = Mesh(sphere.vertices, sphere.faces)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = mesh_processing.save_npz(mesh, os.path.join(tmp, "mesh.npz"))
+            loaded = mesh_processing.load_npz(path)
+            self.assertLess(os.path.getsize(path), mesh.vertices.nbytes + mesh.faces.nbytes)
+
+        self.assertTrue(np.array_equal(loaded.faces, mesh.faces))
+        self.assertLess(np.abs(loaded.vertices - mesh.vertices).max(), 1e-4)
+
+    def test_empty_mesh_round_trip(self):
+        mesh = Mesh(np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64))
+        with tempfile.TemporaryDirectory() as tmp:
+            loaded = mesh_processing.load_npz(mesh_processing.save_npz(mesh, os.path.join(tmp, "empty.npz")))
+        self.assertEqual((len(loaded.vertices), len(loaded)), (0, 0))
+
+    def test_process_writes_each_lod(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "model.glb")
+            trimesh.creation.icosphere(subdivisions=4).export(source)
+            outputs = mesh_processing.process(source, budgets=(1000, 200))
+
+            self.assertEqual([(o["lod"], os.path.splitext(o["path"])[1]) for o in outputs],
+                             [(0, ".npz"), (0, ".glb"), (1, ".npz"), (1, ".glb")])
+            for output in outputs:
+                self.assertTrue(os.path.exists(output["path"]))
+                self.assertLess(output["bytes"], os.path.getsize(source))
+            self.assertLessEqual(len(trimesh.load(outputs[-1]["path"], force="mesh").faces), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
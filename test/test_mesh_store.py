@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import trimesh
+
+from mesh_store import MeshStore
+
+
+class TestMeshStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = MeshStore(os.path.join(self.tmp.name, "store"))
+
+    def model(self, name, center=(0, 0, 0), subdivisions=3):
+        sphere = trimesh.creation.icosphere(subdivisions=subdivisions)
+        sphere.apply_translation(center)
+        path = os.path.join(self.tmp.name, f"{name}.glb")
+        sphere.export(path)
+        return path, sphere
+
+    def test_round_trip_without_copy(self):
+        path, sphere = self.model("a")
+        key = self.store.ingest(path, object="ball")
+
+        with self.store.open(key) as mesh:
+            self.assertTrue(np.allclose(mesh.vertices, sphere.vertices, atol=1e-6))
+            self.assertTrue(np.array_equal(mesh.faces, sphere.faces))
+            self.assertEqual(mesh.normals.shape, mesh.vertices.shape)
+            # Views into the mapped file, not copies
+            self.assertFalse(mesh.vertices.flags.owndata)
+            self.assertFalse(mesh.vertices.flags.writeable)
+            self.assertEqual(mesh.vertices.ctypes.data % 64, 0)
+            self.assertEqual(mesh.entry["object"], "ball")
+
+    def test_ingest_is_content_addressed(self):
+        path, _ = self.model("a")
+        self.assertEqual(self.store.ingest(path), self.store.ingest(path))
+        self.assertEqual(len(self.store), 1)
+
+    def test_concurrent_ingests_parse_once(self):
+        path, _ = self.model("a")
+        with mock.patch("trimesh.load", wraps=trimesh.load) as load:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                keys = set(pool.map(lambda _: self.store.ingest(path), range(8)))
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(os.listdir(self.store.root).count(f"{keys.pop()}.bin"), 1)
+        self.assertFalse([name for name in os.listdir(self.store.root) if name.endswith(".part")])
+
+    def test_empty_mesh(self):
+        self.store.put("empty", {"vertices": np.zeros((0, 3), dtype=np.float32),
+                                 "faces": np.zeros((0, 3), dtype=np.uint32)})
+        with self.store.open("empty") as mesh:
+            self.assertEqual((mesh.vertices.shape, mesh.faces.shape), ((0, 3), (0, 3)))
+        self.assertIsNone(self.store.bbox("empty"))
+
+    def test_index_answers_queries_without_array_files(self):
+        near, _ = self.model("near")
+        far, _ = self.model("far", center=(10, 0, 0))
+        near_key, far_key = self.store.ingest(near), self.store.ingest(far)
+
+        reopened = MeshStore(self.store.root)
+        os.remove(reopened.data_path(near_key))
+        os.remove(reopened.data_path(far_key))
+
+        self.assertEqual(reopened.query_bbox([-2, -2, -2], [2, 2, 2]), [near_key])
+        self.assertEqual(reopened.query_bbox([8, -1, -1], [12, 1, 1]), [far_key])
+        self.assertEqual(reopened.query_bbox([3, 3, 3], [4, 4, 4]), [])
+        self.assertTrue(np.allclose(reopened.bbox(far_key), [[9, -1, -1], [11, 1, 1]]))
+        self.assertEqual({entry["key"] for entry in reopened.entries()}, {near_key, far_key})
+
+    def test_put_and_remove(self):
+        arrays = {"vertices": np.eye(3, dtype=np.float32), "faces": np.array([[0, 1, 2]], dtype=np.uint32),
+                  "uvs": np.zeros((3, 2), dtype=np.float32)}
+        self.store.put("tri", arrays)
+        with self.store.open("tri") as mesh:
+            self.assertTrue(np.array_equal(mesh.uvs, arrays["uvs"]))
+            self.assertIsNone(mesh.normals)
+
+        self.store.remove("tri")
+        self.assertNotIn("tri", self.store)
+        self.assertFalse(os.path.exists(self.store.data_path("tri")))
+        with self.assertRaises(KeyError):
+            self.store.open("tri")
+
+
+if __name__ == '__main__':
+    unittest.main()
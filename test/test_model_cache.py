@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import model_cache
+from model_cache import DownloadError, ModelCache, stream_download
+
+MESH = os.urandom(256 * 1024)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves MESH with Range and If-Range support. The first `truncate`
+    responses are cut off halfway.
+    """
+    protocol_version = "HTTP/1.1"
+    etag = '"v1"'
+    truncate = 0
+    requests_seen = []
+
+    def do_GET(self):
+        start = 0
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        RangeHandler.requests_seen.append(range_header)
+        if range_header and if_range not in (None, RangeHandler.etag):
+            range_header = None
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(MESH) - 1}/{len(MESH)}")
+        else:
+            self.send_response(200)
+        body = MESH[start:]
+        self.send_header("ETag", RangeHandler.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if RangeHandler.truncate:
+            RangeHandler.truncate -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestModelCache(unittest.TestCase):
+
+    def setUp(self):
+        RangeHandler.truncate = 0
+        RangeHandler.requests_seen = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/model.glb"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.glb")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_stream_download_verifies_hash(self):
+        stream_download(requests.get, self.url, self.path, expected_sha256=hashlib.sha256(MESH).hexdigest(),
+                        chunk_size=4096)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), MESH)
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_resumes_after_interruption(self):
+        RangeHandler.truncate = 1
+        stream_download(requests.get, self.url, self.path, chunk_size=4096)
+
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), MESH)
+        self.assertIsNone(RangeHandler.requests_seen[0])
+        self.assertEqual(RangeHandler.requests_seen[1], f"bytes={len(MESH) // 2}-")
+
+    def test_part_from_another_url_is_not_resumed(self):
+        with open(self.path + ".part", 'wb') as f:
+            f.write(b"x" * 1000)
+        with open(self.path + ".part.source.json", 'w') as f:
+            json.dump({"url": "https://other/model.glb", "etag": '"v1"'}, f)
+
+        stream_download(requests.get, self.url, self.path)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), MESH)
+        self.assertEqual(RangeHandler.requests_seen, [None])
+        self.assertFalse(os.path.exists(self.path + ".part.source.json"))
+
+    def test_changed_file_is_downloaded_again(self):
+        # A .part of an earlier version of the file at the same url
+        with open(self.path + ".part", 'wb') as f:
+            f.write(os.urandom(len(MESH) // 2))
+        with open(self.path + ".part.source.json", 'w') as f:
+            json.dump({"url": self.url, "etag": '"v0"'}, f)
+
+        stream_download(requests.get, self.url, self.path)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), MESH)
+
+    def test_bad_checksum_leaves_no_file(self):
+        with self.assertRaises(DownloadError):
+            stream_download(requests.get, self.url, self.path, expected_sha256="0" * 64)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_gives_up_after_max_attempts(self):
+        RangeHandler.truncate = 5
+        with self.assertRaises(DownloadError):
+            stream_download(requests.get, self.url, self.path, max_attempts=2)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_identical_inputs_download_once(self):
+        cache = ModelCache(os.path.join(self.tmp.name, "cache"))
+        inputs = {"model": "fal-ai/trellis", "arguments": {"image_url": "https://fake/front.png"}}
+
+        self.assertIsNone(cache.get(inputs))
+        first = cache.fetch(requests.get, inputs, self.url)
+        second = cache.fetch(requests.get, inputs, self.url)
+
+        self.assertEqual(first, second)
+        self.assertEqual(cache.get(inputs), first)
+        self.assertEqual(len(RangeHandler.requests_seen), 1)
+
+    def test_concurrent_fetches_leave_no_locks_behind(self):
+        cache = ModelCache(os.path.join(self.tmp.name, "cache"))
+        inputs = [{"model": "fal-ai/trellis", "arguments": {"seed": seed % 2}} for seed in range(6)]
+        threads = [threading.Thread(target=cache.fetch, args=(requests.get, i, self.url)) for i in inputs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(RangeHandler.requests_seen), 2)
+        self.assertEqual(model_cache._fetch_locks, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pipeline import VIEWPOINTS, generate_viewpoints
+from test.stubs import FakeInferenceClient, FakeUploader
+
+GENERATE_LATENCY = 0.2
+UPLOAD_LATENCY = 0.1
+
+
+class TestGenerateViewpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_preserves_viewpoint_order(self):
+        urls = generate_viewpoints(FakeInferenceClient(GENERATE_LATENCY), FakeUploader(UPLOAD_LATENCY),
+                                   "a chair")
+        expected = [f"https://fake.fal/{v}.png" for v in VIEWPOINTS]
+        self.assertEqual(urls, expected)
+
+    def test_wall_clock_near_slowest_view(self):
+        start = time.perf_counter()
+        generate_viewpoints(FakeInferenceClient(GENERATE_LATENCY), FakeUploader(UPLOAD_LATENCY),
+                            "a chair")
+        elapsed = time.perf_counter() - start
+
+        per_view = GENERATE_LATENCY + UPLOAD_LATENCY
+        self.assertLess(elapsed, per_view * 2)
+        self.assertLess(elapsed, per_view * len(VIEWPOINTS))
+
+    def test_views_persisted_only_when_requested(self):
+        # Without save_dir nothing is written, not even to the working directory
+        cwd = os.getcwd()
+        workdir = os.path.join(self.tmp.name, "cwd")
+        os.makedirs(workdir)
+        os.chdir(workdir)
+        try:
+            generate_viewpoints(FakeInferenceClient(0), FakeUploader(0), "a chair")
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(os.listdir(workdir), [])
+
+        save_dir = os.path.join(self.tmp.name, "views")
+        os.makedirs(save_dir)
+        generate_viewpoints(FakeInferenceClient(0), FakeUploader(0), "a chair", save_dir=save_dir)
+        self.assertEqual(sorted(os.listdir(save_dir)), sorted(f"{v}.png" for v in VIEWPOINTS))
+
+    def test_concurrency_limit(self):
+        client = FakeInferenceClient(latency=0.05)
+        generate_viewpoints(client, FakeUploader(0), "a chair", max_workers=2)
+        self.assertEqual(client.max_in_flight, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_image_upload import synthetic_view
+from image_encoding import ImageEncoding
+from pipeline import generate_viewpoints
+from preprocess import (RejectedViewError, Preprocessor, bounding_box, foreground_alpha, preprocess_array,
+                        square_crop)
+from test.stubs import FakeInferenceClient, FakeUploader
+
+
+class TestPreprocessArray(unittest.TestCase):
+
+    def test_crops_resizes_and_clears_background(self):
+        pixels = np.asarray(synthetic_view(1024))
+        result = preprocess_array(pixels, size=518, padding=0.1)
+
+        self.assertEqual(result.shape, (518, 518, 4))
+        self.assertEqual(result[0, 0, 3], 0)
+        self.assertEqual(result[259, 259, 3], 255)
+        # The object spans the crop apart from the padding
+        top, left, bottom, right = bounding_box(result[..., 3] > 127)
+        self.assertLess(left, 518 * 0.12)
+        self.assertGreater(right, 518 * 0.88)
+
+    def test_object_at_the_edge_is_padded(self):
+        pixels = np.full((200, 300, 3), 128, dtype=np.uint8)
+        pixels[:80, :60] = (200, 30, 30)
+        result = preprocess_array(pixels, size=64)
+        self.assertEqual(result.shape, (64, 64, 4))
+        self.assertEqual(result[0, 0, 3], 0)
+
+    def test_rejects_blank_and_backgroundless_views(self):
+        with self.assertRaises(RejectedViewError):
+            preprocess_array(np.full((64, 64, 3), 128, dtype=np.uint8))
+        # Noise everywhere: no background to separate the object from
+        noise = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        with self.assertRaises(RejectedViewError):
+            preprocess_array(noise)
+
+    def test_helpers(self):
+        mask = np.zeros((10, 10), dtype=bool)
+        mask[2:4, 3:8] = True
+        self.assertEqual(bounding_box(mask), (2, 3, 4, 8))
+        self.assertIsNone(bounding_box(np.zeros((3, 3), dtype=bool)))
+        self.assertEqual(square_crop((2, 3, 4, 8), padding=0.0), (1, 3, 5))
+
+        alpha = foreground_alpha(np.array([[[128, 128, 128], [134, 128, 128], [160, 128, 128]]]),
+                                 np.array([128, 128, 128]), threshold=24)
+        self.assertEqual(alpha.tolist(), [[0.0, 0.0, 1.0]])
+
+
+class TestPreprocessor(unittest.TestCase):
+
+    def test_process_pool_and_smaller_uploads(self):
+        view = synthetic_view(1024)
+        with Preprocessor(workers=2) as preprocess:
+            results = [preprocess(view, name) for name in ("front", "back")]
+
+        encoding = ImageEncoding("webp")
+        self.assertEqual(results[0].size, (518, 518))
+        self.assertLess(len(encoding.encode(results[0])), len(encoding.encode(view)))
+
+    def test_blank_views_are_not_uploaded(self):
+        uploader = FakeUploader(latency=0)
+        with self.assertRaises(RuntimeError):
+            generate_viewpoints(FakeInferenceClient(latency=0), uploader, "a chair", ["front", "back"],
+                                preprocess=Preprocessor(workers=0))
+        self.assertEqual(uploader.calls, 0)
+
+    def test_mode_conversion(self):
+        image = synthetic_view(128).quantize(colors=64, dither=Image.Dither.NONE)
+        self.assertEqual(Preprocessor(size=32, workers=0)(image).mode, "RGBA")
+
+
+if __name__ == '__main__':
+    unittest.main()
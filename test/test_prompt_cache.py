@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+import unittest
+
+from llm_interface import LLMInterface
+from prompt_cache import CachedLLM, PromptCache
+
+
+class CountingLLM(LLMInterface):
+    def __init__(self):
+        self.calls = 0
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        return f"{model}:{prompt}:{self.calls}"
+
+
+class TestPromptCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "prompts.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_skips_adapter(self):
+        inner = CountingLLM()
+        llm = CachedLLM(inner, PromptCache(self.path))
+
+        first = llm.generate_prompt("a chair", "m", "sys")
+        second = llm.generate_prompt("a chair", "m", "sys")
+
+        self.assertEqual(first, second)
+        self.assertEqual(inner.calls, 1)
+        self.assertEqual(llm.cache.stats()["hits"], 1)
+        self.assertEqual(llm.cache.stats()["misses"], 1)
+
+    def test_key_includes_model_and_instruction(self):
+        inner = CountingLLM()
+        llm = CachedLLM(inner, PromptCache(self.path))
+
+        llm.generate_prompt("a chair", "m", "sys")
+        llm.generate_prompt("a chair", "other", "sys")
+        llm.generate_prompt("a chair", "m", "sys with feedback")
+        self.assertEqual(inner.calls, 3)
+
+    def test_persists_across_instances(self):
+        CachedLLM(CountingLLM(), PromptCache(self.path)).generate_prompt("a lamp", "m", "sys")
+
+        inner = CountingLLM()
+        CachedLLM(inner, PromptCache(self.path)).generate_prompt("a lamp", "m", "sys")
+        self.assertEqual(inner.calls, 0)
+
+    def test_ttl_expiry(self):
+        cache = PromptCache(self.path, ttl=0.05)
+        cache.put("k", "v")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = PromptCache(self.path, max_entries=2)
+        cache.put("a", "1")
+        time.sleep(0.01)
+        cache.put("b", "2")
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("c", "3")
+
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "3")
+
+    def test_discard(self):
+        inner = CountingLLM()
+        llm = CachedLLM(inner, PromptCache(self.path))
+        llm.generate_prompt("a chair", "m", "sys")
+        llm.discard("a chair", "m", "sys")
+        llm.generate_prompt("a chair", "m", "sys")
+        self.assertEqual(inner.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
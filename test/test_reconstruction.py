@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest
+
+import trimesh
+
+from model_cache import ModelCache
+from pipeline import trellis_inputs
+from reconstruction import (TRELLIS_MULTI_MODEL, await_handles, mesh_quality, reconstruct_fan_out,
+                            reconstruct_views)
+from test.stubs import FakeFalQueue, FakeGet
+
+URLS = [f"https://fake.fal/{view}.png" for view in ("front", "back", "top", "left", "right")]
+
+
+class TestReconstruction(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ModelCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_multi_submits_all_views_in_one_job(self):
+        queue = FakeFalQueue(latency=0)
+        path = reconstruct_views("multi", queue, FakeGet(), self.cache, URLS)
+
+        self.assertEqual(len(queue.submitted), 1)
+        application, arguments = queue.submitted[0]
+        self.assertEqual(application, TRELLIS_MULTI_MODEL)
+        self.assertEqual(arguments["image_urls"], URLS)
+        self.assertTrue(os.path.exists(path))
+
+        reconstruct_views("multi", queue, FakeGet(), self.cache, URLS)
+        self.assertEqual(len(queue.submitted), 1)
+
+    def test_fan_out_waits_overlap(self):
+        queue = FakeFalQueue(latency=0.2)
+        start = time.perf_counter()
+        path, scores = reconstruct_fan_out(queue.submit, FakeGet(), self.cache, URLS, score=lambda p: 1.0)
+
+        self.assertLess(time.perf_counter() - start, 0.2 * 2)
+        self.assertEqual(len(queue.submitted), len(URLS))
+        self.assertEqual(scores, [1.0] * len(URLS))
+        self.assertIsNotNone(path)
+
+    def test_fan_out_picks_best_score_and_skips_failures(self):
+        queue = FakeFalQueue(latency=0, fail=[URLS[0]])
+        paths = [self.cache.path(trellis_inputs(url)) for url in URLS]
+        scores_by_path = dict(zip(paths, [0.8, 0.2, 0.9, 0.5, 0.1]))
+
+        path, scores = reconstruct_fan_out(queue.submit, FakeGet(), self.cache, URLS,
+                                           score=scores_by_path.get)
+        self.assertEqual(scores, [0.0, 0.2, 0.9, 0.5, 0.1])
+        self.assertEqual(path, paths[2])
+
+    def test_await_handles_returns_exceptions_in_order(self):
+        queue = FakeFalQueue(latency=0, fail=[URLS[1]])
+        handles = [queue.submit("fal-ai/trellis", {"image_url": url}) for url in URLS[:3]]
+        results = await_handles(handles)
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertIn("model_mesh", results[2])
+
+    def test_mesh_quality_prefers_single_clean_piece(self):
+        whole = os.path.join(self.tmp.name, "whole.glb")
+        fragmented = os.path.join(self.tmp.name, "fragmented.glb")
+        trimesh.creation.box().export(whole)
+        pieces = [trimesh.creation.box(), trimesh.creation.icosphere().apply_translation([5, 0, 0])]
+        trimesh.util.concatenate(pieces).export(fragmented)
+
+        self.assertAlmostEqual(mesh_quality(whole), 1.0)
+        self.assertLess(mesh_quality(fragmented), mesh_quality(whole))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            reconstruct_views("all", FakeFalQueue(), FakeGet(), self.cache, URLS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import unittest
+
+from prompt_cache import CachedLLM, PromptCache
+from refinement import FeedbackHistory, RefinementSession, estimate_tokens
+from test.stubs import FakeLLM
+
+
+class TestFeedbackHistory(unittest.TestCase):
+
+    def test_deduplicates_and_bounds(self):
+        history = FeedbackHistory(max_items=3, max_chars=100)
+        for feedback in ["more wood", "darker", "More  wood.", "taller", "thinner legs"]:
+            history.add(feedback)
+        self.assertEqual(history.items, ["More wood.", "taller", "thinner legs"])
+
+        history.add("x" * 90)
+        self.assertLessEqual(sum(len(item) for item in history.items), 100)
+        self.assertEqual(history.items[-1], "x" * 90)
+
+    def test_instruction_stays_bounded(self):
+        history = FeedbackHistory()
+        for i in range(50):
+            history.add(f"feedback number {i} about the legs")
+        self.assertLess(len(history.instruction("base")), 300)
+        self.assertEqual(history.instruction("base").count("- "), 5)
+
+
+class TestRefinementSession(unittest.TestCase):
+
+    def test_candidates_are_generated_concurrently(self):
+        llm = FakeLLM(latency=0.1)
+        session = RefinementSession(llm, "m", "a chair", "sys", candidates=3)
+
+        start = time.perf_counter()
+        candidates = session.propose()
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual(len(candidates), 3)
+        self.assertEqual(len(set(candidates)), 3)
+        self.assertEqual(llm.calls, 3)
+
+    def test_rejected_candidates_are_not_served_from_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            inner = FakeLLM()
+            llm = CachedLLM(inner, PromptCache(os.path.join(tmp, "cache.db")))
+            session = RefinementSession(llm, "m", "a chair", "sys", candidates=2)
+
+            session.propose()
+            session.reject()
+            session.propose()
+            self.assertEqual(inner.calls, 4)
+
+    def test_report(self):
+        session = RefinementSession(FakeLLM(), "m", "a chair", "sys", candidates=2)
+        session.propose()
+        session.reject("more wood")
+        candidates = session.propose()
+        session.accept(candidates[0])
+
+        report = session.report()
+        self.assertEqual(report["rounds"], 2)
+        self.assertGreater(report["per_round"][1]["prompt_tokens"], report["per_round"][0]["prompt_tokens"])
+        self.assertEqual(report["completion_tokens"], sum(r["completion_tokens"] for r in report["per_round"]))
+        self.assertIsNotNone(report["time_to_accept"])
+        self.assertIsNotNone(report["per_round"][0]["time_to_first_token"])
+        self.assertEqual(session.rounds[-1].stream.chunks, 1)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
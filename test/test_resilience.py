@@ -0,0 +1,255 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from benchmarks.stub_providers import FlakyProvider, ProviderError
+from llm_interface import IncompleteStreamError, collect_stream
+from pipeline import OPENAI_MODEL, generate_viewpoints
+from prompt_cache import PromptCache
+from resilience import (CircuitBreaker, CircuitOpenError, FailoverLLM, GuardedClient, Provider, RetryPolicy,
+                        TokenBucket, failover_llm, is_retryable)
+from test.stubs import FakeInferenceClient, FakeLLM, FakeStreamingLLM, FakeUploader
+
+
+def fast_retry(attempts=4):
+    return RetryPolicy(max_attempts=attempts, base_delay=0.001, max_delay=0.01)
+
+
+class FailingLLM(FakeLLM):
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        raise self.error
+
+    async def astream_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        raise self.error
+        yield
+
+
+class BreakingLLM(FakeLLM):
+    async def astream_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        yield "detailed "
+        raise ConnectionError("connection reset")
+
+
+class TestPrimitives(unittest.TestCase):
+
+    def test_token_bucket_spaces_requests(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        start = time.perf_counter()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.045)
+
+    def test_retryable_errors(self):
+        self.assertTrue(is_retryable(ProviderError("slow down", status_code=429)))
+        self.assertTrue(is_retryable(ProviderError("unavailable", status_code=503)))
+        self.assertFalse(is_retryable(ProviderError("bad request", status_code=400)))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertFalse(is_retryable(ValueError()))
+
+    def test_circuit_breaker_opens_and_probes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.02)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.03)
+        self.assertTrue(breaker.allow())
+        # Only one probe at a time while half open
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_throttled_probe_lets_another_probe_through(self):
+        def fail(error):
+            raise error
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+        provider = Provider("llm", retry=fast_retry(1), breaker=breaker)
+        # A 500 opens the circuit; the probe after the timeout is throttled
+        for status in (500, 429):
+            time.sleep(0.03)
+            with self.assertRaises(ProviderError):
+                provider.call(fail, ProviderError("failed", status_code=status))
+
+        self.assertEqual(provider.call(lambda: "ok"), "ok")
+        self.assertEqual(provider.breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestProvider(unittest.TestCase):
+
+    def test_retries_throttled_calls(self):
+        upstream = FlakyProvider(rate=200, burst=1)
+        provider = Provider("flux", retry=fast_retry(10))
+        results = [provider.call(upstream) for _ in range(5)]
+
+        self.assertEqual(len(results), 5)
+        self.assertGreater(upstream.throttled, 0)
+
+    def test_rate_limit_avoids_throttling(self):
+        upstream = FlakyProvider(rate=200, burst=1)
+        provider = Provider("flux", rate=180, burst=1, retry=fast_retry())
+        for _ in range(5):
+            provider.call(upstream)
+        self.assertEqual(upstream.throttled, 0)
+
+    def test_non_retryable_error_is_raised_at_once(self):
+        calls = []
+
+        def bad_request():
+            calls.append(1)
+            raise ProviderError("bad request", status_code=400)
+
+        with self.assertRaises(ProviderError):
+            Provider("llm", retry=fast_retry()).call(bad_request)
+        self.assertEqual(len(calls), 1)
+
+    def test_open_circuit_skips_calls(self):
+        upstream = FlakyProvider(rate=10 ** 6, burst=10 ** 6)
+        upstream.down = True
+        provider = Provider("llm", retry=fast_retry(2), breaker=CircuitBreaker(failure_threshold=2))
+        with self.assertRaises(ProviderError):
+            provider.call(upstream)
+        with self.assertRaises(CircuitOpenError):
+            provider.call(upstream)
+        self.assertEqual(upstream.calls, 2)
+
+    def test_lazy_client_is_created_on_first_call(self):
+        created = []
+
+        def factory():
+            created.append(1)
+            return FakeInferenceClient(latency=0)
+
+        client = GuardedClient.lazy(factory, Provider("flux"))
+        self.assertEqual(created, [])
+        client.text_to_image("a chair", "m")
+        client.text_to_image("a lamp", "m")
+        self.assertEqual(created, [1])
+
+    def test_hedge_beats_slow_call(self):
+        delays = [0.5, 0.01]
+
+        def call():
+            time.sleep(delays.pop(0))
+            return "ok"
+
+        start = time.perf_counter()
+        self.assertEqual(Provider("llm", hedge_after=0.02).call(call), "ok")
+        self.assertLess(time.perf_counter() - start, 0.2)
+
+    def test_async_hedge(self):
+        delays = [0.5, 0.01]
+
+        async def call():
+            await asyncio.sleep(delays.pop(0))
+            return "ok"
+
+        start = time.perf_counter()
+        self.assertEqual(asyncio.run(Provider("llm", hedge_after=0.02).acall(call)), "ok")
+        self.assertLess(time.perf_counter() - start, 0.2)
+
+
+class TestFailover(unittest.TestCase):
+
+    def backends(self, primary):
+        secondary = FakeStreamingLLM(chunk_latency=0)
+        return [
+            (primary, "gemini-model", Provider("gemini", retry=fast_retry(2), breaker=CircuitBreaker(2))),
+            (secondary, "openai-model", Provider("openai", retry=fast_retry(2))),
+        ], secondary
+
+    def test_fails_over_and_stops_calling_open_circuit(self):
+        primary = FailingLLM(ProviderError("unavailable", status_code=503))
+        backends, secondary = self.backends(primary)
+        llm = FailoverLLM(backends)
+
+        self.assertEqual(llm.generate_prompt("a chair", "m", "sys"), "detailed a chair")
+        self.assertEqual(llm.generate_prompt("a lamp", "m", "sys"), "detailed a lamp")
+        self.assertEqual(primary.calls, 2)
+        self.assertEqual(asyncio.run(llm.agenerate_prompt("a cup", "m", "sys")), "detailed a cup")
+
+    def test_stream_fails_over_before_first_chunk(self):
+        primary = FailingLLM(ProviderError("slow down", status_code=429))
+        backends, _ = self.backends(primary)
+
+        text, _ = asyncio.run(collect_stream(FailoverLLM(backends).astream_prompt("a chair", "m", "sys")))
+        self.assertEqual(text, "detailed a chair ")
+        self.assertEqual(primary.calls, 2)
+
+    def test_stream_broken_after_first_chunk_raises(self):
+        primary = BreakingLLM()
+        backends, secondary = self.backends(primary)
+
+        with self.assertRaises(IncompleteStreamError):
+            asyncio.run(collect_stream(FailoverLLM(backends).astream_prompt("a chair", "m", "sys")))
+        self.assertEqual(primary.calls, 1)
+        self.assertEqual(secondary.calls, 0)
+
+    def test_cache_keys_on_the_backend_that_answered(self):
+        primary, backup = FailingLLM(ProviderError("unavailable", status_code=503)), FakeLLM()
+        registry = SimpleNamespace(gemini=lambda raise_errors: primary, openai=lambda raise_errors: backup)
+        providers = {"gemini": Provider("gemini", retry=fast_retry(1)), "openai": Provider("openai")}
+        cache = PromptCache(":memory:")
+        llm = failover_llm(registry, "gemini", providers, "primary-model", cache)
+
+        self.assertEqual(llm.generate_prompt("a chair", "primary-model", "sys"), "detailed a chair")
+        self.assertIsNotNone(cache.get(PromptCache.make_key("FakeLLM", OPENAI_MODEL, "sys", "a chair")))
+        self.assertIsNone(cache.get(PromptCache.make_key("FailingLLM", "primary-model", "sys", "a chair")))
+
+        # The backup serves it again from the cache, and a rejected prompt is dropped
+        llm.generate_prompt("a chair", "primary-model", "sys")
+        self.assertEqual(backup.calls, 1)
+        llm.discard("a chair", "primary-model", "sys")
+        self.assertEqual(len(cache), 0)
+
+    def test_backup_is_created_only_on_failover(self):
+        created = []
+
+        def backup():
+            created.append(1)
+            return FakeStreamingLLM(chunk_latency=0)
+
+        primary = FakeStreamingLLM(chunk_latency=0)
+        llm = FailoverLLM([(primary, None, Provider("gemini")), (backup, None, Provider("openai"))])
+        self.assertEqual(llm.generate_prompt("a chair", "m", "sys"), "detailed a chair")
+        self.assertEqual(created, [])
+
+        llm = FailoverLLM([(FailingLLM(ValueError("no")), None, Provider("gemini", retry=fast_retry())),
+                           (backup, None, Provider("openai"))])
+        llm.generate_prompt("a chair", "m", "sys")
+        llm.generate_prompt("a lamp", "m", "sys")
+        self.assertEqual(created, [1])
+
+    def test_all_backends_failing_returns_none(self):
+        llm = FailoverLLM([(FailingLLM(ValueError("no")), None, Provider("gemini", retry=fast_retry()))])
+        self.assertIsNone(llm.generate_prompt("a chair", "m", "sys"))
+
+
+class TestViewpointFailures(unittest.TestCase):
+
+    def test_failed_view_is_skipped(self):
+        uploader = FakeUploader(latency=0)
+
+        def upload(data, content_type, file_name):
+            if file_name.startswith("left"):
+                raise ProviderError("upload failed")
+            return uploader(data, content_type, file_name)
+
+        urls = generate_viewpoints(FakeInferenceClient(latency=0), upload, "a chair", ["front", "left", "back"])
+        self.assertEqual(len(urls), 2)
+
+        with self.assertRaises(RuntimeError):
+            generate_viewpoints(FakeInferenceClient(latency=0), upload, "a chair", ["left"])
+
+
+if __name__ == '__main__':
+    unittest.main()
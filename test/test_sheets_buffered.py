@@ -0,0 +1,148 @@
+import time
+import unittest
+from unittest import mock
+
+from benchmarks.stub_providers import FakeSheetsService, _http_error
+from google_sheets.buffered_writer import BufferedSheetWriter
+from google_sheets.sheets_client import GoogleSheetsClient
+from google_sheets.sheets_manager import SheetManager
+
+HEADERS = ["ID", "Description", "User"]
+
+
+class TestBufferedWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.service = FakeSheetsService({"Sheet1": [HEADERS]})
+        self.client = GoogleSheetsClient(None, service=self.service, backoff=0.001)
+
+    def writer(self, **kwargs):
+        kwargs.setdefault("flush_interval", None)
+        writer = BufferedSheetWriter(self.client, **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_appends_are_coalesced(self):
+        writer = self.writer(max_rows=100)
+        manager = SheetManager(None, "sheet-id", client=writer)
+        for i in range(10):
+            manager.add_entry({"ID": str(i + 1), "User": "Jesse"}, "Sheet1")
+        self.assertEqual(self.service.count("append"), 0)
+
+        writer.close()
+        self.assertEqual(self.service.count("append"), 1)
+        self.assertEqual(len(self.service.sheets["Sheet1"]), 11)
+        self.assertEqual(self.service.sheets["Sheet1"][-1], ["10", "", "Jesse"])
+
+    def test_updates_follow_buffered_appends(self):
+        writer = self.writer()
+        manager = SheetManager(None, "sheet-id", client=writer)
+        manager.add_entry({"ID": "1"}, "Sheet1")
+        manager.update_row({"Description": "first"}, "Sheet1")
+        manager.add_entry({"ID": "2"}, "Sheet1")
+        manager.update_row({"Description": "second"}, "Sheet1")
+        manager.update_row({"User": "Mathew"}, "Sheet1")
+        writer.flush()
+
+        self.assertEqual(self.service.count("append"), 1)
+        self.assertEqual(self.service.count("batchUpdate"), 1)
+        self.assertEqual(self.service.sheets["Sheet1"][1:], [["1", "first", ""], ["2", "second", "Mathew"]])
+
+    def test_flushes_on_size(self):
+        writer = self.writer(max_rows=4)
+        for i in range(10):
+            writer.append_to_range("sheet-id", "Sheet1", [[str(i)]])
+        self.assertEqual(self.service.count("append"), 2)
+        self.assertEqual(writer.pending(), 2)
+
+    def test_read_sees_pending_writes(self):
+        writer = self.writer()
+        writer.append_to_range("sheet-id", "Sheet1", [["1", "a", "b"]])
+        self.assertEqual(writer.read_range("sheet-id", "Sheet1")[-1], ["1", "a", "b"])
+
+    def test_rate_limited_flush_is_retried(self):
+        self.service.throttle = 2
+        writer = self.writer()
+        writer.write_range("sheet-id", "Sheet1!A2", [["1"]])
+        writer.write_range("sheet-id", "Sheet1!B2", [["x"]])
+        writer.flush()
+
+        self.assertEqual(self.service.count("throttled"), 2)
+        self.assertEqual(self.service.count("batchUpdate"), 1)
+        self.assertEqual(self.service.sheets["Sheet1"][1], ["1", "x"])
+
+    def test_failed_batch_is_kept(self):
+        self.client.max_retries = 0
+        self.service.throttle = 1
+        writer = self.writer()
+        writer.append_to_range("sheet-id", "Sheet1", [["1"]])
+        writer.flush()
+        self.assertEqual(writer.pending(), 1)
+
+        writer.flush()
+        self.assertEqual(writer.pending(), 0)
+        self.assertEqual(self.service.sheets["Sheet1"][-1], ["1"])
+
+    def test_rejected_batch_is_dropped(self):
+        writer = self.writer()
+        writer.append_to_range("sheet-id", "Sheet1", [["1"], ["2"]])
+        with mock.patch.object(self.client, "append_to_range", side_effect=_http_error(400)) as append:
+            writer.flush()
+            writer.flush()
+        self.assertEqual(append.call_count, 1)
+        self.assertEqual((writer.pending(), writer.dropped), (0, 2))
+
+    def test_retries_and_buffer_are_capped(self):
+        self.client.max_retries = 0
+        self.service.throttle = 100
+        writer = self.writer(max_attempts=2)
+        writer.append_to_range("sheet-id", "Sheet1", [["1"]])
+        writer.flush()
+        self.assertEqual(writer.pending(), 1)
+        writer.flush()
+        self.assertEqual((writer.pending(), writer.dropped), (0, 1))
+
+        writer = self.writer(max_pending=3)
+        writer.append_to_range("sheet-id", "Sheet1", [[str(i)] for i in range(5)])
+        writer.flush()
+        self.assertEqual((writer.pending(), writer.dropped), (0, 5))
+
+    def test_updates_wait_for_their_append(self):
+        self.client.max_retries = 0
+        writer = self.writer()
+        manager = SheetManager(None, "sheet-id", client=writer)
+        manager.add_entry({"ID": "1"}, "Sheet1")
+        manager.update_row({"Description": "first"}, "Sheet1")
+
+        self.service.throttle = 1
+        writer.flush()
+        # The append failed, so its row does not exist yet and the update is held back
+        self.assertEqual(self.service.count("batchUpdate"), 0)
+        self.assertEqual(writer.pending(), 2)
+
+        writer.flush()
+        self.assertEqual(self.service.sheets["Sheet1"][1:], [["1", "first", ""]])
+
+    def test_updates_of_dropped_appends_are_dropped(self):
+        writer = self.writer()
+        manager = SheetManager(None, "sheet-id", client=writer)
+        manager.add_entry({"ID": "1"}, "Sheet1")
+        manager.update_row({"Description": "first"}, "Sheet1")
+        with mock.patch.object(self.client, "append_to_range", side_effect=_http_error(400)):
+            writer.flush()
+
+        self.assertEqual(self.service.count("batchUpdate"), 0)
+        self.assertEqual((writer.pending(), writer.dropped), (0, 2))
+
+    def test_interval_flush(self):
+        writer = self.writer(flush_interval=0.01)
+        writer.append_to_range("sheet-id", "Sheet1", [["1"]])
+        for _ in range(100):
+            if self.service.count("append"):
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.service.count("append"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import time
+import unittest
+from unittest import mock
+
+from benchmarks.stub_providers import FakeSheetsService
+from google_sheets.sheets_client import GoogleSheetsClient
+from google_sheets.sheets_manager import SheetManager, cell_ranges, column_letter
+
+HEADERS = ["ID", "Description", "User"]
+
+
+class TestSheetCache(unittest.TestCase):
+
+    def setUp(self):
+        self.service = FakeSheetsService({"Sheet1": [HEADERS, ["1", "first", "Jesse"]]})
+        self.manager = SheetManager(None, "sheet-id", client=GoogleSheetsClient(None, service=self.service))
+
+    def rows(self):
+        return self.service.sheets["Sheet1"]
+
+    def test_appends_cost_one_call_each(self):
+        for i in range(5):
+            self.manager.add_entry({"ID": str(i + 2), "User": "Jesse"}, "Sheet1")
+
+        # The header row and the key column are read once
+        self.assertEqual(self.service.count("get"), 2)
+        self.assertEqual(self.service.count("append"), 5)
+        self.assertEqual(self.rows()[-1], ["6", "", "Jesse"])
+
+    def test_update_after_append_needs_no_read(self):
+        self.manager.add_entry({"ID": "2", "Description": "new"}, "Sheet1")
+        self.manager.update_row({"User": "Mathew"}, "Sheet1")
+
+        self.assertEqual(self.service.count("get"), 2)
+        self.assertEqual(self.rows()[2], ["2", "new", "Mathew"])
+
+    def test_update_preserves_existing_values(self):
+        self.manager.update_row({"Description": "edited", "Unknown": "x"}, "Sheet1")
+        self.assertEqual(self.rows()[1], ["1", "edited", "Jesse"])
+        self.assertIsNone(self.manager.update_row({"Unknown": "x"}, "Sheet1"))
+
+    def test_ttl_and_invalidate_reload(self):
+        manager = SheetManager(None, "sheet-id", client=GoogleSheetsClient(None, service=self.service),
+                               cache_ttl=0.01)
+        manager.get_headers("Sheet1")
+        time.sleep(0.02)
+        manager.get_headers("Sheet1")
+        self.assertEqual(self.service.count("get"), 4)
+
+        self.manager.get_headers("Sheet1")
+        self.manager.invalidate("Sheet1")
+        self.manager.get_headers("Sheet1")
+        self.assertEqual(self.service.count("get"), 8)
+
+    def test_missing_headers(self):
+        with self.assertRaises(ValueError):
+            self.manager.get_headers("Empty")
+
+
+
+class TestKeyedUpdates(unittest.TestCase):
+
+    def setUp(self):
+        rows = [HEADERS + ["Status"]] + [[str(i), f"object {i}", "Jesse", "queued"] for i in range(1, 501)]
+        self.service = FakeSheetsService({"Jobs": rows})
+        self.manager = SheetManager(None, "sheet-id", client=GoogleSheetsClient(None, service=self.service))
+
+    def rows(self):
+        return self.service.sheets["Jobs"]
+
+    def test_column_letters_and_ranges(self):
+        self.assertEqual([column_letter(i) for i in (0, 25, 26, 701, 702)], ["A", "Z", "AA", "ZZ", "AAA"])
+        self.assertEqual(cell_ranges("Jobs", 5, {3: "d", 1: "b", 2: "c"}),
+                         [{"range": "Jobs!B5:D5", "values": [["b", "c", "d"]]}])
+        self.assertEqual([r["range"] for r in cell_ranges("Jobs", 7, {0: "a", 3: "d"})], ["Jobs!A7", "Jobs!D7"])
+
+    def test_update_by_key_reads_only_headers_and_key_column(self):
+        self.manager.update_by_key("ID", "250", {"Status": "done"}, "Jobs")
+        self.manager.update_by_key("ID", "17", {"Status": "failed", "User": "Mathew"}, "Jobs")
+
+        self.assertEqual(self.service.count("get"), 2)
+        self.assertEqual(self.service.count("batchUpdate"), 2)
+        self.assertEqual(self.rows()[250], ["250", "object 250", "Jesse", "done"])
+        self.assertEqual(self.rows()[17], ["17", "object 17", "Mathew", "failed"])
+
+    def test_update_rows_in_one_request(self):
+        result = self.manager.update_rows("ID", {"3": {"Status": "done"}, "400": {"Status": "done"},
+                                                 "missing": {"Status": "done"}}, "Jobs")
+
+        self.assertEqual(self.service.count("batchUpdate"), 1)
+        self.assertEqual(result["totalUpdatedCells"], 2)
+        self.assertEqual(self.rows()[3][3], "done")
+        self.assertEqual(self.rows()[400][3], "done")
+        self.assertIsNone(self.manager.update_by_key("ID", "missing", {"Status": "done"}, "Jobs"))
+
+    def test_appended_rows_are_indexed(self):
+        self.manager.update_by_key("ID", "1", {"Status": "running"}, "Jobs")
+        self.manager.add_entry({"ID": "501", "Status": "queued"}, "Jobs")
+        self.manager.update_by_key("ID", "501", {"Status": "done"}, "Jobs")
+
+        self.assertEqual(self.rows()[501], ["501", "", "", "done"])
+        self.assertEqual(self.service.count("get"), 3)
+
+    def test_load_reads_only_headers_and_key_column(self):
+        with mock.patch.object(self.service, "_get", wraps=self.service._get) as get:
+            self.manager.update_row({"Status": "done"}, "Jobs")
+        self.assertEqual([call.args[0] for call in get.call_args_list], ["Jobs!1:1", "Jobs!A2:A"])
+        self.assertEqual(self.rows()[500], ["500", "object 500", "Jesse", "done"])
+
+    def test_update_row_writes_only_changed_cells(self):
+        self.manager.update_row({"ID": "500", "Status": "done"}, "Jobs")
+        self.assertEqual(self.service.count("batchUpdate"), 1)
+        self.assertEqual(self.manager.update_row({"Status": "done"}, "Jobs"), {"totalUpdatedCells": 0})
+        self.assertEqual(self.service.count("batchUpdate"), 1)
+        self.assertEqual(self.rows()[500], ["500", "object 500", "Jesse", "done"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from pipeline import engineer_view_prompts, parse_view_prompts
+from image_cache import ImageCache
+from test.stubs import FakeInferenceClient, FakeLLM, FakeStreamingLLM
+from test.test_batch import stub_services
+from text_to_3d import Pipeline, PipelineConfig
+
+
+class JsonLLM(FakeLLM):
+    """
+    Answers a view prompts request with JSON, or with plain text when broken.
+    """
+
+    def __init__(self, broken=False):
+        super().__init__()
+        self.broken = broken
+
+    def generate_prompt(self, prompt, model, system_instruction):
+        self.calls += 1
+        if self.broken or "Views:" not in prompt:
+            return f"detailed {prompt}"
+        views = prompt.split("Views: ")[1].split(", ")
+        return "```json\n" + json.dumps({view: f"{view} of a chair" for view in views}) + "\n```"
+
+
+class TestViewPrompts(unittest.TestCase):
+
+    def test_one_call_for_all_views(self):
+        llm = JsonLLM()
+        prompts = engineer_view_prompts(llm, "a chair", "m", ["front", "back"])
+        self.assertEqual(prompts, {"front": "front of a chair", "back": "back of a chair"})
+        self.assertEqual(llm.calls, 1)
+
+    def test_falls_back_to_one_call_per_view(self):
+        llm = JsonLLM(broken=True)
+        prompts = engineer_view_prompts(llm, "a chair", "m", ["front", "back"])
+        self.assertEqual(list(prompts), ["front", "back"])
+        self.assertIn("back view", prompts["back"])
+        self.assertEqual(llm.calls, 3)
+
+    def test_parse_ignores_missing_views(self):
+        self.assertEqual(parse_view_prompts('{"front": "a", "back": ""}', ["front", "back"]), {"front": "a"})
+        self.assertEqual(parse_view_prompts("not json", ["front"]), {})
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_stages_compose(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            services = stub_services()
+            services.llm = JsonLLM()
+            config = PipelineConfig(viewpoints=["front", "back"], trellis_mode="single",
+                                    model_cache_dir=os.path.join(tmp, "models"))
+            pipeline = Pipeline(config, services)
+
+            images = pipeline.render_views(pipeline.view_prompts("a chair"))
+            self.assertEqual(sorted(images), ["back", "front"])
+
+            path = pipeline.run("a chair")
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(services.uploader.calls, 2)
+            self.assertEqual(services.subscribe.calls, 1)
+
+    def test_upload_reuses_identical_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            services = stub_services()
+            pipeline = Pipeline(PipelineConfig(image_cache=ImageCache(tmp)), services)
+            image = FakeInferenceClient(latency=0).text_to_image("a chair", "m", seed=0)
+
+            self.assertEqual(pipeline.upload(image, "front"), pipeline.upload(image, "front"))
+            self.assertEqual(services.uploader.calls, 1)
+
+    def test_stream_prompt_reports_time_to_first_token(self):
+        services = stub_services()
+        services.llm = FakeStreamingLLM(chunk_latency=0.01)
+        chunks = []
+        prompt, stats = asyncio.run(Pipeline(PipelineConfig(), services).stream_prompt("a chair",
+                                                                                         on_chunk=chunks.append))
+        self.assertEqual(prompt, "".join(chunks))
+        self.assertGreaterEqual(stats.time_to_first_token, 0.01)
+
+    def test_config_from_env(self):
+        os.environ["TRELLIS_MODE"] = "fanout"
+        self.addCleanup(os.environ.pop, "TRELLIS_MODE")
+        config = PipelineConfig.from_env(llm="openai", stage_cache=None, image_cache=None)
+        self.assertEqual(config.trellis_mode, "fanout")
+        self.assertIn("gpt", config.model)
+        with self.assertRaises(ValueError):
+            PipelineConfig(llm="claude")
+
+
+if __name__ == '__main__':
+    unittest.main()
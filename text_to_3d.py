@@ -0,0 +1,272 @@
+"""
+The text-to-3D pipeline as a library. A PipelineConfig holds every setting
+of a run, Services holds the provider clients it runs against, and Pipeline
+exposes the stages (prompt engineering, views, upload, reconstruction,
+download, post-processing) as methods that can be called one by one or
+composed. main.py and src/generate_image.py are thin front ends over it, and
+batch.py and job_service.py run its stages for many jobs.
+"""
+import os
+from types import SimpleNamespace
+
+from checkpoint import StageCache, cached_viewpoints, forget_viewpoints
+from image_cache import DEFAULT_PARAMS, GenerationParams, ImageCache
+from image_encoding import ImageEncoding
+from instrumentation import span
+from llm_interface import collect_stream
+from model_cache import DEFAULT_CACHE_DIR, ModelCache
+from pipeline import (DEFAULT_ENCODING, FLUX_MODEL, GEMINI_MODEL, OPENAI_MODEL, SYSTEM_INSTRUCTION, VIEWPOINTS,
+                      download_model, engineer_prompt, engineer_view_prompts, render_views, upload_image)
+
+LLMS = ("gemini", "openai")
+
+
+class PipelineConfig:
+    """
+    Settings of one pipeline run. llm is "gemini" or "openai"; model defaults
+    to that LLM's model. image_provider picks the HF inference provider for
+    FLUX (None for the default routing).
+    """
+
+    def __init__(self, llm: str = "gemini", model: str | None = None,
+                 system_instruction: str = SYSTEM_INSTRUCTION, viewpoints: list[str] = VIEWPOINTS,
+                 view_concurrency: int | None = None, image_model: str = FLUX_MODEL, image_provider: str | None = None,
+                 params: GenerationParams = DEFAULT_PARAMS, encoding: ImageEncoding = DEFAULT_ENCODING,
+                 save_dir: str | None = None, trellis_mode: str = "multi", model_cache_dir: str = DEFAULT_CACHE_DIR,
+                 stage_cache: StageCache | None = None, image_cache: ImageCache | None = None,
+                 preprocess=None, lods: list[int] | None = None):
+        if llm not in LLMS:
+            raise ValueError(f"Unknown LLM {llm}. Choose one of {', '.join(LLMS)}.")
+        self.llm = llm
+        self.model = model or (OPENAI_MODEL if llm == "openai" else GEMINI_MODEL)
+        self.system_instruction = system_instruction
+        self.viewpoints = list(viewpoints)
+        self.view_concurrency = view_concurrency
+        self.image_model = image_model
+        self.image_provider = image_provider
+        self.params = params
+        self.encoding = encoding
+        self.save_dir = save_dir
+        self.trellis_mode = trellis_mode
+        self.model_cache_dir = model_cache_dir
+        self.stage_cache = stage_cache
+        self.image_cache = image_cache
+        self.preprocess = preprocess
+        self.lods = lods
+
+    @classmethod
+    def from_env(cls, llm: str = "gemini", **overrides):
+        """
+        Reads VIEW_CONCURRENCY, SAVE_VIEWS_DIR, TRELLIS_MODE, MODEL_CACHE_DIR,
+        MESH_LODS and the settings of ImageEncoding, GenerationParams,
+        StageCache, ImageCache and Preprocessor. Keyword arguments take precedence.
+        """
+        from preprocess import Preprocessor
+
+        lods = os.getenv("MESH_LODS")
+        settings = {
+            "view_concurrency": int(os.getenv("VIEW_CONCURRENCY", 0)) or None,
+            "save_dir": os.getenv("SAVE_VIEWS_DIR"),
+            "trellis_mode": os.getenv("TRELLIS_MODE", "multi"),
+            "model_cache_dir": os.getenv("MODEL_CACHE_DIR", DEFAULT_CACHE_DIR),
+            "encoding": ImageEncoding.from_env(),
+            "params": GenerationParams.from_env(),
+            "stage_cache": StageCache.from_env(),
+            "image_cache": ImageCache.from_env(),
+            "preprocess": Preprocessor.from_env(),
+            "lods": [int(budget) for budget in lods.split(",")] if lods else None,
+        }
+        settings.update(overrides)
+        return cls(llm=llm, **settings)
+
+
+class Services:
+    """
+    Provider handles used by the pipeline stages. Swap any of them for local stubs in tests.
+    """
+
+    def __init__(self, llm, model, image_client, uploader, subscribe, get, fal=None):
+        self.llm = llm
+        self.model = model
+        self.image_client = image_client
+        self.uploader = uploader
+        self.subscribe = subscribe
+        self.get = get
+        self.fal = fal
+
+
+def build_services(config: PipelineConfig | str = "gemini") -> Services:
+    """
+    Builds the real provider clients from the environment (.env is loaded).
+    All clients come from the shared registry so connections are pooled across jobs,
+    and every call goes through its provider's rate limit, retries and circuit
+    breaker. The LLM fails over to the other one when the configured one keeps
+    failing. SDK clients are only created when first used.
+    """
+    from dotenv import load_dotenv
+    from http_clients import get_registry
+    from prompt_cache import cache_from_env
+    from resilience import GuardedClient, failover_llm, providers_from_env
+
+    if isinstance(config, str):
+        config = PipelineConfig(llm="openai" if config == "openai" else "gemini")
+
+    load_dotenv()
+    registry = get_registry()
+    providers = providers_from_env()
+
+    fal = GuardedClient.lazy(registry.fal, providers["fal"])
+    return Services(
+        llm=failover_llm(registry, config.llm, providers, config.model, cache_from_env()),
+        model=config.model,
+        image_client=GuardedClient.lazy(lambda: registry.inference_client(config.image_provider),
+                                        providers["flux"]),
+        uploader=lambda *args, **kwargs: fal.upload(*args, **kwargs),
+        subscribe=lambda *args, **kwargs: fal.subscribe(*args, **kwargs),
+        get=providers["download"].wrap(registry.get),
+        fal=fal,
+    )
+
+
+class Pipeline:
+    """
+    The stages of a run with config, against services (built from the
+    environment on first use when not given).
+    """
+
+    def __init__(self, config: PipelineConfig | None = None, services: Services | None = None):
+        self.config = config or PipelineConfig()
+        self._services = services
+
+    @property
+    def services(self) -> Services:
+        if self._services is None:
+            self._services = build_services(self.config)
+        return self._services
+
+    def engineer_prompt(self, request: str, system_instruction: str | None = None) -> str | None:
+        """
+        Expands request into one detailed text-to-image prompt.
+        """
+        return engineer_prompt(self.services.llm, request, self.config.model,
+                               system_instruction or self.config.system_instruction)
+
+    async def stream_prompt(self, request: str, system_instruction: str | None = None, on_chunk=None):
+        """
+        engineer_prompt, streamed: on_chunk(text) is called as text arrives.
+        Returns (prompt, StreamStats).
+        """
+        with span("llm_prompt", model=self.config.model):
+            return await collect_stream(
+                self.services.llm.astream_prompt(request, self.config.model,
+                                                 system_instruction or self.config.system_instruction),
+                on_chunk=on_chunk
+            )
+
+    def refinement(self, request: str, candidates: int = 3):
+        """
+        An interactive RefinementSession for request with config's LLM and instruction.
+        """
+        from refinement import RefinementSession
+
+        return RefinementSession(self.services.llm, self.config.model, request, self.config.system_instruction,
+                                 candidates=candidates)
+
+    def view_prompts(self, request: str, viewpoints: list[str] | None = None) -> dict:
+        """
+        One prompt per viewpoint (config.viewpoints by default) from a single LLM call.
+        """
+        return engineer_view_prompts(self.services.llm, request, self.config.model,
+                                     viewpoints or self.config.viewpoints)
+
+    def render_views(self, prompts: dict) -> dict:
+        """
+        FLUX images of {viewpoint: prompt}, rendered concurrently with config.params.
+        """
+        return render_views(self.services.image_client, prompts, self.config.image_model, self.config.params,
+                            self.config.image_cache, self.config.view_concurrency)
+
+    def upload(self, image, name: str) -> str:
+        """
+        Uploads image as name; an identical file uploaded before reuses its url.
+        """
+        return upload_image(self.services.uploader, image, name, self.config.encoding, self.config.save_dir,
+                            image_cache=self.config.image_cache)
+
+    def generate_views(self, prompt: str, min_views: int = 1, save_dir: str | None = None) -> list[str]:
+        """
+        Renders and uploads every config.viewpoints view of prompt; returns the
+        uploaded urls. Views are also written to save_dir (config.save_dir by default).
+        """
+        save_dir = save_dir or self.config.save_dir
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        return cached_viewpoints(self.config.stage_cache, self.services.image_client, self.services.uploader,
+                                 prompt, self.config.viewpoints, model=self.config.image_model,
+                                 encoding=self.config.encoding, min_views=min_views, params=self.config.params,
+                                 image_cache=self.config.image_cache, preprocess=self.config.preprocess,
+                                 max_workers=self.config.view_concurrency, save_dir=save_dir)
+
+    def reconstruct(self, image_urls: list[str], on_queue_update=None, prompt: str | None = None) -> str | None:
+        """
+        Reconstructs and downloads a model from the views in config.trellis_mode;
+        returns its path in the model cache. If Trellis raises, the view urls
+        may have expired: they are no longer reused for identical files, and
+        the cached views of prompt, if given, are forgotten.
+        """
+        from reconstruction import reconstruct_views
+
+        services = self.services
+        # Stub services may only provide subscribe, which single and multi modes need
+        fal = services.fal or SimpleNamespace(subscribe=services.subscribe)
+        try:
+            return reconstruct_views(self.config.trellis_mode, fal, services.get,
+                                     ModelCache(self.config.model_cache_dir), image_urls,
+                                     on_queue_update=on_queue_update)
+        except Exception:
+            self.forget_views(image_urls, prompt)
+            raise
+
+    def forget_views(self, image_urls: list[str], prompt: str | None = None):
+        """
+        Stops reusing these uploaded views and, with prompt, the cached views of prompt.
+        """
+        config = self.config
+        if config.image_cache is not None:
+            config.image_cache.forget_uploads(image_urls)
+        if prompt is not None:
+            forget_viewpoints(config.stage_cache, prompt, config.viewpoints, model=config.image_model,
+                              encoding=config.encoding, params=config.params, preprocess=config.preprocess)
+
+    def download(self, url: str, filename: str) -> bool:
+        return download_model(self.services.get, url, filename)
+
+    def postprocess(self, model_path: str, output_dir: str | None = None) -> list[dict]:
+        """
+        Writes config.lods levels of detail of the model; none if lods is not set.
+        """
+        if not self.config.lods:
+            return []
+        from mesh_processing import process
+
+        return process(model_path, output_dir, budgets=self.config.lods)
+
+    def run(self, request: str, on_queue_update=None) -> str | None:
+        """
+        All stages without interaction: prompt, views, reconstruction and post-processing.
+        """
+        prompt = self.engineer_prompt(request)
+        if not prompt:
+            return None
+        path = self.reconstruct(self.generate_views(prompt), on_queue_update, prompt)
+        if path:
+            self.postprocess(path)
+        return path
+
+    def close(self):
+        """
+        Stops the preprocessing workers, if any were started.
+        """
+        if self.config.preprocess is not None:
+            self.config.preprocess.close()
+